@@ -71,6 +71,7 @@ class ComparisonResponse(BaseModel):
     changes: List[ChangeDetection] = Field([], description="Список изменений")
     image1_size: List[int] = Field(..., description="Размер первого изображения")
     image2_size: List[int] = Field(..., description="Размер второго изображения")
+    registration: Optional[str] = Field(None, description="Совмещение снимков: homography / resize / none")
     timestamp: datetime = Field(..., description="Временная метка")
 
 class ExportFormat(str, Enum):
@@ -118,6 +119,14 @@ class TaskInfo(BaseModel):
     processing_time: Optional[float] = Field(None, description="Время обработки")
     detections_count: Optional[int] = Field(None, description="Количество детекций")
     has_gps: Optional[bool] = Field(None, description="Есть ли GPS данные")
+    progress: Optional[float] = Field(None, ge=0.0, le=1.0, description="Прогресс выполнения")
+    result: Optional[Dict[str, Any]] = Field(None, description="Результат (для завершенных задач)")
+    error: Optional[str] = Field(None, description="Текст ошибки")
+
+class TaskHistoryPage(BaseModel):
+    """Схема для страницы истории задач"""
+    items: List[Dict[str, Any]] = Field(..., description="Задачи страницы (выбранные поля)")
+    next_cursor: Optional[str] = Field(None, description="Курсор следующей страницы (None - последняя)")
 
 class ModelInfo(BaseModel):
     """Схема для информации о модели"""
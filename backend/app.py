@@ -1,17 +1,45 @@
 import uvicorn
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Response, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import itertools
+import json
+import tarfile
+import zipfile
+import tempfile
 import uuid
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import time
 import shutil
 import logging
 import os
+import cv2
+from datetime import datetime, timezone
 from pathlib import Path
-from exif import Image as ExifImage
 
 from backend.services.detector import OptimizedDetector
+from backend.services.inference_queue import MicroBatchScheduler
+from backend.services.worker_pool import InferenceWorkerPool
+from backend.services.result_cache import ResultCache, make_key
+from backend.services.job_queue import JobQueue, JobQueueFull
+from backend.services.clustering import ClusterIndex
+from backend.services.export_service import export_service, MEDIA_TYPES
+from backend.services.video_service import stream_video_detections, stream_adaptive_video_detections
 from backend.utils.change_detection import ChangeDetector
+from backend.utils.registration import ImageRegistrar, content_key
+from backend.utils.optimization import CPUOptimizer
+from backend.utils.archive import iter_archive_images, StreamPipe
+from backend.utils.exif_reader import read_exif, read_image_size
+from backend.utils.geo_utils import GeoReferencer
 from backend.utils.database import db
 from backend.config import settings
+from backend.api.schemas import OptimizationConfig, HealthResponse, TaskInfo, TaskHistoryPage, StatisticsResponse, ExportFormat, \
+    ComparisonMethod, ComparisonResponse
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("ArgusAPI")
@@ -28,67 +56,633 @@ app.add_middleware(
 )
 
 detector = OptimizedDetector()
-change_detector = ChangeDetector()
+registrar = None
+if settings.REGISTRATION_METHOD:
+    registrar = ImageRegistrar(
+        settings.REGISTRATION_METHOD,
+        max_features=settings.REGISTRATION_FEATURES,
+        cache_size=settings.REGISTRATION_CACHE_SIZE
+    )
+change_detector = ChangeDetector(registrar=registrar)
+georeferencer = GeoReferencer()
+cluster_index = ClusterIndex(
+    db.object_positions,
+    cell_px=settings.CLUSTER_CELL_PX,
+    max_tiles=settings.CLUSTER_MAX_TILES,
+    cache_size=settings.CLUSTER_CACHE_SIZE,
+)
+db.add_points_listener(cluster_index.invalidate)
+worker_pool = None
+if settings.INFERENCE_WORKERS > 0:
+    worker_pool = InferenceWorkerPool(
+        detector,
+        num_workers=settings.INFERENCE_WORKERS,
+        max_session_workers=settings.INFERENCE_MAX_SESSION_WORKERS,
+        cores_per_worker=settings.INFERENCE_CORES_PER_WORKER
+    )
+result_cache = ResultCache(db if settings.RESULT_CACHE_PERSIST else None, max_items=settings.RESULT_CACHE_SIZE)
+scheduler = MicroBatchScheduler(
+    detector,
+    max_batch_size=settings.INFERENCE_MAX_BATCH,
+    max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+    pool=worker_pool
+)
+
+async def run_job(task_id, payload, progress):
+    data, filename = payload
+    return await process_image(task_id, data, filename, progress=progress)
+
+decode_pool = ThreadPoolExecutor(max_workers=settings.DECODE_THREADS, thread_name_prefix="argus-decode")
+
+job_queue = JobQueue(run_job, max_size=settings.JOB_QUEUE_SIZE, workers=settings.JOB_WORKERS,
+                     history_size=settings.JOB_HISTORY_SIZE)
+
+model_ready = None
+model_error = None
+warmup_task = None
+system_info = {}
 
-def decimal_coords(coords, ref):
+class ModelUnavailable(Exception):
+    """Модель не загрузилась или не успела прогреться"""
+
+@app.exception_handler(ModelUnavailable)
+async def model_unavailable_handler(request: Request, exc: ModelUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "10"})
+
+async def wait_model_ready():
+    """
+    Ожидание конца прогрева
+
+    Raises:
+        ModelUnavailable: Загрузка модели упала или не закончилась за MODEL_READY_TIMEOUT
+    """
+    if not model_ready.is_set():
+        try:
+            await asyncio.wait_for(model_ready.wait(), settings.MODEL_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ModelUnavailable("Модель еще загружается, повторите запрос позже")
+    if model_error is not None:
+        raise ModelUnavailable(f"Модель не загружена: {model_error}")
+
+async def warm_up():
+    """Фоновая загрузка весов и прогрев графа; до конца прогрева health отдает 503"""
+    global model_error
+    loop = asyncio.get_running_loop()
     try:
-        decimal = coords[0] + coords[1] / 60 + coords[2] / 3600
-        if ref in ['S', 'W']: decimal = -decimal
-        return float(decimal)
-    except: return None
+        system_info.update(await loop.run_in_executor(None, CPUOptimizer.get_system_info))
+        await loop.run_in_executor(None, detector.load)
+        if worker_pool is not None:
+            # Процессы форкаются до первого инференса в родителе и греются сами
+            worker_pool.start()
+            await asyncio.gather(*(
+                asyncio.wrap_future(worker_pool.submit("warmup")) for _ in range(worker_pool.size)
+            ))
+        else:
+            await loop.run_in_executor(None, detector.warmup)
+    except Exception as e:
+        logger.error(f"Не удалось подготовить модель: {e}")
+        model_error = str(e) or type(e).__name__
+    # Событие ставится и при сбое: ожидающие запросы получат 503, а не зависнут
+    model_ready.set()
+
+@app.on_event("startup")
+async def start_scheduler():
+    global model_ready, warmup_task
+    model_ready = asyncio.Event()
+    await scheduler.start()
+    await job_queue.start()
+    warmup_task = asyncio.create_task(warm_up())
 
-def get_gps_coords(file_path):
+@app.on_event("shutdown")
+async def stop_scheduler():
+    await job_queue.stop()
+    await scheduler.stop()
+    if worker_pool is not None:
+        worker_pool.shutdown()
+    # Дописываем очередь записи в БД
+    await run_in_threadpool(db.close)
+
+def decode_image(data):
+    """Декодирование из памяти (cv2.imdecode отпускает GIL - можно параллелить потоками)"""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def georeference(detections, data, meta, info):
+    """
+    Координаты объектов по положению в кадре (если включено и есть GPS)
+
+    Нужен только размер кадра: он сохраняется в сведениях результата
+    (image_size), для старых записей кэша читается из заголовка файла.
+    """
+    if not settings.GEOREFERENCE or not detections or meta["lat"] is None:
+        return detections
+    size = info.get("image_size") or read_image_size(data, meta.get("orientation"))
+    return georeferencer.georeference(detections, meta, size)
+
+def read_upload_header(data, conf):
+    """
+    EXIF из заголовка и ключ кэша результатов
+
+    sha256 многомегабайтного снимка - десятки мс, поэтому вызывается
+    в пуле потоков, а не в event loop.
+    """
+    return read_exif(data), make_key(data, detector.model_id, conf, detector.slicing_mode())
+
+async def detect_array(img, conf=None):
+    """Детекция декодированного кадра; размер кадра сохраняется вместе с результатом"""
+    if conf is None:
+        detections, proc_time, info = await scheduler.submit(img)
+    else:
+        detections, proc_time, info = await scheduler.submit(img, conf)
+    return detections, proc_time, {**info, "image_size": list(img.shape[:2])}
+
+def remove_file(path):
+    """Удаление временного файла (повторное удаление не ошибка)"""
     try:
-        with open(file_path, 'rb') as f:
-            img = ExifImage(f)
-            if img.has_exif and hasattr(img, 'gps_latitude'):
-                lat = decimal_coords(img.gps_latitude, img.gps_latitude_ref)
-                lon = decimal_coords(img.gps_longitude, img.gps_longitude_ref)
-                return lat, lon
-    except: pass
-    return None, None
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+upload_writes = set()
+
+def persist_upload(path, data):
+    """Фоновое сохранение оригинала (не задерживает ответ)"""
+    future = asyncio.get_running_loop().run_in_executor(None, path.write_bytes, data)
+    upload_writes.add(future)
+    future.add_done_callback(upload_writes.discard)
+
+async def process_image(task_id, data, filename, progress=None):
+    """
+    Полный конвейер одного снимка: декодирование, GPS, детекция (через кэш), запись в БД
+
+    Байты читаются один раз: EXIF берется из заголовка буфера, а полное
+    декодирование выполняется только при промахе кэша результатов -
+    повторный снимок не декодируется вовсе.
+    Оригинал сохраняется в UPLOAD_DIR в фоне, если включен SAVE_UPLOADS.
+
+    Args:
+        task_id: ID задачи
+        data: Байты загруженного файла
+        filename: Исходное имя файла
+        progress: Необязательный колбэк progress(доля 0..1)
+    """
+    started = time.time()
+    extension = Path(filename or "").suffix or ".png"
+    file_path = settings.UPLOAD_DIR / f"{task_id}{extension}"
+
+    def _report(value):
+        if progress is not None:
+            progress(value)
+
+    if settings.SAVE_UPLOADS:
+        persist_upload(file_path, data)
+        image_path = str(file_path)
+    else:
+        image_path = filename
+
+    # Запросы, пришедшие во время прогрева, ждут готовности модели
+    await wait_model_ready()
+
+    conf = 0.25
+    meta, key = await run_in_threadpool(read_upload_header, data, conf)
+    lat, lon = meta["lat"], meta["lon"]
+    _report(0.1)
+
+    async def _infer():
+        # Декодирование не должно блокировать event loop
+        img = await run_in_threadpool(decode_image, data)
+        if img is None:
+            return [], 0.0, {}
+        return await detect_array(img)
+
+    (detections, proc_time, info), cached = await result_cache.get_or_compute(key, _infer)
+    if cached:
+        # В истории - реальное время этого запроса, а не исходного прогона
+        proc_time = time.time() - started
+    detections = georeference(detections, data, meta, info)
+    _report(0.9)
+
+    await db.aio.save_detection_task({
+        "task_id": task_id,
+        "image_path": image_path,
+        "detections_count": len(detections),
+        "detections": detections,
+        "processing_time": float(proc_time),
+        "lat": lat,
+        "lon": lon
+    })
+    _report(1.0)
+    return {"task_id": task_id, "detections": detections, "lat": lat, "lon": lon, "cached": cached,
+            "processing_time": float(proc_time),
+            "tiles": info.get("tiles", 0), "tiles_skipped": info.get("tiles_skipped", 0), "status": "success"}
 
 @app.post("/api/v1/detect")
 async def detect(file: UploadFile = File(...)):
     task_id = str(uuid.uuid4())
-    extension = Path(file.filename).suffix or ".png"
-    file_path = settings.UPLOAD_DIR / f"{task_id}{extension}"
-    
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    lat, lon = get_gps_coords(file_path)
-    
+    data = await file.read()
     try:
-        detections, proc_time = detector.run(str(file_path))
-        db.save_detection_task({
+        return await process_image(task_id, data, file.filename)
+    except Exception as e:
+        logger.error(f"Ошибка детекции: {e}")
+        return {"status": "error", "message": str(e)}
+
+async def _bulk_chunk(items, conf):
+    """
+    Параллельная детекция одного куска снимков
+
+    Кадры декодируются пулом decode_pool только при промахе кэша
+    результатов и одновременно уходят в планировщик, который собирает
+    их в пачки. Ошибка одного файла не роняет остальные.
+
+    Args:
+        items: Список (имя файла, байты)
+
+    Returns:
+        Список (сводка по файлу, строка для БД или None)
+    """
+    loop = asyncio.get_running_loop()
+
+    async def _one(filename, data):
+        started = time.time()
+        task_id = str(uuid.uuid4())
+        try:
+            meta, key = await loop.run_in_executor(decode_pool, read_upload_header, data, conf)
+
+            async def _infer():
+                img = await loop.run_in_executor(decode_pool, decode_image, data)
+                if img is None:
+                    raise ValueError("Не удалось декодировать изображение")
+                return await detect_array(img, conf)
+
+            (detections, proc_time, info), cached = await result_cache.get_or_compute(key, _infer)
+            if cached:
+                proc_time = time.time() - started
+            detections = georeference(detections, data, meta, info)
+        except Exception as e:
+            logger.error(f"Ошибка детекции {filename}: {e}")
+            return {"filename": filename, "status": "error", "message": str(e)}, None
+
+        lat, lon = meta["lat"], meta["lon"]
+        row = {
             "task_id": task_id,
-            "image_path": str(file_path),
+            "image_path": filename,
             "detections_count": len(detections),
             "detections": detections,
             "processing_time": float(proc_time),
             "lat": lat,
             "lon": lon
-        })
-        return {"task_id": task_id, "detections": detections, "lat": lat, "lon": lon, "status": "success"}
-    except Exception as e:
-        logger.error(f"Ошибка детекции: {e}")
-        return {"status": "error", "message": str(e)}
+        }
+        summary = {"filename": filename, "task_id": task_id, "status": "success",
+                   "detections_count": len(detections), "lat": lat, "lon": lon, "cached": cached}
+        return summary, row
+
+    return await asyncio.gather(*(_one(filename, data) for filename, data in items))
+
+@app.post("/api/v1/detect/batch")
+async def detect_batch(files: List[UploadFile] = File(...)):
+    """
+    Пакетная детекция по многим снимкам за один запрос
+
+    Кадры декодируются параллельно кусками по BULK_CHUNK_SIZE (память
+    ограничена одним куском), детекция идет пачками через планировщик,
+    все строки пишутся в БД одной транзакцией.
+    """
+    started = time.time()
+    await wait_model_ready()
+    conf = 0.25
+
+    summaries, rows = [], []
+    for start in range(0, len(files), settings.BULK_CHUNK_SIZE):
+        chunk = files[start:start + settings.BULK_CHUNK_SIZE]
+        try:
+            results = await _bulk_chunk([(f.filename, await f.read()) for f in chunk], conf)
+        except Exception as e:
+            logger.error(f"Ошибка пакетной детекции: {e}")
+            results = [({"filename": f.filename, "status": "error", "message": str(e)}, None) for f in chunk]
+        for summary, row in results:
+            summaries.append(summary)
+            if row is not None:
+                rows.append(row)
+
+    if rows:
+        await db.aio.save_detection_tasks(rows)
+
+    return {
+        "status": "success",
+        "files": len(files),
+        "processed": len(rows),
+        "detections_count": sum(r["detections_count"] for r in rows),
+        "processing_time": time.time() - started,
+        "results": summaries
+    }
+
+async def _process_archive(members):
+    """
+    Детекция по членам архива кусками: декодирование из памяти,
+    батч-инференс и запись куска в БД одной транзакцией
+    """
+    started = time.time()
+    conf = 0.25
+
+    summaries = []
+    processed = detections_count = 0
+    try:
+        await wait_model_ready()
+        while True:
+            items = await run_in_threadpool(lambda: list(itertools.islice(members, settings.BULK_CHUNK_SIZE)))
+            if not items:
+                break
+            results = await _bulk_chunk(items, conf)
+            rows = [row for _, row in results if row is not None]
+            if rows:
+                await db.aio.save_detection_tasks(rows)
+            processed += len(rows)
+            detections_count += sum(r["detections_count"] for r in rows)
+            summaries.extend(summary for summary, _ in results)
+    finally:
+        members.close()
+
+    return {
+        "status": "success",
+        "members": len(summaries),
+        "processed": processed,
+        "detections_count": detections_count,
+        "processing_time": time.time() - started,
+        "results": summaries
+    }
+
+@app.post("/api/v1/detect/archive")
+async def detect_archive(file: UploadFile = File(...)):
+    """Архив ZIP / TAR(.gz) со снимками: члены читаются по одному в память, без UPLOAD_DIR"""
+    try:
+        return await _process_archive(iter_archive_images(file.file))
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"Некорректный архив: {e}")
+
+@app.post("/api/v1/detect/archive/stream")
+async def detect_archive_stream(request: Request):
+    """
+    TAR(.gz) телом запроса: разбор и детекция начинаются, пока архив еще загружается
+    """
+    pipe = StreamPipe()
+
+    async def _feed():
+        try:
+            async for chunk in request.stream():
+                await run_in_threadpool(pipe.feed, chunk)
+        finally:
+            pipe.finish()
+
+    feeder = asyncio.create_task(_feed())
+    try:
+        return await _process_archive(iter_archive_images(pipe, kind="tar"))
+    except tarfile.TarError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректный архив: {e}")
+    finally:
+        pipe.close()
+        feeder.cancel()
+
+@app.post("/api/v1/jobs", response_model=TaskInfo, status_code=202)
+async def submit_job(file: UploadFile = File(...)):
+    """Поставить снимок в очередь; статус и результат - GET /api/v1/jobs/{task_id}"""
+    task_id = str(uuid.uuid4())
+    data = await file.read()
+    try:
+        return job_queue.submit(task_id, (data, file.filename))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+@app.get("/api/v1/jobs/{task_id}", response_model=TaskInfo)
+async def get_job(task_id: str):
+    info = job_queue.get(task_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return info
+
+@app.post("/api/v1/detect/video")
+async def detect_video(file: UploadFile = File(...), fps: float = Form(settings.VIDEO_SAMPLE_FPS),
+                       mode: str = Form("fixed")):
+    """
+    Покадровая детекция по видео, результаты отдаются потоком NDJSON
+
+    mode: fixed - каждый кадр с частотой fps через модель,
+          adaptive - модель только на ключевых кадрах, между ними трекинг
+    """
+    if mode not in ("fixed", "adaptive"):
+        raise HTTPException(status_code=400, detail="mode должен быть fixed или adaptive")
+    task_id = str(uuid.uuid4())
+    suffix = Path(file.filename or "").suffix or ".mp4"
+    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+
+    # VideoCapture читает только из файла - копируем загрузку кусками
+    def _spool():
+        with tmp:
+            shutil.copyfileobj(file.file, tmp, 1 << 20)
+
+    # Временный файл удаляется фоновой задачей ответа: она выполняется и при
+    # обрыве соединения, даже если тело ответа так и не начали читать.
+    # До создания ответа (ошибка загрузки, 503) удаляем сами.
+    try:
+        await run_in_threadpool(_spool)
+        await wait_model_ready()
+    except BaseException:
+        remove_file(tmp.name)
+        raise
+
+    if mode == "adaptive":
+        results = stream_adaptive_video_detections(
+            tmp.name, task_id, scheduler, db,
+            candidate_fps=settings.VIDEO_CANDIDATE_FPS,
+            batch_size=settings.INFERENCE_MAX_BATCH,
+            change_threshold=settings.VIDEO_KEYFRAME_CHANGE,
+            max_gap=settings.VIDEO_MAX_KEYFRAME_GAP,
+            analysis_width=settings.VIDEO_ANALYSIS_WIDTH
+        )
+    else:
+        results = stream_video_detections(
+            tmp.name, task_id, scheduler, db, fps=fps, batch_size=settings.INFERENCE_MAX_BATCH
+        )
+
+    async def _ndjson():
+        try:
+            async for item in results:
+                if item.get("status") == "completed":
+                    # detections_count видео - сумма по кадрам, только для истории:
+                    # объектов у задачи нет, в статистику детекций она не входит
+                    await db.aio.save_detection_task({
+                        "task_id": task_id,
+                        "image_path": file.filename,
+                        "detections_count": item["detections_count"],
+                        "detections": [],
+                        "processing_time": float(item["processing_time"]),
+                        "lat": None,
+                        "lon": None
+                    })
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.error(f"Ошибка обработки видео: {e}")
+            yield json.dumps({"task_id": task_id, "status": "error", "message": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson",
+                             background=BackgroundTask(remove_file, tmp.name))
+
+def pool_status():
+    """Состояние пула процессов инференса для health"""
+    if worker_pool is None:
+        return {"workers": 0}
+    status = worker_pool.status()
+    return {"workers": worker_pool.size, "workers_alive": status["alive"], "workers_failed": status["failed"],
+            "pool_degraded": status["degraded"], "worker_memory_mb": worker_pool.memory_mb()}
+
+@app.get("/api/v1/health", response_model=HealthResponse)
+async def health(response: Response):
+    ready = model_ready is not None and model_ready.is_set() and model_error is None
+    if not ready:
+        response.status_code = 503
+    pool = pool_status()
+    if not ready:
+        status = "error" if model_error else "loading"
+    else:
+        # Часть процессов инференса упала и не поднимается - сервис работает медленнее
+        status = "degraded" if pool.get("pool_degraded") else "ok"
+    return HealthResponse(
+        status=status,
+        model_ready=ready,
+        timestamp=datetime.now(),
+        system={**system_info, "backend": detector.backend, **pool}
+    )
+
+@app.get("/api/v1/optimization", response_model=OptimizationConfig)
+async def optimization():
+    return OptimizationConfig(
+        use_openvino=detector.backend == "openvino",
+        use_onnx=detector.backend in ("onnx", "onnx-int8"),
+        use_sahi=settings.USE_SAHI,
+        max_image_size=settings.MODEL_IMGSZ,
+        cpu_threads=settings.CPU_THREADS,
+        batch_size=settings.INFERENCE_MAX_BATCH
+    )
+
+def bbox_param(min_lat, min_lon, max_lat, max_lon):
+    """Прямоугольник из параметров запроса: все четыре границы или ни одной"""
+    corners = (min_lat, min_lon, max_lat, max_lon)
+    if all(v is None for v in corners):
+        return None
+    if any(v is None for v in corners):
+        raise HTTPException(status_code=422, detail="Нужны все четыре границы: min_lat, min_lon, max_lat, max_lon")
+    return corners
+
+def db_timestamp(value):
+    """Время в формате БД: CURRENT_TIMESTAMP (UTC, 'YYYY-MM-DD HH:MM:SS')"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
 
-@app.get("/api/v1/health")
-async def health(): return {"status": "ok"}
+@app.get("/api/v1/geo/points")
+async def geo_points(min_lat: Optional[float] = None, min_lon: Optional[float] = None,
+                     max_lat: Optional[float] = None, max_lon: Optional[float] = None,
+                     start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     classes: Optional[List[str]] = Query(None),
+                     min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+                     limit: int = Query(5000, ge=1, le=50000)):
+    """
+    Точки снимков для карты: прямоугольник, интервал времени, классы объектов
 
-@app.get("/api/v1/tasks")
-async def get_tasks(): return db.get_history()
+    Фильтрация идет на сервере по пространственному индексу, клиент
+    получает только попавшие в область точки.
+    """
+    bbox = bbox_param(min_lat, min_lon, max_lat, max_lon)
+    points = await db.aio.query_points(bbox, db_timestamp(start), db_timestamp(end), classes, limit, min_confidence)
+    return {"count": len(points), "points": points}
+
+@app.get("/api/v1/geo/clusters")
+async def geo_clusters(min_lat: float = Query(..., ge=-90, le=90), min_lon: float = Query(..., ge=-180, le=180),
+                       max_lat: float = Query(..., ge=-90, le=90), max_lon: float = Query(..., ge=-180, le=180),
+                       zoom: Optional[int] = Query(None, ge=0, le=22),
+                       start: Optional[datetime] = None, end: Optional[datetime] = None,
+                       classes: Optional[List[str]] = Query(None),
+                       min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0)):
+    """
+    Объекты окна карты, сгруппированные в ячейки сетки уровня zoom
+
+    Без zoom выбирается самый подробный уровень, при котором окно
+    укладывается в CLUSTER_MAX_TILES тайлов.
+    """
+    bbox = (min_lat, min_lon, max_lat, max_lon)
+    try:
+        return await run_in_threadpool(cluster_index.clusters, bbox, zoom, db_timestamp(start), db_timestamp(end),
+                                       classes, min_confidence)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.get("/api/v1/export")
+async def export_detections(format: ExportFormat = ExportFormat.GEOJSON, gzip: bool = False,
+                            min_lat: Optional[float] = None, min_lon: Optional[float] = None,
+                            max_lat: Optional[float] = None, max_lon: Optional[float] = None,
+                            start: Optional[datetime] = None, end: Optional[datetime] = None,
+                            classes: Optional[List[str]] = Query(None),
+                            min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0)):
+    """
+    Потоковый экспорт объектов (KML / GeoJSON / CSV / JSON, опционально gzip)
+
+    Строки читаются курсором БД кусками и сразу уходят клиенту chunked-ответом,
+    память не зависит от объема выгрузки.
+    """
+    bbox = bbox_param(min_lat, min_lon, max_lat, max_lon)
+    chunks = db.iter_objects(bbox, db_timestamp(start), db_timestamp(end), classes, min_confidence)
+    body = export_service.stream(chunks, format)
+    filename = f"argus_export.{format.value}"
+    media_type = MEDIA_TYPES[format]
+    if gzip:
+        body = export_service.gzip(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/api/v1/statistics", response_model=StatisticsResponse)
+async def get_statistics(days: int = Query(30, ge=1, le=366)):
+    """Сводная статистика (из постоянно обновляемых сводных таблиц)"""
+    return StatisticsResponse(**await db.aio.get_statistics(days))
+
+@app.get("/api/v1/tasks", response_model=TaskHistoryPage)
+async def get_tasks(limit: int = Query(50, ge=1, le=1000), cursor: Optional[str] = None,
+                    fields: Optional[str] = None, include_detections: bool = False):
+    """
+    История задач постранично
+
+    Args:
+        limit: Строк на странице
+        cursor: next_cursor из предыдущего ответа
+        fields: Колонки через запятую (по умолчанию все, кроме detections)
+        include_detections: Добавить списки детекций
+    """
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        items, next_cursor = await db.aio.get_history(limit, cursor, field_list, include_detections)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return TaskHistoryPage(items=items, next_cursor=next_cursor)
 
 @app.post("/api/v1/compare")
-async def compare(file1: UploadFile = File(...), file2: UploadFile = File(...), method: str = Form("absdiff"), threshold: int = Form(30)):
-    p1 = settings.UPLOAD_DIR / f"cmp1_{uuid.uuid4().hex}.png"
-    p2 = settings.UPLOAD_DIR / f"cmp2_{uuid.uuid4().hex}.png"
-    with p1.open("wb") as b1: shutil.copyfileobj(file1.file, b1)
-    with p2.open("wb") as b2: shutil.copyfileobj(file2.file, b2)
-    result = change_detector.compare(str(p1), str(p2), threshold=threshold, method=method)
-    return {"status": "success", "result": result}
+async def compare(file1: UploadFile = File(...), file2: UploadFile = File(...),
+                  method: ComparisonMethod = Form(ComparisonMethod.ABSDIFF), threshold: int = Form(30),
+                  min_area: Optional[int] = Form(None), register: bool = Form(True)):
+    """Области изменений между снимками ДО / ПОСЛЕ (формат ComparisonResponse)"""
+    data1, data2 = await file1.read(), await file2.read()
+    img1, img2 = await asyncio.gather(run_in_threadpool(decode_image, data1), run_in_threadpool(decode_image, data2))
+    if img1 is None or img2 is None:
+        return {"status": "error", "message": "Не удалось прочитать изображения"}
+
+    def _compare():
+        # Хэш файла - ключ кэша ключевых точек: опорный снимок обрабатывается один раз
+        return change_detector.compare_arrays(img1, img2, threshold=threshold, method=method.value,
+                                              min_area=min_area, key1=content_key(data1),
+                                              key2=content_key(data2), register=register)
+
+    result = await run_in_threadpool(_compare)
+    return {"status": "success", "result": ComparisonResponse(**result)}
 
 if __name__ == "__main__":
     # Render передает PORT в переменную окружения
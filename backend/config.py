@@ -9,12 +9,84 @@ class Settings:
     
     # Путь к модели
     MODEL_PATH = str(BASE_DIR / "models" / "yolov8n.pt")
+    # Кэш экспортированных моделей (OpenVINO IR / ONNX), должен быть доступен на запись
+    MODEL_CACHE_DIR = str(BASE_DIR.parent / "model_cache")
+    MODEL_IMGSZ = 640
+
+    # INT8 режим (onnxruntime, статическая калибровка по своим кадрам)
+    USE_INT8 = False
+    INT8_CALIB_DIR = str(BASE_DIR.parent / "calibration")
+    INT8_CALIB_LIMIT = 200
     
     # Настройки оптимизации (добавляем те, которых не хватало)
     USE_OPENVINO = True
+    USE_ONNX = True
     USE_SAHI = True
     CPU_THREADS = 4
 
+    # Слайсинг больших кадров (включается USE_SAHI)
+    SLICE_SIZE = 512
+    SLICE_OVERLAP = 0.2
+    SLICE_BATCH_SIZE = 8
+    SLICE_NMS_IOU = 0.5
+    SLICE_FULL_FRAME = True
+    # Предфильтр пустых тайлов: gradient / variance / edges, 0 - выключен
+    SLICE_SKIP_METRIC = "gradient"
+    SLICE_SKIP_THRESHOLD = 3.0
+
+    # Сколько секунд запрос ждет окончания прогрева модели, прежде чем получить 503
+    MODEL_READY_TIMEOUT = 120
+
+    # Микро-батчинг инференса
+    INFERENCE_MAX_BATCH = 8
+    INFERENCE_MAX_WAIT_MS = 15
+    # Пул процессов инференса: 0 - инференс в процессе API
+    INFERENCE_WORKERS = 0
+    INFERENCE_CORES_PER_WORKER = 0  # 0 - ядра делятся поровну
+    # OpenVINO / ONNX: каждый процесс компилирует свою сессию (память модели
+    # умножается на число процессов), поэтому для них процессов не больше этого;
+    # фактический расход - worker_memory_mb в /api/v1/health
+    INFERENCE_MAX_SESSION_WORKERS = 2
+
+    # Кэш результатов по хэшу содержимого (LRU в памяти + таблица SQLite)
+    RESULT_CACHE_SIZE = 1024
+    RESULT_CACHE_PERSIST = True
+
+    # Сохранять ли оригиналы снимков в UPLOAD_DIR (в фоне, вне пути запроса)
+    SAVE_UPLOADS = True
+
+    # Координаты каждого объекта по положению в кадре (EXIF: высота, подвес, камера)
+    GEOREFERENCE = True
+
+    # Кластеры на карте: ячейка в пикселях экрана, тайлов в окне, тайлов в кэше
+    CLUSTER_CELL_PX = 64
+    CLUSTER_MAX_TILES = 64
+    CLUSTER_CACHE_SIZE = 2048
+
+    # Совмещение снимков перед сравнением: orb / akaze, "" - выключено;
+    # точек на снимок и снимков в кэше ключевых точек
+    REGISTRATION_METHOD = "orb"
+    REGISTRATION_FEATURES = 5000
+    REGISTRATION_CACHE_SIZE = 64
+
+    # Пакетная загрузка: кадров в одном куске декодирования и потоков декодера
+    BULK_CHUNK_SIZE = 32
+    DECODE_THREADS = 4
+
+    # Асинхронные задачи (POST /api/v1/jobs): размер очереди, воркеры, история
+    JOB_QUEUE_SIZE = 100
+    JOB_WORKERS = 4
+    JOB_HISTORY_SIZE = 1000
+
+    # Видео: частота выборки кадров для детекции
+    VIDEO_SAMPLE_FPS = 1.0
+    # Адаптивный режим: кандидаты с этой частотой, ключевой кадр при доле
+    # изменившихся пикселей выше порога или по истечении максимального интервала
+    VIDEO_CANDIDATE_FPS = 5.0
+    VIDEO_KEYFRAME_CHANGE = 0.02
+    VIDEO_MAX_KEYFRAME_GAP = 5.0
+    VIDEO_ANALYSIS_WIDTH = 320
+
 settings = Settings()
 
 # Создаем необходимые папки при старте
@@ -0,0 +1,134 @@
+"""
+Бэкенды исполнения модели: OpenVINO, ONNX Runtime, PyTorch
+
+Экспорт выполняется один раз в записываемую папку кэша
+(settings.MODEL_CACHE_DIR), ключ кэша - хэш весов. При следующих
+запусках сразу загружается готовый IR/ONNX граф. PyTorch используется
+только если ни один ускоренный бэкенд не поднялся.
+"""
+
+import hashlib
+import importlib.util
+import logging
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Tuple
+
+from ultralytics import YOLO
+
+from backend.config import settings
+
+logger = logging.getLogger("ArgusBackends")
+
+# Порядок важен: сначала самый быстрый на Intel CPU
+BACKENDS = {
+    "openvino": {"format": "openvino", "artifact": "model_openvino_model", "module": "openvino"},
+    "onnx": {"format": "onnx", "artifact": "model.onnx", "module": "onnxruntime"},
+}
+
+
+def model_hash(model_path, chunk_size: int = 1 << 20) -> str:
+    """Короткий sha256 файла весов - ключ кэша экспортированных моделей"""
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def enabled_backends():
+    """Список ускоренных бэкендов, включенных в настройках и установленных"""
+    wanted = []
+    if settings.USE_OPENVINO:
+        wanted.append("openvino")
+    if settings.USE_ONNX:
+        wanted.append("onnx")
+    return [name for name in wanted if importlib.util.find_spec(BACKENDS[name]["module"]) is not None]
+
+
+def cache_dir_for(model_path) -> Path:
+    model_path = Path(model_path)
+    return Path(settings.MODEL_CACHE_DIR) / f"{model_path.stem}-{model_hash(model_path)}"
+
+
+def export_model(model_path, backend: str) -> Path:
+    """
+    Экспорт весов в формат бэкенда (если еще не экспортировано)
+
+    Ultralytics пишет результат рядом с исходным .pt, поэтому экспорт
+    делается из копии весов во временной папке внутри кэша, а готовый
+    артефакт атомарно переносится на место.
+
+    Returns:
+        Path: Путь к артефакту (папка IR или .onnx файл)
+    """
+    spec = BACKENDS[backend]
+    target_dir = cache_dir_for(model_path)
+    artifact = target_dir / spec["artifact"]
+    if artifact.exists():
+        return artifact
+
+    target_dir.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix=f".{backend}-", dir=target_dir))
+    try:
+        work_weights = work_dir / "model.pt"
+        shutil.copy2(model_path, work_weights)
+        logger.info(f"⚡ Экспорт {Path(model_path).name} -> {backend} в {target_dir}")
+        # dynamic=True - граф принимает пачки произвольного размера
+        exported = YOLO(str(work_weights)).export(
+            format=spec["format"], imgsz=settings.MODEL_IMGSZ, dynamic=True
+        )
+        exported = Path(exported)
+        if not exported.exists():
+            raise FileNotFoundError(f"Экспорт не создал {exported}")
+        try:
+            exported.rename(artifact)
+        except OSError:
+            # Параллельный процесс успел раньше - используем его результат
+            if not artifact.exists():
+                raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return artifact
+
+
+def load_model(model_path=None) -> Tuple[YOLO, str]:
+    """
+    Загрузка модели через лучший доступный бэкенд
+
+    Returns:
+        (модель YOLO, имя бэкенда: onnx-int8 / openvino / onnx / torch)
+    """
+    model_path = Path(model_path or settings.MODEL_PATH)
+
+    if model_path.exists() and settings.USE_INT8:
+        try:
+            from backend.models.quantization import build_int8
+            artifact = build_int8(model_path=model_path)
+            model = YOLO(str(artifact), task="detect")
+            logger.info(f"✅ Модель загружена в INT8: {artifact}")
+            return model, "onnx-int8"
+        except Exception as e:
+            logger.warning(f"⚠️ INT8 режим недоступен, используем FP32: {e}")
+
+    if model_path.exists():
+        for backend in enabled_backends():
+            try:
+                artifact = export_model(model_path, backend)
+                model = YOLO(str(artifact), task="detect")
+                logger.info(f"✅ Модель загружена через {backend}: {artifact}")
+                return model, backend
+            except Exception as e:
+                logger.warning(f"⚠️ Бэкенд {backend} недоступен, пробуем следующий: {e}")
+
+    return _load_torch(model_path), "torch"
+
+
+def _load_torch(model_path: Path) -> YOLO:
+    try:
+        return YOLO(str(model_path))
+    except Exception:
+        # Файла нет - ultralytics скачает стандартные веса
+        return YOLO("yolov8n.pt")
+
@@ -1,31 +1,49 @@
-import os
+import threading
 from pathlib import Path
-from ultralytics import YOLO
+from backend.config import settings
+from backend.models.backends import load_model
 
 class ModelManager:
-    def __init__(self, model_name="yolov8n.pt"):
+    """Единственный загрузчик модели: детектор, слайсер и сервисы делят один экземпляр"""
+
+    def __init__(self, model_name=Path(settings.MODEL_PATH).name):
         # Определяем путь: папка проекта / backend / models
         self.models_dir = Path(__file__).parent.resolve()
         self.models_dir.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
         self.model_path = self.models_dir / model_name
         self.model = None
+        self.backend = None
+        self._lock = threading.Lock()
 
     def load_model(self):
         """Загружает модель. Если файла нет, YOLO скачает его автоматически."""
         try:
             if not self.model_path.exists():
                 print(f"📥 Модель не найдена. Начинаю загрузку {self.model_name}...")
-                # При указании только имени 'yolov8n.pt', библиотека скачает её в текущую директорию
-                # а затем мы её переместим или сохраним по нужному пути.
-                self.model = YOLO("yolov8n.pt") 
-                self.model.save(str(self.model_path))
+                # Стандартные веса ultralytics скачиваются сразу по нужному пути
+                from ultralytics.yolo.utils.downloads import attempt_download_asset
+                attempt_download_asset(str(self.model_path))
                 print(f"✅ Модель сохранена в: {self.model_path}")
-            else:
-                self.model = YOLO(str(self.model_path))
-            
+
+            # Ускоренный бэкенд (INT8 / OpenVINO / ONNX) поверх скачанных весов
+            self.model, self.backend = load_model(self.model_path)
+
             return self.model
         except Exception as e:
             print(f"❌ Критическая ошибка при загрузке модели: {e}")
             return None
 
-model_manager = ModelManager()
\ No newline at end of file
+    def get(self):
+        """
+        Общая модель процесса (загружается один раз, потокобезопасно)
+
+        Returns:
+            (модель YOLO или None, имя бэкенда)
+        """
+        with self._lock:
+            if self.model is None:
+                self.load_model()
+        return self.model, self.backend
+
+model_manager = ModelManager()
@@ -0,0 +1,262 @@
+"""
+INT8 квантование модели (post-training, статическая калибровка)
+
+Сборка:
+    python -m backend.models.quantization build --calib path/to/frames
+
+Отчет о просадке точности и ускорении относительно FP32:
+    python -m backend.models.quantization report --holdout path/to/frames [--labels path/to/labels]
+
+Если папка разметки (формат YOLO txt) не задана, эталоном служат
+предсказания FP32 модели, и mAP показывает согласие INT8 с FP32.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from backend.config import settings
+from backend.models.backends import export_model, model_hash
+from backend.utils.image_processor import ImageProcessor
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+
+
+def list_images(folder) -> List[Path]:
+    return sorted(p for p in Path(folder).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+def int8_path(model_path=None) -> Path:
+    """Путь к INT8 модели в кэше рядом с backend/models/"""
+    model_path = Path(model_path or settings.MODEL_PATH)
+    return model_path.parent / f"{model_path.stem}-{model_hash(model_path)}.int8.onnx"
+
+
+class _FolderCalibrationReader:
+    """Поставщик калибровочных кадров для onnxruntime.quantization"""
+
+    def __init__(self, images: List[Path], input_name: str, imgsz: int):
+        self.images = iter(images)
+        self.input_name = input_name
+        self.processor = ImageProcessor(max_size=imgsz)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        for path in self.images:
+            img = cv2.imread(str(path))
+            if img is None:
+                continue
+            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            return {self.input_name: self.processor.preprocess_for_yolo(rgb, self.imgsz)}
+        return None
+
+
+def build_int8(calib_dir=None, model_path=None, limit: Optional[int] = None) -> Path:
+    """
+    Сборка INT8 модели из папки калибровочных кадров
+
+    Returns:
+        Path: Путь к INT8 .onnx
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    model_path = Path(model_path or settings.MODEL_PATH)
+    target = int8_path(model_path)
+    if target.exists():
+        return target
+
+    calib_dir = calib_dir or settings.INT8_CALIB_DIR
+    images = list_images(calib_dir)[:limit or settings.INT8_CALIB_LIMIT]
+    if not images:
+        raise FileNotFoundError(f"Нет калибровочных кадров в {calib_dir}")
+
+    fp32 = export_model(model_path, "onnx")
+    fp32_model = onnx.load(str(fp32))
+    input_name = fp32_model.graph.input[0].name
+
+    print(f"⚙️ INT8 калибровка на {len(images)} кадрах...")
+    tmp = target.with_suffix(".tmp.onnx")
+    quantize_static(
+        str(fp32),
+        str(tmp),
+        _FolderCalibrationReader(images, input_name, settings.MODEL_IMGSZ),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+
+    # Метаданные ultralytics (имена классов, stride, imgsz) нужны при загрузке
+    quantized = onnx.load(str(tmp))
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(quantized, str(tmp))
+    tmp.replace(target)
+
+    print(f"✅ INT8 модель сохранена: {target}")
+    return target
+
+
+def _iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def mean_average_precision(predictions: list, references: list, iou_threshold: float = 0.5) -> float:
+    """
+    mAP@iou по всем классам (интерполяция по всем точкам)
+
+    Args:
+        predictions: На каждый кадр список детекций {"class", "conf", "bbox"}
+        references: На каждый кадр список эталонных {"class", "bbox"}
+    """
+    classes = {d["class"] for frame in references for d in frame}
+    if not classes:
+        return 0.0
+
+    aps = []
+    for cls in classes:
+        scored = []
+        total_refs = 0
+        for preds, refs in zip(predictions, references):
+            ref_boxes = np.array([r["bbox"] for r in refs if r["class"] == cls], dtype=np.float64).reshape(-1, 4)
+            total_refs += len(ref_boxes)
+            cls_preds = sorted((p for p in preds if p["class"] == cls), key=lambda p: -p["conf"])
+            if not cls_preds:
+                continue
+            pred_boxes = np.array([p["bbox"] for p in cls_preds], dtype=np.float64)
+            matched = np.zeros(len(ref_boxes), dtype=bool)
+            ious = _iou_matrix(pred_boxes, ref_boxes) if len(ref_boxes) else None
+            for i, pred in enumerate(cls_preds):
+                hit = False
+                if ious is not None:
+                    candidates = np.where((ious[i] >= iou_threshold) & ~matched)[0]
+                    if candidates.size:
+                        matched[candidates[np.argmax(ious[i, candidates])]] = True
+                        hit = True
+                scored.append((pred["conf"], hit))
+
+        if total_refs == 0:
+            continue
+        scored.sort(key=lambda s: -s[0])
+        hits = np.array([h for _, h in scored], dtype=np.float64)
+        tp = np.cumsum(hits)
+        fp = np.cumsum(1 - hits)
+        recall = np.concatenate([[0.0], tp / total_refs, [1.0]])
+        precision = np.concatenate([[1.0], tp / np.maximum(tp + fp, 1e-9), [0.0]])
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        aps.append(float(np.sum(np.diff(recall) * precision[1:])))
+
+    return float(np.mean(aps)) if aps else 0.0
+
+
+def _load_yolo_labels(label_file: Path, names: dict, width: int, height: int) -> list:
+    refs = []
+    if not label_file.exists():
+        return refs
+    for line in label_file.read_text().splitlines():
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+        cls, cx, cy, bw, bh = int(parts[0]), *map(float, parts[1:5])
+        refs.append({
+            "class": names.get(cls, str(cls)),
+            "bbox": [(cx - bw / 2) * width, (cy - bh / 2) * height,
+                     (cx + bw / 2) * width, (cy + bh / 2) * height],
+        })
+    return refs
+
+
+def _predict_timed(model, images: List[np.ndarray], conf: float):
+    predictions, latencies = [], []
+    model(images[0], conf=conf, verbose=False)  # прогрев
+    for img in images:
+        start = time.perf_counter()
+        res = model(img, conf=conf, verbose=False)[0]
+        latencies.append(time.perf_counter() - start)
+        predictions.append([
+            {"class": model.names[int(b.cls)], "conf": float(b.conf), "bbox": b.xyxy[0].tolist()}
+            for b in res.boxes
+        ])
+    return predictions, np.array(latencies) * 1000
+
+
+def report(holdout_dir, labels_dir=None, model_path=None, conf: float = 0.25) -> dict:
+    """
+    Сравнение INT8 и FP32 на отложенной выборке: mAP и задержка на кадр
+
+    Returns:
+        dict: Отчет (его же печатает CLI)
+    """
+    from ultralytics import YOLO
+
+    model_path = Path(model_path or settings.MODEL_PATH)
+    paths = list_images(holdout_dir)
+    images = [img for img in (cv2.imread(str(p)) for p in paths) if img is not None]
+    if not images:
+        raise FileNotFoundError(f"Нет кадров в {holdout_dir}")
+
+    fp32 = YOLO(str(model_path))
+    int8 = YOLO(str(build_int8(model_path=model_path)), task="detect")
+
+    fp32_preds, fp32_ms = _predict_timed(fp32, images, conf)
+    int8_preds, int8_ms = _predict_timed(int8, images, conf)
+
+    if labels_dir:
+        references = [
+            _load_yolo_labels(Path(labels_dir) / f"{p.stem}.txt", fp32.names, img.shape[1], img.shape[0])
+            for p, img in zip(paths, images)
+        ]
+        reference_name = "labels"
+    else:
+        references = fp32_preds
+        reference_name = "fp32"
+
+    fp32_map = mean_average_precision(fp32_preds, references)
+    int8_map = mean_average_precision(int8_preds, references)
+
+    def _latency(ms):
+        return {"mean": float(ms.mean()), "p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95))}
+
+    return {
+        "images": len(images),
+        "reference": reference_name,
+        "map50": {"fp32": fp32_map, "int8": int8_map, "drift": int8_map - fp32_map},
+        "latency_ms": {"fp32": _latency(fp32_ms), "int8": _latency(int8_ms)},
+        "speedup": float(fp32_ms.mean() / max(int8_ms.mean(), 1e-9)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 квантование модели Argus Eye")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build_cmd = sub.add_parser("build", help="Собрать INT8 модель по калибровочным кадрам")
+    build_cmd.add_argument("--calib", default=settings.INT8_CALIB_DIR, help="Папка калибровочных кадров")
+    build_cmd.add_argument("--limit", type=int, default=settings.INT8_CALIB_LIMIT)
+
+    report_cmd = sub.add_parser("report", help="Отчет mAP / задержка INT8 против FP32")
+    report_cmd.add_argument("--holdout", required=True, help="Папка отложенных кадров")
+    report_cmd.add_argument("--labels", default=None, help="Разметка YOLO txt (необязательно)")
+    report_cmd.add_argument("--conf", type=float, default=0.25)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        print(build_int8(args.calib, limit=args.limit))
+    else:
+        print(json.dumps(report(args.holdout, args.labels, conf=args.conf), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
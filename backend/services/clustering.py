@@ -0,0 +1,214 @@
+"""
+Кластеризация точек объектов для карты по уровням масштаба
+
+Точки раскладываются по ячейкам сетки Web Mercator: тайл 256x256
+пикселей уровня zoom делится на ячейки cell_px x cell_px. Раскладка
+векторная (NumPy): номер ячейки, число точек, центр масс и разбивка
+по классам считаются через np.unique / np.bincount без цикла по точкам.
+Ячейки не пересекают границ тайлов, поэтому результат кэшируется
+по (zoom, тайл) и собирается для любого окна карты из готовых тайлов.
+Тайлы, целиком лежащие в окне, берутся из кэша как есть; на краях окна
+точки тайла (они кэшируются вместе с кластерами) сначала обрезаются по
+окну, и кластеры пересчитываются только по видимым точкам.
+Новые точки сбрасывают из кэша только те тайлы, в которые попали
+(invalidate вызывается БД после коммита), остальные остаются.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TILE_SIZE = 256
+MAX_LAT = 85.05112878
+
+
+def lonlat_to_pixels(lat: np.ndarray, lon: np.ndarray, zoom: int):
+    """Пиксельные координаты Web Mercator на уровне zoom"""
+    world = TILE_SIZE * (1 << zoom)
+    lat = np.radians(np.clip(lat, -MAX_LAT, MAX_LAT))
+    x = (lon + 180.0) / 360.0 * world
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * world
+    return x, y
+
+
+def tile_bounds(zoom: int, tx: int, ty: int) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) тайла"""
+    n = 1 << zoom
+
+    def _lat(y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+    return _lat(ty + 1), tx / n * 360.0 - 180.0, _lat(ty), (tx + 1) / n * 360.0 - 180.0
+
+
+def tile_inside(bbox: Sequence[float], zoom: int, tx: int, ty: int) -> bool:
+    """Лежит ли тайл целиком внутри прямоугольника"""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    t_min_lat, t_min_lon, t_max_lat, t_max_lon = tile_bounds(zoom, tx, ty)
+    return min_lat <= t_min_lat and t_max_lat <= max_lat and min_lon <= t_min_lon and t_max_lon <= max_lon
+
+
+def tile_range(bbox: Sequence[float], zoom: int) -> Tuple[int, int, int, int]:
+    """Номера крайних тайлов (x0, x1, y0, y1), покрывающих прямоугольник"""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    x, y = lonlat_to_pixels(np.array([max_lat, min_lat]), np.array([min_lon, max_lon]), zoom)
+    last = (1 << zoom) - 1
+    x0, x1 = (min(max(int(v // TILE_SIZE), 0), last) for v in x)
+    y0, y1 = (min(max(int(v // TILE_SIZE), 0), last) for v in y)
+    return x0, x1, y0, y1
+
+
+def tile_count(bbox: Sequence[float], zoom: int) -> int:
+    """Число тайлов окна - без построения списка"""
+    x0, x1, y0, y1 = tile_range(bbox, zoom)
+    return (x1 - x0 + 1) * (y1 - y0 + 1)
+
+
+def tiles_for_bbox(bbox: Sequence[float], zoom: int) -> List[Tuple[int, int]]:
+    """Тайлы уровня zoom, покрывающие прямоугольник"""
+    x0, x1, y0, y1 = tile_range(bbox, zoom)
+    return [(tx, ty) for tx in range(x0, x1 + 1) for ty in range(y0, y1 + 1)]
+
+
+def auto_zoom(bbox: Sequence[float], max_tiles: int, max_zoom: int = 18) -> int:
+    """Самый подробный уровень, на котором окно укладывается в max_tiles тайлов"""
+    for zoom in range(max_zoom, -1, -1):
+        if tile_count(bbox, zoom) <= max_tiles:
+            return zoom
+    return 0
+
+
+def cluster_points(lat: np.ndarray, lon: np.ndarray, classes: Sequence[str], zoom: int,
+                   cell_px: int = 64) -> List[dict]:
+    """
+    Точки по ячейкам сетки
+
+    Returns:
+        list[dict]: lat, lon (центр масс ячейки), count, classes {класс: число}
+    """
+    if len(lat) == 0:
+        return []
+    x, y = lonlat_to_pixels(lat, lon, zoom)
+    cells_per_row = (TILE_SIZE * (1 << zoom)) // cell_px
+    cell = np.floor(y / cell_px).astype(np.int64) * cells_per_row + np.floor(x / cell_px).astype(np.int64)
+
+    cell_ids, cell_index = np.unique(cell, return_inverse=True)
+    counts = np.bincount(cell_index)
+    center_lat = np.bincount(cell_index, weights=lat) / counts
+    center_lon = np.bincount(cell_index, weights=lon) / counts
+
+    class_names, class_index = np.unique(np.asarray(classes, dtype=object).astype(str), return_inverse=True)
+    per_class = np.bincount(cell_index * len(class_names) + class_index,
+                            minlength=len(cell_ids) * len(class_names)).reshape(len(cell_ids), len(class_names))
+
+    clusters = []
+    for i in range(len(cell_ids)):
+        nonzero = np.nonzero(per_class[i])[0]
+        clusters.append({
+            "lat": float(center_lat[i]),
+            "lon": float(center_lon[i]),
+            "count": int(counts[i]),
+            "classes": {str(class_names[k]): int(per_class[i, k]) for k in nonzero},
+        })
+    return clusters
+
+
+class ClusterIndex:
+    """Кластеры по тайлам с LRU-кэшем и инвалидацией затронутых тайлов"""
+
+    def __init__(self, load_points: Callable, cell_px: int = 64, max_tiles: int = 64, cache_size: int = 2048):
+        """
+        Args:
+            load_points: load_points(bbox, start, end, classes, min_confidence) -> (широты, долготы, классы)
+            cell_px: Размер ячейки в пикселях экрана
+            max_tiles: Максимум тайлов в одном окне
+            cache_size: Тайлов в кэше
+        """
+        self.load_points = load_points
+        self.cell_px = cell_px
+        self.max_tiles = max_tiles
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Растет при каждой инвалидации: тайл, прочитанный во время записи, не кэшируется
+        self._epoch = 0
+
+    def invalidate(self, lat: Sequence[float], lon: Sequence[float]):
+        """Сбросить тайлы всех уровней, в которые попали новые точки"""
+        lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+        if not len(lat):
+            return
+        with self._lock:
+            self._epoch += 1
+            touched = set()
+            for zoom in {key[0] for key in self._cache}:
+                x, y = lonlat_to_pixels(lat, lon, zoom)
+                tiles = np.unique(np.stack([np.floor(x / TILE_SIZE), np.floor(y / TILE_SIZE)], axis=1), axis=0)
+                touched.update((zoom, int(tx), int(ty)) for tx, ty in tiles)
+            for key in [key for key in self._cache if key[:3] in touched]:
+                del self._cache[key]
+
+    def _tile(self, zoom, tx, ty, filters):
+        key = (zoom, tx, ty, filters)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            epoch = self._epoch
+        start, end, classes, min_confidence = filters
+        lat, lon, names = self.load_points(tile_bounds(zoom, tx, ty), start, end,
+                                           list(classes) if classes else None, min_confidence)
+        lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+        # Точка на общей границе тайлов попадает в оба запроса - оставляем только свой тайл
+        if len(lat):
+            x, y = lonlat_to_pixels(lat, lon, zoom)
+            own = (np.floor(x / TILE_SIZE) == tx) & (np.floor(y / TILE_SIZE) == ty)
+            lat, lon, names = lat[own], lon[own], [n for n, keep in zip(names, own) if keep]
+        names = np.asarray(names, dtype=object)
+        entry = (lat, lon, names, cluster_points(lat, lon, names, zoom, self.cell_px))
+        with self._lock:
+            if epoch != self._epoch:
+                # Пока тайл читался, пришли новые точки - кэшировать нельзя
+                return entry
+            self._cache[key] = entry
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def _tile_clusters(self, bbox, zoom, tx, ty, filters):
+        """Кластеры тайла по точкам, попавшим в окно"""
+        lat, lon, names, clusters = self._tile(zoom, tx, ty, filters)
+        if tile_inside(bbox, zoom, tx, ty):
+            return clusters
+        min_lat, min_lon, max_lat, max_lon = bbox
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return cluster_points(lat[inside], lon[inside], names[inside], zoom, self.cell_px)
+
+    def clusters(self, bbox, zoom: Optional[int] = None, start=None, end=None,
+                 classes=None, min_confidence=None) -> dict:
+        """
+        Кластеры для окна карты
+
+        Raises:
+            ValueError: Окно на этом уровне покрывает больше max_tiles тайлов
+        """
+        if zoom is None:
+            zoom = auto_zoom(bbox, self.max_tiles)
+        # Проверка до построения списка: широкое окно на крупном zoom - миллиарды тайлов
+        count = tile_count(bbox, zoom)
+        if count > self.max_tiles:
+            raise ValueError(f"Окно покрывает {count} тайлов (максимум {self.max_tiles}), уменьшите zoom")
+        tiles = tiles_for_bbox(bbox, zoom)
+        filters = (start, end, tuple(sorted(classes)) if classes else None, min_confidence)
+        clusters = []
+        for tx, ty in tiles:
+            clusters.extend(self._tile_clusters(bbox, zoom, tx, ty, filters))
+        return {
+            "zoom": zoom,
+            "tiles": len(tiles),
+            "total": sum(c["count"] for c in clusters),
+            "clusters": clusters,
+        }
@@ -11,7 +11,7 @@ class DetectionService:
 
     async def process(self, image_path: Path, use_sahi=False):
         if self.model is None:
-            self.model = model_manager.load_model()
+            self.model, _ = model_manager.get()
         
         if self.model is None:
             return [], 0.0
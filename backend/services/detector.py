@@ -1,10 +1,13 @@
 import time
+import threading
 import cv2
 import numpy as np
 import torch
 from pathlib import Path
-from ultralytics import YOLO
 from backend.config import settings
+from backend.models.backends import model_hash
+from backend.models.model_manager import model_manager
+from backend.services.tiling import TiledInference
 
 # Глобальное исправление безопасности Torch
 import torch.serialization
@@ -14,59 +17,100 @@ def safe_torch_load(*args, **kwargs):
     return original_load(*args, **kwargs)
 torch.load = safe_torch_load
 
-# Исправленный импорт SAHI
-try:
-    from sahi.model import Yolov8DetectionModel
-    from sahi.predict import get_sliced_prediction
-    SAHI_AVAILABLE = True
-except ImportError:
-    SAHI_AVAILABLE = False
-
 class OptimizedDetector:
-    def __init__(self):
-        print(f"⚙️ Инициализация модели: {settings.MODEL_PATH}")
-        
-        # Загружаем обычную модель (без OpenVINO, так как экспорт падает из-за прав доступа)
-        try:
-            self.model = YOLO(settings.MODEL_PATH)
-        except:
-            self.model = YOLO("yolov8n.pt")
+    def __init__(self, manager=model_manager):
+        # Модель берется из общего загрузчика при первом обращении
+        # (фоновый прогрев на старте API или первый запрос)
+        self.manager = manager
+        self.model = None
+        self.backend = None
+        self.model_id = None
+        self.tiler = None
+        self.ready = threading.Event()
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """Получить модель из ModelManager (OpenVINO / ONNX из кэша экспорта, PyTorch - запасной вариант)"""
+        if self.model is not None:
+            return
+        with self._load_lock:
+            if self.model is not None:
+                return
+            print(f"⚙️ Инициализация модели: {settings.MODEL_PATH}")
+            model, backend = self.manager.get()
+            if model is None:
+                raise RuntimeError("Модель не загружена")
+            print(f"✅ Бэкенд инференса: {backend}")
+
+            # Идентичность модели для ключей кэша результатов
+            weights = Path(settings.MODEL_PATH)
+            weights_id = f"{weights.stem}-{model_hash(weights)}" if weights.exists() else weights.stem
+            self.model_id = f"{weights_id}:{backend}"
+
+            # Слайсинг больших кадров на той же модели (без второй копии весов)
+            self.tiler = TiledInference(
+                self.predict_batch,
+                class_ids={name: idx for idx, name in model.names.items()},
+                slice_size=settings.SLICE_SIZE,
+                overlap=settings.SLICE_OVERLAP,
+                batch_size=settings.SLICE_BATCH_SIZE,
+                iou_threshold=settings.SLICE_NMS_IOU,
+                full_frame=settings.SLICE_FULL_FRAME,
+                skip_threshold=settings.SLICE_SKIP_THRESHOLD,
+                skip_metric=settings.SLICE_SKIP_METRIC
+            )
+            self.backend = backend
+            self.model = model
+
+    def warmup(self):
+        """Прогрев графа на пустых кадрах всех рабочих размеров пачки"""
+        self.load()
+        dummy = np.zeros((settings.MODEL_IMGSZ, settings.MODEL_IMGSZ, 3), dtype=np.uint8)
+        for batch in sorted({1, settings.INFERENCE_MAX_BATCH, settings.SLICE_BATCH_SIZE}):
+            self.predict_batch([dummy] * batch)
+        self.ready.set()
+        print("✅ Модель прогрета и готова к работе")
+
+    def is_large(self, img):
+        """Нужен ли кадру режим слайсинга"""
+        h, w = img.shape[:2]
+        return bool(settings.USE_SAHI and (h > 1080 or w > 1920))
 
-        # Настройка SAHI с правильным классом
-        self.sahi_model = None
-        if SAHI_AVAILABLE and settings.USE_SAHI:
-            try:
-                self.sahi_model = Yolov8DetectionModel(
-                    model_path=settings.MODEL_PATH,
-                    confidence_threshold=0.25,
-                    device='cpu'
-                )
-                print("✅ SAHI инициализирован корректно")
-            except Exception as e:
-                print(f"⚠️ Ошибка SAHI (используем обычный режим): {e}")
+    def slicing_mode(self):
+        """Параметры слайсинга, влияющие на результат (часть ключа кэша)"""
+        if not settings.USE_SAHI:
+            return "off"
+        return (f"{settings.SLICE_SIZE}:{settings.SLICE_OVERLAP}:{settings.SLICE_NMS_IOU}:"
+                f"{settings.SLICE_FULL_FRAME}:{settings.SLICE_SKIP_METRIC}:{settings.SLICE_SKIP_THRESHOLD}")
+
+    def _to_detections(self, res):
+        return [{"class": self.model.names[int(b.cls)], "conf": float(b.conf), "bbox": b.xyxy[0].tolist()}
+                for b in res.boxes]
+
+    def predict_batch(self, images, conf=0.25):
+        """Один прямой проход модели по пачке уже декодированных кадров (BGR)"""
+        if not images:
+            return []
+        self.load()
+        results = self.model(list(images), conf=conf, verbose=False)
+        return [self._to_detections(r) for r in results]
+
+    def run_array(self, img, conf=0.25):
+        """
+        Детекция на уже декодированном кадре (BGR)
+
+        Returns:
+            (детекции, сведения о режиме: sliced / tiles / tiles_skipped)
+        """
+        self.load()
+        if self.is_large(img):
+            detections, stats = self.tiler.run(img, conf=conf)
+            return detections, {"sliced": True, **stats}
+        return self.predict_batch([img], conf=conf)[0], {"sliced": False}
 
     def run(self, img_path, conf=0.25):
         start_time = time.time()
         img = cv2.imread(str(img_path))
         if img is None: return [], 0.0
-            
-        h, w = img.shape[:2]
-
-        # Если SAHI доступен и картинка большая
-        if self.sahi_model and settings.USE_SAHI and (h > 1080 or w > 1920):
-            result = get_sliced_prediction(
-                str(img_path),
-                self.sahi_model,
-                slice_height=512,
-                slice_width=512,
-                overlap_height_ratio=0.2,
-                overlap_width_ratio=0.2
-            )
-            detections = [{"class": o.category.name, "conf": float(o.score.value), "bbox": o.bbox.to_xyxy()} 
-                          for o in result.object_prediction_list]
-        else:
-            res = self.model(img, conf=conf)[0]
-            detections = [{"class": self.model.names[int(b.cls)], "conf": float(b.conf), "bbox": b.xyxy[0].tolist()} 
-                          for b in res.boxes]
-        
-        return detections, time.time() - start_time
\ No newline at end of file
+        detections, _ = self.run_array(img, conf=conf)
+        return detections, time.time() - start_time
@@ -1,8 +1,154 @@
-from backend.utils.geo_utils import GeoReferencer
+"""
+Потоковый экспорт детекций в KML / GeoJSON / CSV / JSON
+
+Документ собирается по мере чтения курсора БД: на каждый кусок строк
+выдается готовый фрагмент текста, целиком в памяти документ не
+существует. Сжатие gzip тоже потоковое.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, List
+from xml.sax.saxutils import escape
+
+from backend.api.schemas import ExportFormat
+
+MEDIA_TYPES = {
+    ExportFormat.KML: "application/vnd.google-earth.kml+xml",
+    ExportFormat.GEOJSON: "application/geo+json",
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.JSON: "application/json",
+}
+
+CSV_COLUMNS = ('task_id', 'image_path', 'timestamp', 'class_name', 'confidence',
+               'x1', 'y1', 'x2', 'y2', 'lat', 'lon', 'alt', 'geo_accuracy', 'geo_method')
+
+
+def _has_position(row: dict) -> bool:
+    return row.get('lat') is not None and row.get('lon') is not None
+
+
+def _properties(row: dict) -> dict:
+    return {
+        'task_id': row.get('task_id'),
+        'image_path': row.get('image_path'),
+        'timestamp': row.get('timestamp'),
+        'class_name': row.get('class_name'),
+        'confidence': row.get('confidence'),
+        'bbox': [row.get('x1'), row.get('y1'), row.get('x2'), row.get('y2')],
+        'accuracy_meters': row.get('geo_accuracy'),
+        'calculation_method': row.get('geo_method'),
+    }
+
+
+def rows_from_detections(detections: Iterable[dict]) -> List[dict]:
+    """Детекции в формате API (class/conf/bbox/coordinates) в строки экспорта"""
+    rows = []
+    for d in detections:
+        x1, y1, x2, y2 = d.get('bbox') or (None,) * 4
+        coords = d.get('coordinates') or {}
+        rows.append({
+            'task_id': d.get('task_id'), 'image_path': d.get('image_path'), 'timestamp': d.get('timestamp'),
+            'class_name': d.get('class', d.get('class_name')), 'confidence': d.get('conf', d.get('confidence')),
+            'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+            'lat': coords.get('latitude'), 'lon': coords.get('longitude'), 'alt': coords.get('altitude'),
+            'geo_accuracy': coords.get('accuracy_meters'), 'geo_method': coords.get('calculation_method'),
+        })
+    return rows
+
 
 class ExportService:
+    """Форматы экспорта поверх кусков строк (Database.iter_objects)"""
+
+    def stream(self, chunks: Iterable[List[dict]], fmt: ExportFormat) -> Iterator[str]:
+        """Текст документа фрагментами, по одному на кусок строк"""
+        writer = {
+            ExportFormat.KML: self._kml,
+            ExportFormat.GEOJSON: self._geojson,
+            ExportFormat.CSV: self._csv,
+            ExportFormat.JSON: self._json,
+        }[ExportFormat(fmt)]
+        return writer(chunks)
+
+    @staticmethod
+    def gzip(parts: Iterable[str]) -> Iterator[bytes]:
+        """Потоковое сжатие gzip (wbits=31 - заголовок и CRC gzip)"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for part in parts:
+            data = compressor.compress(part.encode('utf-8'))
+            if data:
+                yield data
+        yield compressor.flush()
+
+    @staticmethod
+    def _kml(chunks):
+        yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<kml xmlns="http://www.opengis.net/kml/2.2"><Document><name>Argus Eye</name>\n')
+        for rows in chunks:
+            parts = []
+            for row in rows:
+                if not _has_position(row):
+                    continue
+                coords = f"{row['lon']},{row['lat']}" + (f",{row['alt']}" if row.get('alt') is not None else "")
+                when = ""
+                if row.get('timestamp'):
+                    # KML ждет xsd:dateTime, в БД время UTC через пробел
+                    when = f"<TimeStamp><when>{escape(str(row['timestamp']).replace(' ', 'T'))}Z</when></TimeStamp>"
+                parts.append(
+                    f"<Placemark><name>{escape(str(row.get('class_name')))}</name>"
+                    f"<description>{escape(json.dumps(_properties(row), ensure_ascii=False))}</description>"
+                    f"{when}<Point><coordinates>{coords}</coordinates></Point></Placemark>\n"
+                )
+            if parts:
+                yield ''.join(parts)
+        yield '</Document></kml>\n'
+
+    @staticmethod
+    def _geojson(chunks):
+        yield '{"type": "FeatureCollection", "features": ['
+        first = True
+        for rows in chunks:
+            parts = []
+            for row in rows:
+                if not _has_position(row):
+                    continue
+                coordinates = [row['lon'], row['lat']] + ([row['alt']] if row.get('alt') is not None else [])
+                feature = {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': coordinates},
+                           'properties': _properties(row)}
+                parts.append(('' if first else ',') + '\n' + json.dumps(feature, ensure_ascii=False))
+                first = False
+            if parts:
+                yield ''.join(parts)
+        yield '\n]}\n'
+
+    @staticmethod
+    def _csv(chunks):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        yield buffer.getvalue()
+        for rows in chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([row.get(column) for column in CSV_COLUMNS] for row in rows)
+            yield buffer.getvalue()
+
+    @staticmethod
+    def _json(chunks):
+        yield '['
+        first = True
+        for rows in chunks:
+            if not rows:
+                continue
+            body = ',\n'.join(json.dumps(row, ensure_ascii=False) for row in rows)
+            yield ('\n' if first else ',\n') + body
+            first = False
+        yield '\n]\n'
+
     def to_kml(self, detections):
-        geo = GeoReferencer()
-        return geo.generate_kml(detections)
+        """KML по списку детекций в памяти"""
+        return ''.join(self.stream([rows_from_detections(detections)], ExportFormat.KML))
 
-export_service = ExportService()
\ No newline at end of file
+export_service = ExportService()
@@ -0,0 +1,152 @@
+"""
+Планировщик инференса с динамическим микро-батчингом
+
+Запросы от параллельных загрузок складываются в очередь, собираются
+в пачки (не больше max_batch_size, ожидание не дольше max_wait_ms)
+и прогоняются одним вызовом модели в отдельном потоке, чтобы
+event loop FastAPI оставался свободным. Если передан пул процессов,
+пачки уходят в него и выполняются параллельно (по одной на процесс).
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("ArgusInference")
+
+
+@dataclass
+class _InferenceRequest:
+    image: np.ndarray
+    conf: float
+    future: asyncio.Future
+
+
+class MicroBatchScheduler:
+    """Очередь инференса, группирующая запросы в микро-батчи"""
+
+    def __init__(self, detector, max_batch_size: int = 8, max_wait_ms: float = 10.0, pool=None):
+        """
+        Args:
+            detector: Детектор с методами predict_batch / run_array / is_large
+            max_batch_size: Максимальный размер пачки для одного прохода модели
+            max_wait_ms: Сколько ждать добора пачки после первого запроса
+            pool: Пул процессов инференса (InferenceWorkerPool) или None
+        """
+        self.detector = detector
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.pool = pool
+
+        # Один поток: модель не потокобезопасна, параллелизм дает сама пачка
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="argus-infer")
+        self._queue = None
+        self._worker = None
+        self._slots = None
+        self._inflight = set()
+
+    async def start(self):
+        """Запуск фоновой задачи сборки пачек (вызывается на старте приложения)"""
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            # Одновременно в работе не больше пачек, чем исполнителей
+            self._slots = asyncio.Semaphore(self.pool.size if self.pool else 1)
+            self._worker = asyncio.create_task(self._batch_loop())
+
+    async def stop(self):
+        """Остановка планировщика"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for task in list(self._inflight):
+            task.cancel()
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, image: np.ndarray, conf: float = 0.25) -> Tuple[list, float, dict]:
+        """
+        Поставить кадр в очередь и дождаться результата
+
+        Returns:
+            (детекции, время обработки пачки в секундах, сведения о режиме)
+        """
+        if self._worker is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_InferenceRequest(image, conf, future))
+        return await future
+
+    async def _call(self, method: str, *args):
+        """Вызов метода детектора в пуле процессов или в потоке инференса"""
+        if self.pool is not None:
+            return await asyncio.wrap_future(self.pool.submit(method, *args))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, getattr(self.detector, method), *args)
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            # Добираем пачку, пока не истекло окно ожидания
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Пока все исполнители заняты, новые запросы копятся в очереди
+            # и формируют следующую пачку
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[_InferenceRequest]):
+        try:
+            # Большие кадры идут через слайсинг по одному,
+            # остальные группируются по порогу уверенности
+            groups = {}
+            for req in batch:
+                if self.detector.is_large(req.image):
+                    await self._run_single(req)
+                else:
+                    groups.setdefault(req.conf, []).append(req)
+
+            for conf, reqs in groups.items():
+                start_time = time.time()
+                results = await self._call("predict_batch", [r.image for r in reqs], conf)
+                elapsed = time.time() - start_time
+                for req, detections in zip(reqs, results):
+                    if not req.future.done():
+                        req.future.set_result((detections, elapsed, {"sliced": False}))
+        except Exception as e:
+            logger.error(f"Ошибка инференса пачки: {e}")
+            for req in batch:
+                if not req.future.done():
+                    req.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    async def _run_single(self, req: _InferenceRequest):
+        start_time = time.time()
+        try:
+            detections, info = await self._call("run_array", req.image, req.conf)
+        except Exception as e:
+            if not req.future.done():
+                req.future.set_exception(e)
+            return
+        if not req.future.done():
+            req.future.set_result((detections, time.time() - start_time, info))
@@ -0,0 +1,119 @@
+"""
+Асинхронные задачи детекции (submit / poll)
+
+Отправка возвращает ID задачи сразу, задачи выполняются ограниченным
+числом воркеров из ограниченной очереди. Жизненный цикл - TaskStatus
+(pending -> processing -> completed / error). При переполнении очереди
+submit бросает JobQueueFull, API отвечает 429.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from backend.api.schemas import TaskInfo, TaskStatus
+
+logger = logging.getLogger("ArgusJobs")
+
+
+class JobQueueFull(Exception):
+    """Очередь задач переполнена"""
+
+
+class JobQueue:
+    """Ограниченная очередь задач с пулом асинхронных воркеров"""
+
+    def __init__(self, handler: Callable[..., Awaitable[dict]], max_size: int = 100,
+                 workers: int = 2, history_size: int = 1000):
+        """
+        Args:
+            handler: Корутина handler(task_id, payload, progress) -> результат
+            max_size: Максимум ожидающих задач
+            workers: Сколько задач выполняется одновременно
+            history_size: Сколько завершенных задач хранить для опроса
+        """
+        self.handler = handler
+        self.max_size = max_size
+        self.workers = max(1, workers)
+        self.history_size = history_size
+        self._queue = None
+        self._tasks = OrderedDict()
+        self._workers = []
+
+    async def start(self):
+        if not self._workers:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, task_id: str, payload) -> TaskInfo:
+        """
+        Поставить задачу в очередь без ожидания
+
+        Raises:
+            JobQueueFull: Очередь заполнена
+        """
+        if self._queue is None:
+            raise RuntimeError("Очередь задач не запущена")
+        info = TaskInfo(task_id=task_id, status=TaskStatus.PENDING, created_at=datetime.now(), progress=0.0)
+        try:
+            self._queue.put_nowait((task_id, payload))
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"В очереди {self.max_size} задач")
+        self._tasks[task_id] = info
+        self._evict()
+        return info
+
+    def get(self, task_id: str) -> Optional[TaskInfo]:
+        return self._tasks.get(task_id)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _evict(self):
+        # Выбрасываем самые старые завершенные задачи, активные не трогаем
+        excess = len(self._tasks) - self.history_size
+        if excess <= 0:
+            return
+        for task_id in list(self._tasks):
+            if excess <= 0:
+                break
+            if self._tasks[task_id].status in (TaskStatus.COMPLETED, TaskStatus.ERROR):
+                del self._tasks[task_id]
+                excess -= 1
+
+    async def _worker(self):
+        while True:
+            task_id, payload = await self._queue.get()
+            info = self._tasks.get(task_id)
+            if info is None:
+                continue
+            info.status = TaskStatus.PROCESSING
+
+            def _progress(value, info=info):
+                info.progress = round(float(value), 3)
+
+            try:
+                result = await self.handler(task_id, payload, _progress)
+                info.status = TaskStatus.COMPLETED
+                info.progress = 1.0
+                info.result = result
+                info.processing_time = result.get("processing_time")
+                info.detections_count = len(result.get("detections", []))
+                info.has_gps = result.get("lat") is not None and result.get("lon") is not None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Задача {task_id} завершилась ошибкой: {e}")
+                info.status = TaskStatus.ERROR
+                info.error = str(e)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,109 @@
+"""
+Кэш результатов детекции с адресацией по содержимому
+
+Ключ - sha256 байтов изображения + идентичность модели + порог
+уверенности + режим слайсинга. Два уровня: LRU в памяти и таблица
+result_cache в SQLite. Одинаковые загрузки, пришедшие одновременно,
+ждут одно вычисление вместо нескольких прогонов модели. Если запрос,
+который ведет вычисление, отменен (клиент отключился), ожидающие не
+получают его отмену: первый из них запускает вычисление заново.
+"""
+
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+logger = logging.getLogger("ArgusCache")
+
+
+class _Abandoned(Exception):
+    """Владелец вычисления отменен - ожидающие повторяют запрос"""
+
+
+def make_key(image_bytes: bytes, model_id: str, conf: float, slicing_mode: str) -> str:
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return hashlib.sha256(f"{digest}|{model_id}|{conf:.4f}|{slicing_mode}".encode()).hexdigest()
+
+
+class ResultCache:
+    """Двухуровневый кэш результатов с объединением одновременных запросов"""
+
+    def __init__(self, db=None, max_items: int = 1024):
+        """
+        Args:
+            db: Объект Database для постоянного уровня (None - только память)
+            max_items: Размер LRU в памяти
+        """
+        self.db = db
+        self.max_items = max_items
+        self._memory = OrderedDict()
+        self._inflight = {}
+
+    def _remember(self, key: str, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _lookup_memory(self, key: str) -> Optional[tuple]:
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+        return value
+
+    async def get_or_compute(self, key: str,
+                             compute: Callable[[], Awaitable[tuple]]) -> Tuple[tuple, bool]:
+        """
+        Результат из кэша или однократное вычисление
+
+        Args:
+            key: Ключ из make_key
+            compute: Корутина-фабрика, возвращающая (детекции, время обработки, сведения)
+
+        Returns:
+            ((детекции, время обработки, сведения), был ли результат взят из кэша)
+        """
+        while True:
+            value = self._lookup_memory(key)
+            if value is not None:
+                return value, True
+
+            # Такой же кадр уже считается - ждем его результат
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending), True
+            except _Abandoned:
+                # Запрос-владелец отменен - следующий круг, кто первый, тот считает
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = None
+            if self.db is not None:
+                value = await self.db.aio.get_cached_result(key)
+            hit = value is not None
+            if not hit:
+                value = await compute()
+                if self.db is not None:
+                    await self.db.aio.save_cached_result(key, *value)
+            self._remember(key, value)
+            future.set_result(value)
+            return value, hit
+        except asyncio.CancelledError:
+            # Отмена касается только этого запроса: ожидающие получают _Abandoned
+            # и повторяют вычисление сами, а не падают с CancelledError
+            future.set_exception(_Abandoned())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим, само future никто не читает
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
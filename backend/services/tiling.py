@@ -0,0 +1,209 @@
+"""
+Нативный слайсинг больших кадров (замена SAHI)
+
+Тайлы нарезаются как view уже декодированного изображения (без копий
+и повторного чтения файла), прогоняются пачками через единственную
+загруженную модель, а пересечения объединяются векторизованным NMS.
+Однородные тайлы (вода, поле, небо) отсекаются дешевым предфильтром
+до прохода модели.
+"""
+
+from typing import Callable, List, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    import torch
+    from torchvision.ops import batched_nms
+    TORCHVISION_AVAILABLE = True
+except ImportError:
+    TORCHVISION_AVAILABLE = False
+
+
+def _axis_starts(length: int, size: int, step: int) -> List[int]:
+    """Начала тайлов вдоль одной оси; последний тайл прижимается к краю"""
+    if length <= size:
+        return [0]
+    starts = list(range(0, length - size, step))
+    starts.append(length - size)
+    return starts
+
+
+def tile_grid(height: int, width: int, size: int = 512, overlap: float = 0.2) -> List[Tuple[int, int, int, int]]:
+    """
+    Сетка тайлов для кадра
+
+    Returns:
+        List[Tuple]: Список (x0, y0, x1, y1)
+    """
+    step = max(1, int(size * (1 - overlap)))
+    return [
+        (x0, y0, min(x0 + size, width), min(y0 + size, height))
+        for y0 in _axis_starts(height, size, step)
+        for x0 in _axis_starts(width, size, step)
+    ]
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, iou_threshold: float = 0.5) -> np.ndarray:
+    """
+    Поклассовый NMS
+
+    Args:
+        boxes: (N, 4) xyxy
+        scores: (N,)
+        classes: (N,) целочисленные id классов
+
+    Returns:
+        np.ndarray: Индексы сохраненных боксов
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if TORCHVISION_AVAILABLE:
+        keep = batched_nms(
+            torch.from_numpy(boxes).float(),
+            torch.from_numpy(scores).float(),
+            torch.from_numpy(classes).long(),
+            iou_threshold,
+        )
+        return keep.numpy()
+
+    # Сдвигаем боксы разных классов так, чтобы они не пересекались,
+    # и делаем один проход NMS по всем классам сразу
+    offsets = classes.astype(np.float64)[:, None] * (boxes.max() + 1)
+    shifted = boxes + offsets
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def tile_scores(img: np.ndarray, tiles: List[Tuple[int, int, int, int]], metric: str = "gradient",
+                scale: int = 4) -> np.ndarray:
+    """
+    Оценка "информативности" тайлов по уменьшенной копии кадра
+
+    Карта метрики считается один раз на весь кадр, среднее по каждому
+    тайлу берется из интегрального изображения за O(1).
+
+    Args:
+        img: Кадр BGR
+        tiles: Сетка (x0, y0, x1, y1) в координатах кадра
+        metric: "gradient" - средняя энергия градиента (|Лапласиан|),
+                "variance" - стандартное отклонение яркости,
+                "edges" - доля пикселей-границ Canny (0-100)
+        scale: Во сколько раз уменьшать кадр перед расчетом
+
+    Returns:
+        np.ndarray: Оценка для каждого тайла
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (max(1, gray.shape[1] // scale), max(1, gray.shape[0] // scale)),
+                       interpolation=cv2.INTER_AREA)
+
+    if metric == "variance":
+        values = small.astype(np.float64)
+        integral, integral_sq = cv2.integral2(values)
+    elif metric == "edges":
+        values = (cv2.Canny(small, 50, 150) > 0).astype(np.float64) * 100
+        integral = cv2.integral(values)
+    else:
+        values = np.abs(cv2.Laplacian(small, cv2.CV_32F))
+        integral = cv2.integral(values.astype(np.float64))
+
+    boxes = np.asarray(tiles, dtype=np.int64) // scale
+    x0, y0 = boxes[:, 0], boxes[:, 1]
+    x1 = np.clip(np.maximum(boxes[:, 2], x0 + 1), 1, small.shape[1])
+    y1 = np.clip(np.maximum(boxes[:, 3], y0 + 1), 1, small.shape[0])
+    x0, y0 = np.minimum(x0, x1 - 1), np.minimum(y0, y1 - 1)
+    area = (x1 - x0) * (y1 - y0)
+
+    def _box_sum(table):
+        return table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+
+    mean = _box_sum(integral) / area
+    if metric == "variance":
+        return np.sqrt(np.clip(_box_sum(integral_sq) / area - mean ** 2, 0, None))
+    return mean
+
+
+class TiledInference:
+    """Пакетный инференс по тайлам на одной загруженной модели"""
+
+    def __init__(self, predict_batch: Callable, class_ids: dict, slice_size: int = 512,
+                 overlap: float = 0.2, batch_size: int = 8, iou_threshold: float = 0.5,
+                 full_frame: bool = True, skip_threshold: float = 0.0, skip_metric: str = "gradient"):
+        """
+        Args:
+            predict_batch: Функция (images, conf) -> список детекций на каждый кадр
+            class_ids: Отображение имя класса -> id (для поклассового NMS)
+            slice_size: Размер стороны тайла
+            overlap: Доля перекрытия соседних тайлов
+            batch_size: Сколько тайлов в одном проходе модели
+            iou_threshold: Порог IoU при слиянии пересечений
+            full_frame: Добавлять ли проход по всему кадру (крупные объекты)
+            skip_threshold: Тайлы с оценкой ниже порога пропускаются (0 - без фильтра)
+            skip_metric: Метрика предфильтра (см. tile_scores)
+        """
+        self.predict_batch = predict_batch
+        self.class_ids = class_ids
+        self.slice_size = slice_size
+        self.overlap = overlap
+        self.batch_size = max(1, batch_size)
+        self.iou_threshold = iou_threshold
+        self.full_frame = full_frame
+        self.skip_threshold = skip_threshold
+        self.skip_metric = skip_metric
+
+    def run(self, img: np.ndarray, conf: float = 0.25) -> Tuple[list, dict]:
+        """
+        Returns:
+            (детекции, статистика тайлов: tiles / tiles_skipped)
+        """
+        h, w = img.shape[:2]
+        tiles = tile_grid(h, w, self.slice_size, self.overlap)
+        total = len(tiles)
+
+        if self.skip_threshold > 0:
+            informativeness = tile_scores(img, tiles, self.skip_metric)
+            tiles = [tile for tile, score in zip(tiles, informativeness) if score >= self.skip_threshold]
+        stats = {"tiles": total, "tiles_skipped": total - len(tiles)}
+
+        # (view, смещение x, смещение y) - срезы numpy не копируют данные
+        jobs = [(img[y0:y1, x0:x1], x0, y0) for x0, y0, x1, y1 in tiles]
+        if self.full_frame:
+            jobs.append((img, 0, 0))
+
+        boxes, scores, labels = [], [], []
+        for start in range(0, len(jobs), self.batch_size):
+            chunk = jobs[start:start + self.batch_size]
+            results = self.predict_batch([view for view, _, _ in chunk], conf)
+            for (_, dx, dy), detections in zip(chunk, results):
+                for d in detections:
+                    x1, y1, x2, y2 = d["bbox"]
+                    boxes.append((x1 + dx, y1 + dy, x2 + dx, y2 + dy))
+                    scores.append(d["conf"])
+                    labels.append(d["class"])
+
+        if not boxes:
+            return [], stats
+
+        boxes = np.asarray(boxes, dtype=np.float32)
+        scores = np.asarray(scores, dtype=np.float32)
+        classes = np.asarray([self.class_ids.get(name, -1) for name in labels], dtype=np.int64)
+        keep = nms(boxes, scores, classes, self.iou_threshold)
+
+        detections = [{"class": labels[i], "conf": float(scores[i]), "bbox": boxes[i].tolist()} for i in keep]
+        return detections, stats
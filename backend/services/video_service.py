@@ -0,0 +1,172 @@
+"""
+Потоковая детекция по видео
+
+Кадры читаются генератором с прореживанием (декодируются только
+выбранные), уходят в детектор пачками по мере поступления, а
+результаты пишутся в БД и отдаются клиенту по кадру. Память
+ограничена одной пачкой кадров независимо от длины видео.
+
+Адаптивный режим отправляет в модель только ключевые кадры (смена
+сцены по разнице кадров), а между ними переносит боксы трекером,
+так что число прогонов модели зависит от динамики сцены, а не от
+длительности видео.
+"""
+
+import asyncio
+import itertools
+import time
+from typing import AsyncIterator
+
+from starlette.concurrency import run_in_threadpool
+
+from backend.services.video_tracker import BoxPropagator, KeyframeSelector, analysis_gray
+from backend.utils.image_processor import image_processor
+
+
+async def stream_video_detections(video_path: str, task_id: str, scheduler, db,
+                                  fps: float = 1.0, batch_size: int = 8,
+                                  conf: float = 0.25) -> AsyncIterator[dict]:
+    """
+    Покадровая детекция по видео
+
+    Args:
+        video_path: Путь к видео (VideoCapture требует файл)
+        task_id: ID задачи, под которым пишутся кадры
+        scheduler: MicroBatchScheduler
+        db: Database
+        fps: Частота выборки кадров
+        batch_size: Сколько кадров декодировать и отправлять за раз
+
+    Yields:
+        dict: Результат по каждому кадру, последним - итоговая сводка
+    """
+    start_time = time.time()
+    frames = image_processor.iter_video_frames(video_path, fps)
+    total_frames = 0
+    total_detections = 0
+
+    try:
+        while True:
+            batch = await run_in_threadpool(lambda: list(itertools.islice(frames, batch_size)))
+            if not batch:
+                break
+
+            # Кадры пачки уходят в планировщик одновременно и собираются в один проход
+            results = await asyncio.gather(*(scheduler.submit(frame, conf) for _, _, frame in batch))
+
+            rows = [
+                {"frame_index": index, "frame_time": round(frame_time, 3), "detections": detections}
+                for (index, frame_time, _), (detections, _, _) in zip(batch, results)
+            ]
+            await db.aio.save_video_frames(task_id, rows)
+
+            for row in rows:
+                total_frames += 1
+                total_detections += len(row["detections"])
+                yield row
+    finally:
+        frames.close()
+
+    yield {
+        "task_id": task_id,
+        "status": "completed",
+        "frames_processed": total_frames,
+        "detections_count": total_detections,
+        "processing_time": time.time() - start_time,
+    }
+
+
+async def stream_adaptive_video_detections(video_path: str, task_id: str, scheduler, db,
+                                           candidate_fps: float = 5.0, batch_size: int = 8,
+                                           conf: float = 0.25, change_threshold: float = 0.02,
+                                           max_gap: float = 5.0, analysis_width: int = 320) -> AsyncIterator[dict]:
+    """
+    Покадровая детекция с выбором ключевых кадров
+
+    Кадры-кандидаты читаются с частотой candidate_fps. Ключевые кадры
+    копятся окном до batch_size и уходят в модель одной пачкой, для
+    промежуточных хранится только уменьшенная серая копия.
+
+    Yields:
+        dict: Результат по каждому кадру (keyframe=True для прогнанных
+              через модель), последним - итоговая сводка
+    """
+    start_time = time.time()
+    frames = image_processor.iter_video_frames(video_path, candidate_fps)
+    selector = KeyframeSelector(change_threshold=change_threshold, max_gap=max_gap)
+    propagator = BoxPropagator()
+    state = {"prev_gray": None, "detections": []}
+    totals = {"frames": 0, "keyframes": 0, "detections": 0}
+
+    def _next_window():
+        """Кадры до (batch_size + 1)-го ключевого; он остается началом следующего окна"""
+        window = pending[:]
+        pending.clear()
+        keyframes = sum(1 for entry in window if entry["frame"] is not None)
+        for index, frame_time, frame in frames:
+            gray = analysis_gray(frame, analysis_width)
+            is_key = selector.is_keyframe(gray, frame_time)
+            entry = {
+                "frame_index": index,
+                "frame_time": round(frame_time, 3),
+                "frame": frame if is_key else None,
+                "gray": gray,
+                "scale": analysis_width / float(frame.shape[1]),
+            }
+            if is_key and keyframes == batch_size:
+                pending.append(entry)
+                break
+            window.append(entry)
+            keyframes += is_key
+        return window
+
+    pending = []
+    try:
+        while True:
+            window = await run_in_threadpool(_next_window)
+            if not window:
+                break
+
+            keyframes = [entry for entry in window if entry["frame"] is not None]
+            results = await asyncio.gather(*(scheduler.submit(entry["frame"], conf) for entry in keyframes))
+            for entry, (detections, _, _) in zip(keyframes, results):
+                entry["detections"] = detections
+                entry["frame"] = None
+
+            def _propagate():
+                rows = []
+                for entry in window:
+                    if "detections" in entry:
+                        state["detections"] = entry["detections"]
+                    elif state["prev_gray"] is not None:
+                        state["detections"] = propagator.propagate(
+                            state["prev_gray"], entry["gray"], state["detections"], entry["scale"]
+                        )
+                    state["prev_gray"] = entry["gray"]
+                    rows.append({
+                        "frame_index": entry["frame_index"],
+                        "frame_time": entry["frame_time"],
+                        "keyframe": "detections" in entry,
+                        "detections": state["detections"],
+                    })
+                return rows
+
+            rows = await run_in_threadpool(_propagate)
+            await db.aio.save_video_frames(task_id, rows)
+
+            totals["keyframes"] += len(keyframes)
+            for row in rows:
+                totals["frames"] += 1
+                totals["detections"] += len(row["detections"])
+                yield row
+    finally:
+        frames.close()
+
+    yield {
+        "task_id": task_id,
+        "status": "completed",
+        "frames_processed": totals["frames"],
+        "inference_calls": totals["keyframes"],
+        "detections_count": totals["detections"],
+        "processing_time": time.time() - start_time,
+    }
@@ -0,0 +1,99 @@
+"""
+Выбор ключевых кадров и перенос боксов между ними
+
+Ключевой кадр выбирается по доле изменившихся пикселей относительно
+предыдущего ключевого (ChangeDetector.change_score) на уменьшенной
+серой копии. Между ключевыми кадрами боксы переносятся разреженным
+оптическим потоком Лукаса-Канаде по сетке точек внутри каждого бокса.
+"""
+
+import warnings
+from typing import List
+
+import cv2
+import numpy as np
+
+from backend.utils.change_detection import ChangeDetector
+
+
+def analysis_gray(frame: np.ndarray, width: int = 320) -> np.ndarray:
+    """Уменьшенная серая копия кадра для дешевых оценок"""
+    h, w = frame.shape[:2]
+    scale = width / float(w)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, (width, max(1, int(round(h * scale)))), interpolation=cv2.INTER_AREA)
+
+
+class KeyframeSelector:
+    """Решает, нужен ли кадру полный инференс"""
+
+    def __init__(self, change_threshold: float = 0.02, pixel_threshold: int = 30, max_gap: float = 5.0):
+        """
+        Args:
+            change_threshold: Доля изменившихся пикселей, после которой кадр ключевой
+            pixel_threshold: Порог absdiff для одного пикселя
+            max_gap: Максимальный интервал между ключевыми кадрами (сек)
+        """
+        self.change_threshold = change_threshold
+        self.pixel_threshold = pixel_threshold
+        self.max_gap = max_gap
+        self.change_detector = ChangeDetector()
+        self._last_gray = None
+        self._last_time = None
+
+    def is_keyframe(self, gray: np.ndarray, frame_time: float) -> bool:
+        if self._last_gray is None or self._last_gray.shape != gray.shape \
+                or frame_time - self._last_time >= self.max_gap \
+                or self.change_detector.change_score(self._last_gray, gray, self.pixel_threshold) >= self.change_threshold:
+            self._last_gray = gray
+            self._last_time = frame_time
+            return True
+        return False
+
+
+class BoxPropagator:
+    """Перенос боксов оптическим потоком (LK) между соседними кадрами"""
+
+    def __init__(self, grid: int = 3):
+        """
+        Args:
+            grid: Сетка grid x grid опорных точек внутри бокса
+        """
+        steps = (np.arange(grid) + 0.5) / grid
+        gx, gy = np.meshgrid(steps, steps)
+        self._grid = np.stack([gx.ravel(), gy.ravel()], axis=1).astype(np.float32)
+        self._lk_params = dict(winSize=(15, 15), maxLevel=2,
+                               criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+    def propagate(self, prev_gray: np.ndarray, gray: np.ndarray, detections: List[dict], scale: float) -> List[dict]:
+        """
+        Args:
+            prev_gray, gray: Уменьшенные серые кадры (analysis_gray)
+            detections: Боксы предыдущего кадра в координатах полного кадра
+            scale: Масштаб analysis_gray относительно полного кадра
+
+        Returns:
+            List[dict]: Сдвинутые боксы (помечены tracked=True)
+        """
+        if not detections:
+            return []
+
+        boxes = np.asarray([d["bbox"] for d in detections], dtype=np.float32) * scale
+        sizes = boxes[:, 2:] - boxes[:, :2]
+        # (N, P, 2) опорные точки всех боксов одним массивом
+        points = boxes[:, None, :2] + self._grid[None, :, :] * sizes[:, None, :]
+        flat = points.reshape(-1, 1, 2)
+
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, flat, None, **self._lk_params)
+        shift = (moved - flat).reshape(len(boxes), -1, 2)
+        valid = status.reshape(len(boxes), -1).astype(bool)
+        shift[~valid] = np.nan
+
+        # Бокс без отслеженных точек остается на месте
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median = np.nanmedian(shift, axis=1)
+        median = np.nan_to_num(median).astype(np.float64) / scale
+
+        shifted = np.asarray([d["bbox"] for d in detections], dtype=np.float64) + np.tile(median, 2)
+        return [{**d, "bbox": box, "tracked": True} for d, box in zip(detections, shifted.tolist())]
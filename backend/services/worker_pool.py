@@ -0,0 +1,273 @@
+"""
+Пул процессов инференса
+
+N процессов, каждый закреплен за своим срезом ядер и получает задачи
+через локальную очередь. Для PyTorch процессы запускаются через fork от
+уже загруженного детектора: веса переводятся в разделяемую память
+(share_memory) и не копируются N раз. Сессии OpenVINO / ONNX Runtime
+переживать fork не умеют (их потоки и состояние остаются в родителе),
+поэтому для ускоренных бэкендов процессы стартуют через spawn и
+компилируют свою сессию из кэша экспорта собственным ModelManager.
+Скомпилированная сессия (веса в формате плагина, буферы слоев) у
+каждого процесса своя - память растет пропорционально числу процессов,
+поэтому для этих бэкендов число процессов ограничено max_session_workers,
+а фактический расход каждого процесса виден в memory_mb().
+Упавшие процессы перезапускаются с экспоненциальной паузой, их
+незавершенные задачи получают ошибку. Процесс, упавший MAX_RESTARTS раз
+подряд (например, не загружается модель), больше не поднимается - пул
+работает в урезанном составе, что видно в status().
+"""
+
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+
+import psutil
+
+from backend.utils.optimization import CPUOptimizer
+
+logger = logging.getLogger("ArgusWorkers")
+
+# Перезапуски: пауза RESTART_BACKOFF * 2^(n-1), не больше RESTART_BACKOFF_MAX секунд;
+# после MAX_RESTARTS падений подряд процесс не поднимается. Счетчик сбрасывается,
+# если процесс проработал STABLE_UPTIME секунд.
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 60.0
+MAX_RESTARTS = 5
+STABLE_UPTIME = 60.0
+
+
+def _core_slices(num_workers: int, cores_per_worker: int = 0) -> List[List[int]]:
+    """Разбиение доступных ядер между процессами"""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    per = cores_per_worker or max(1, len(cores) // num_workers)
+    slices = []
+    for i in range(num_workers):
+        start = (i * per) % len(cores)
+        chunk = cores[start:start + per] or cores[:per]
+        slices.append(chunk)
+    return slices
+
+
+def _worker_main(worker_id, cores, tasks, results, detector):
+    """Цикл процесса-воркера"""
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError:
+            pass
+
+    # Потоки библиотек ограничиваем своим срезом ядер
+    import cv2
+    import torch
+    cv2.setNumThreads(1)
+    torch.set_num_threads(len(cores))
+
+    if detector is None:
+        # Своя сессия процесса, а не общий model_manager родителя
+        from backend.models.model_manager import ModelManager
+        from backend.services.detector import OptimizedDetector
+        detector = OptimizedDetector(manager=ModelManager())
+
+    while True:
+        item = tasks.get()
+        if item is None:
+            break
+        job_id, method, args = item
+        try:
+            results.put((job_id, True, getattr(detector, method)(*args)))
+        except Exception as e:
+            results.put((job_id, False, f"{type(e).__name__}: {e}"))
+
+
+class InferenceWorkerPool:
+    """Пул процессов инференса с перезапуском упавших воркеров"""
+
+    def __init__(self, detector, num_workers: int, cores_per_worker: int = 0,
+                 max_session_workers: Optional[int] = None):
+        """
+        Args:
+            detector: Загруженный в родителе детектор
+            num_workers: Количество процессов
+            cores_per_worker: Ядер на процесс (0 - поровну)
+            max_session_workers: Предел процессов для OpenVINO / ONNX (у каждого
+                                 своя копия скомпилированной модели); None - без предела
+        """
+        self.detector = detector
+        self.size = max(1, int(num_workers))
+        self.cores_per_worker = cores_per_worker
+        self.max_session_workers = max_session_workers
+        self.core_slices = _core_slices(self.size, cores_per_worker)
+
+        # Контекст и очередь результатов выбираются в start() по бэкенду
+        self._ctx = None
+        self._results = None
+        self._workers = [None] * self.size
+        self._jobs = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._shared_detector = None
+
+    def start(self):
+        """Запуск процессов (до первого инференса в родителе)"""
+        shared = None
+        if getattr(self.detector, "backend", None) == "torch":
+            # Веса PyTorch в разделяемую память - дочерние процессы их не копируют
+            CPUOptimizer().memory_optimization(self.detector.model)
+            shared = self.detector
+
+        self._shared_detector = shared
+        if shared is None and self.max_session_workers and self.size > self.max_session_workers:
+            logger.warning(
+                f"⚠️ Бэкенд {getattr(self.detector, 'backend', None)}: каждый процесс держит свою "
+                f"скомпилированную модель, процессов {self.size} -> {self.max_session_workers}"
+            )
+            self.size = self.max_session_workers
+            self._workers = [None] * self.size
+            self.core_slices = _core_slices(self.size, self.cores_per_worker)
+        # fork только для PyTorch; остальные бэкенды (и их перезапуски из
+        # потока _monitor) - чистый процесс через spawn
+        self._ctx = mp.get_context("fork" if shared is not None else "spawn")
+        self._results = self._ctx.Queue()
+        for idx in range(self.size):
+            self._spawn(idx)
+
+        for target in (self._collect_results, self._monitor):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"✅ Пул инференса: {self.size} процессов, ядра {self.core_slices}")
+
+    def _spawn(self, idx: int, restarts: int = 0):
+        tasks = self._ctx.Queue()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(idx, self.core_slices[idx], tasks, self._results, self._shared_detector),
+            name=f"argus-infer-{idx}",
+            daemon=True,
+        )
+        proc.start()
+        self._workers[idx] = {"proc": proc, "tasks": tasks, "inflight": set(), "started": time.monotonic(),
+                              "restarts": restarts, "retry_at": None, "failed": False}
+
+    def memory_mb(self) -> List[Optional[float]]:
+        """Резидентная память каждого процесса (МБ), None - процесс недоступен"""
+        result = []
+        for worker in self._workers:
+            try:
+                result.append(round(psutil.Process(worker["proc"].pid).memory_info().rss / 1024 / 1024, 1))
+            except (TypeError, psutil.Error):
+                result.append(None)
+        return result
+
+    def submit(self, method: str, *args) -> Future:
+        """
+        Отправить вызов метода детектора в наименее загруженный процесс
+
+        Returns:
+            Future: Результат вызова
+        """
+        future = Future()
+        with self._lock:
+            # Упавший процесс ждет перезапуска - его очередь будет заменена
+            alive = [i for i in range(self.size) if self._workers[i]["proc"].is_alive()]
+            if not alive:
+                future.set_exception(RuntimeError("Нет работающих воркеров инференса"))
+                return future
+            job_id = next(self._job_ids)
+            idx = min(alive, key=lambda i: len(self._workers[i]["inflight"]))
+            worker = self._workers[idx]
+            worker["inflight"].add(job_id)
+            self._jobs[job_id] = (future, idx)
+        worker["tasks"].put((job_id, method, args))
+        return future
+
+    def _collect_results(self):
+        while not self._stopped.is_set():
+            try:
+                job_id, ok, payload = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                entry = self._jobs.pop(job_id, None)
+                if entry is None:
+                    continue
+                future, idx = entry
+                self._workers[idx]["inflight"].discard(job_id)
+            if future.done():
+                continue
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _monitor(self):
+        while not self._stopped.wait(1.0):
+            now = time.monotonic()
+            for idx in range(self.size):
+                worker = self._workers[idx]
+                if worker["failed"] or worker["proc"].is_alive():
+                    continue
+                if worker["retry_at"] is None:
+                    # Только что упал: отдаем ошибку его задачам и планируем перезапуск
+                    with self._lock:
+                        lost = [self._jobs.pop(job_id) for job_id in worker["inflight"] if job_id in self._jobs]
+                        worker["inflight"].clear()
+                    for future, _ in lost:
+                        if not future.done():
+                            future.set_exception(RuntimeError(f"Воркер инференса {idx} упал"))
+                    restarts = 0 if now - worker["started"] >= STABLE_UPTIME else worker["restarts"]
+                    if restarts >= MAX_RESTARTS:
+                        worker["failed"] = True
+                        logger.error(f"❌ Воркер {idx} падает {restarts} раз подряд (код "
+                                     f"{worker['proc'].exitcode}), больше не перезапускается")
+                        continue
+                    worker["restarts"] = restarts + 1
+                    delay = min(RESTART_BACKOFF_MAX, RESTART_BACKOFF * 2 ** restarts)
+                    worker["retry_at"] = now + delay
+                    logger.warning(f"⚠️ Воркер {idx} завершился (код {worker['proc'].exitcode}), "
+                                   f"перезапуск через {delay:.1f} с")
+                elif now >= worker["retry_at"]:
+                    with self._lock:
+                        self._spawn(idx, worker["restarts"])
+
+    def status(self) -> dict:
+        """Состав пула: живые, ждущие перезапуска и отключенные процессы"""
+        alive = failed = 0
+        for worker in self._workers:
+            if worker is None:
+                continue
+            if worker["failed"]:
+                failed += 1
+            elif worker["proc"].is_alive():
+                alive += 1
+        return {"size": self.size, "alive": alive, "failed": failed, "degraded": alive < self.size}
+
+    def shutdown(self):
+        """Остановка процессов"""
+        self._stopped.set()
+        for worker in self._workers:
+            if worker is None:
+                continue
+            try:
+                worker["tasks"].put(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self._workers:
+            if worker is not None:
+                worker["proc"].join(timeout=5)
+                if worker["proc"].is_alive():
+                    worker["proc"].terminate()
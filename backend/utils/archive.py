@@ -0,0 +1,123 @@
+"""
+Потоковое чтение архивов снимков (ZIP / TAR) без распаковки на диск
+
+Члены архива читаются по одному прямо в память. TAR (в т.ч. .tar.gz)
+читается в потоковом режиме и может разбираться по мере поступления
+байтов (StreamPipe), ZIP требует произвольного доступа к оглавлению.
+"""
+
+import collections
+import io
+import tarfile
+import threading
+import zipfile
+from pathlib import PurePosixPath
+from typing import Iterator, Tuple
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+def _is_image(name: str) -> bool:
+    path = PurePosixPath(name)
+    # Служебные файлы macOS (__MACOSX/, ._name) пропускаем
+    if path.name.startswith("._") or "__MACOSX" in path.parts:
+        return False
+    return path.suffix.lower() in IMAGE_SUFFIXES
+
+
+def iter_archive_images(fileobj, kind: str = "auto", max_member_bytes: int = 200 << 20) -> Iterator[Tuple[str, bytes]]:
+    """
+    Снимки из архива по одному
+
+    Args:
+        fileobj: Файловый объект архива
+        kind: "zip", "tar" или "auto" (по сигнатуре, нужен seekable объект)
+        max_member_bytes: Члены крупнее пропускаются (защита от "архивных бомб")
+
+    Yields:
+        (имя члена архива, байты файла)
+    """
+    if kind == "auto":
+        head = fileobj.read(4)
+        fileobj.seek(0)
+        kind = "zip" if head == ZIP_MAGIC else "tar"
+
+    if kind == "zip":
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not _is_image(info.filename) or info.file_size > max_member_bytes:
+                    continue
+                yield info.filename, archive.read(info)
+        return
+
+    # r|* - последовательное чтение без seek, сжатие определяется автоматически
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or not _is_image(member.name) or member.size > max_member_bytes:
+                continue
+            extracted = archive.extractfile(member)
+            if extracted is not None:
+                yield member.name, extracted.read()
+
+
+class StreamPipe(io.RawIOBase):
+    """
+    Файловый объект, который читается в одном потоке, пока в него
+    дописываются куски тела запроса из другого. Буфер ограничен:
+    писатель ждет, пока читатель не освободит место.
+    """
+
+    def __init__(self, max_buffer: int = 8 << 20):
+        super().__init__()
+        self.max_buffer = max_buffer
+        self._chunks = collections.deque()
+        self._size = 0
+        self._eof = False
+        self._reader_closed = False
+        self._cond = threading.Condition()
+
+    def readable(self):
+        return True
+
+    def feed(self, data: bytes):
+        """Дописать кусок (блокируется при заполненном буфере)"""
+        if not data:
+            return
+        with self._cond:
+            while self._size >= self.max_buffer and not self._reader_closed:
+                self._cond.wait()
+            if self._reader_closed:
+                return
+            self._chunks.append(memoryview(data))
+            self._size += len(data)
+            self._cond.notify_all()
+
+    def finish(self):
+        """Конец входных данных"""
+        with self._cond:
+            self._eof = True
+            self._cond.notify_all()
+
+    def readinto(self, buffer) -> int:
+        with self._cond:
+            while not self._chunks and not self._eof:
+                self._cond.wait()
+            if not self._chunks:
+                return 0
+            chunk = self._chunks[0]
+            n = min(len(buffer), len(chunk))
+            buffer[:n] = chunk[:n]
+            if n == len(chunk):
+                self._chunks.popleft()
+            else:
+                self._chunks[0] = chunk[n:]
+            self._size -= n
+            self._cond.notify_all()
+            return n
+
+    def close(self):
+        with self._cond:
+            self._reader_closed = True
+            self._cond.notify_all()
+        super().close()
@@ -1,39 +1,239 @@
+"""
+Детекция изменений между снимками ДО / ПОСЛЕ
+
+Кандидаты ищутся на уменьшенной копии (вершина пирамиды, длинная
+сторона analysis_side пикселей): absdiff, карта SSIM или плотный
+оптический поток Фарнебека. Маска чистится морфологией и делится на
+области связными компонентами. В полном разрешении метрика
+пересчитывается только внутри найденных областей, что уточняет их
+границы и площадь, не трогая остальной кадр.
+
+Перед сравнением второй снимок совмещается с первым по ключевым точкам
+(ImageRegistrar): без этого любой снос дрона засвечивает весь кадр.
+Если совместить не удалось, кадр просто масштабируется к размеру первого.
+"""
+
+from datetime import datetime
+
 import cv2
 import numpy as np
 
+METHODS = ("absdiff", "ssim", "opticalflow")
+# Порог absdiff для уточнения областей движения в полном разрешении
+FLOW_REFINE_DIFF = 30
+
+
+def merge_rects(rects):
+    """Объединение пересекающихся прямоугольников (x0, y0, x1, y1)"""
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        while rects:
+            x0, y0, x1, y1 = rects.pop()
+            i = 0
+            while i < len(rects):
+                a0, b0, a1, b1 = rects[i]
+                if a0 <= x1 and x0 <= a1 and b0 <= y1 and y0 <= b1:
+                    x0, y0, x1, y1 = min(x0, a0), min(y0, b0), max(x1, a1), max(y1, b1)
+                    rects.pop(i)
+                    merged = True
+                else:
+                    i += 1
+            result.append((x0, y0, x1, y1))
+        rects = result
+    return rects
+
+
 class ChangeDetector:
-    def __init__(self):
-        pass
+    def __init__(self, analysis_side=1024, min_area=200, max_regions=500, registrar=None):
+        """
+        Args:
+            analysis_side: Длинная сторона уменьшенной копии для поиска кандидатов
+            min_area: Минимальная площадь области в пикселях полного кадра
+            max_regions: Максимум областей в ответе (крупнейшие)
+            registrar: ImageRegistrar для совмещения снимков (None - без совмещения)
+        """
+        self.analysis_side = analysis_side
+        self.min_area = min_area
+        self.max_regions = max_regions
+        self.registrar = registrar
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
 
-    def compare(self, img_path1, img_path2, threshold=30, method="opticalflow"):
+    @staticmethod
+    def diff_mask(gray1, gray2, threshold=30):
+        """Бинарная маска изменившихся пикселей (absdiff + порог)"""
+        diff = cv2.absdiff(gray1, gray2)
+        _, thresh = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
+        return thresh
+
+    def change_score(self, gray1, gray2, threshold=30):
+        """Доля изменившихся пикселей (0..1) - дешевая оценка смены сцены"""
+        return cv2.countNonZero(self.diff_mask(gray1, gray2, threshold)) / float(gray1.size)
+
+    @staticmethod
+    def ssim_map(gray1, gray2, sigma=1.5):
+        """Локальная карта SSIM (гауссово окно), значения -1..1"""
+        c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+        a = gray1.astype(np.float32)
+        b = gray2.astype(np.float32)
+
+        def blur(x):
+            return cv2.GaussianBlur(x, (0, 0), sigma)
+
+        mu_a, mu_b = blur(a), blur(b)
+        mu_aa, mu_bb, mu_ab = mu_a * mu_a, mu_b * mu_b, mu_a * mu_b
+        var_a = blur(a * a) - mu_aa
+        var_b = blur(b * b) - mu_bb
+        cov = blur(a * b) - mu_ab
+        return ((2 * mu_ab + c1) * (2 * cov + c2)) / ((mu_aa + mu_bb + c1) * (var_a + var_b + c2))
+
+    def _method_mask(self, gray1, gray2, method, threshold, valid=None):
         """
-        Сравнение двух изображений.
-        Параметры threshold и method теперь официально принимаются функцией.
+        Маска изменений одним методом (absdiff / ssim) и средний SSIM
+
+        Для SSIM различие (1 - SSIM) переводится в шкалу 0..255, чтобы
+        порог чувствительности значил одно и то же для обоих методов.
+        Средний SSIM считается только по маске перекрытия valid, если она есть.
         """
-        img1 = cv2.imread(img_path1)
-        img2 = cv2.imread(img_path2)
+        if method == "ssim":
+            ssim = self.ssim_map(gray1, gray2)
+            mask = (((1.0 - ssim) * 127.5) > threshold).astype(np.uint8) * 255
+            overlap = ssim if valid is None else ssim[valid > 0]
+            return mask, float(overlap.mean()) if overlap.size else None
+        blurred1 = cv2.GaussianBlur(gray1, (5, 5), 0)
+        blurred2 = cv2.GaussianBlur(gray2, (5, 5), 0)
+        return self.diff_mask(blurred1, blurred2, threshold), None
 
-        if img1 is None or img2 is None:
-            return {"error": "Не удалось прочитать изображения", "changes": 0}
+    @staticmethod
+    def _flow_mask(small1, small2, threshold, scale):
+        """Маска смещения больше threshold пикселей полного кадра (поток Фарнебека)"""
+        flow = cv2.calcOpticalFlowFarneback(small1, small2, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+        magnitude = cv2.magnitude(flow[..., 0], flow[..., 1]) / scale
+        return (magnitude > threshold).astype(np.uint8) * 255
 
-        # Приводим к одному размеру для корректного сравнения
-        if img1.shape != img2.shape:
-            img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
+    def _candidates(self, mask, min_area):
+        """Прямоугольники связных областей маски (x0, y0, x1, y1)"""
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self._kernel)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        rects = []
+        for x, y, w, h, area in stats[1:count]:
+            if area >= min_area:
+                rects.append((int(x), int(y), int(x + w), int(y + h)))
+        return mask, rects
 
-        gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-        gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
+    def _register(self, img1, img2, key1, key2, register=True):
+        """Совмещение img2 с img1: (кадр, маска перекрытия или None, способ)"""
+        if register and self.registrar is not None:
+            aligned = self.registrar.align(img1, img2, key1, key2)
+            if aligned is not None:
+                warped, valid, _ = aligned
+                return warped, valid, "homography"
+        if img1.shape[:2] != img2.shape[:2]:
+            return cv2.resize(img2, (img1.shape[1], img1.shape[0])), None, "resize"
+        return img2, None, "none"
 
-        # Простейшая реализация разницы (absdiff)
-        # Если вы хотите использовать полноценный opticalflow, здесь вызывается соответствующий алгоритм cv2
-        diff = cv2.absdiff(gray1, gray2)
-        _, thresh = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
-        
-        # Считаем количество изменившихся пикселей
-        changes_count = int(np.sum(thresh > 0))
+    def compare_arrays(self, img1, img2, threshold=30, method="absdiff", min_area=None,
+                       key1=None, key2=None, register=True):
+        """
+        Сравнение двух уже декодированных кадров (BGR)
+
+        Args:
+            threshold: Порог чувствительности; для opticalflow - смещение в пикселях
+            method: absdiff / ssim / opticalflow
+            min_area: Минимальная площадь области (по умолчанию self.min_area)
+            key1, key2: Хэши содержимого снимков для кэша ключевых точек (content_key)
+            register: Совмещать ли снимки по ключевым точкам
+
+        Returns:
+            dict в формате ComparisonResponse
+        """
+        if method not in METHODS:
+            raise ValueError(f"Неизвестный метод сравнения: {method}")
+        min_area = self.min_area if min_area is None else min_area
+        size1 = [int(img1.shape[1]), int(img1.shape[0])]
+        size2 = [int(img2.shape[1]), int(img2.shape[0])]
+
+        img2, valid, registration = self._register(img1, img2, key1, key2, register)
+
+        gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY) if img1.ndim == 3 else img1
+        gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY) if img2.ndim == 3 else img2
+        h, w = gray1.shape
+
+        # Вершина пирамиды: поиск кандидатов на уменьшенной копии
+        scale = min(1.0, self.analysis_side / float(max(h, w)))
+        small_size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        small1 = cv2.resize(gray1, small_size, interpolation=cv2.INTER_AREA)
+        small2 = cv2.resize(gray2, small_size, interpolation=cv2.INTER_AREA)
+        small_valid = None
+        if valid is not None:
+            small_valid = cv2.resize(valid, small_size, interpolation=cv2.INTER_NEAREST)
 
+        if method == "opticalflow":
+            coarse, score = self._flow_mask(small1, small2, threshold, scale), None
+        else:
+            coarse, score = self._method_mask(small1, small2, method, threshold, small_valid)
+        if small_valid is not None:
+            # Вне перекрытия кадров сравнивать нечего
+            coarse = cv2.bitwise_and(coarse, small_valid)
+        coarse, rects = self._candidates(coarse, max(1.0, min_area * scale * scale))
+
+        # Уточнение в полном разрешении только внутри кандидатов
+        pad = int(np.ceil(4 / scale))
+        rois = merge_rects(
+            (max(0, int(x0 / scale) - pad), max(0, int(y0 / scale) - pad),
+             min(w, int(np.ceil(x1 / scale)) + pad), min(h, int(np.ceil(y1 / scale)) + pad))
+            for x0, y0, x1, y1 in rects
+        )
+
+        changes = []
+        for x0, y0, x1, y1 in rois:
+            roi1, roi2 = gray1[y0:y1, x0:x1], gray2[y0:y1, x0:x1]
+            if method == "opticalflow":
+                # Поток в полном разрешении дорог: берем грубую маску движения,
+                # а границы уточняем по изменившимся пикселям внутри нее
+                sx0, sy0 = int(x0 * scale), int(y0 * scale)
+                sx1, sy1 = max(sx0 + 1, int(np.ceil(x1 * scale))), max(sy0 + 1, int(np.ceil(y1 * scale)))
+                motion = cv2.resize(coarse[sy0:sy1, sx0:sx1], (x1 - x0, y1 - y0), interpolation=cv2.INTER_NEAREST)
+                changed, _ = self._method_mask(roi1, roi2, "absdiff", FLOW_REFINE_DIFF)
+                refined = cv2.bitwise_and(motion, changed)
+                mask = refined if cv2.countNonZero(refined) else motion
+            else:
+                mask, _ = self._method_mask(roi1, roi2, method, threshold)
+            if valid is not None:
+                mask = cv2.bitwise_and(mask, valid[y0:y1, x0:x1])
+            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel)
+
+            count, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            for (x, y, rw, rh, area), (cx, cy) in zip(stats[1:count], centroids[1:count]):
+                if area < min_area:
+                    continue
+                changes.append({
+                    "bbox": [int(x + x0), int(y + y0), int(rw), int(rh)],
+                    "area": float(area),
+                    "center": [int(round(cx + x0)), int(round(cy + y0))],
+                })
+
+        changes.sort(key=lambda c: c["area"], reverse=True)
+        changes = changes[:self.max_regions]
         return {
-            "changes": changes_count,
-            "method_used": method,
-            "threshold": threshold,
-            "status": "success"
-        }
\ No newline at end of file
+            "method": method,
+            "similarity_score": score,
+            "change_count": len(changes),
+            "changes": changes,
+            "image1_size": size1,
+            "image2_size": size2,
+            "registration": registration,
+            "timestamp": datetime.now(),
+        }
+
+    def compare(self, img_path1, img_path2, threshold=30, method="absdiff", min_area=None):
+        """Сравнение двух файлов изображений (см. compare_arrays)"""
+        img1 = cv2.imread(img_path1)
+        img2 = cv2.imread(img_path2)
+
+        if img1 is None or img2 is None:
+            return {"error": "Не удалось прочитать изображения", "change_count": 0}
+        return self.compare_arrays(img1, img2, threshold=threshold, method=method, min_area=min_area)
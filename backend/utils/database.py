@@ -1,14 +1,102 @@
+"""
+Доступ к SQLite
+
+Режим WAL: читатели не ждут писателя. Чтение идет через соединения,
+закрепленные за потоками (по одному на поток), запись - через один
+поток-писатель, который собирает операции из очереди и выполняет
+их общими транзакциями. Для asyncio есть обертка Database.aio: запись
+не занимает потоки пула, чтение идет в отдельном пуле потоков.
+"""
+
+import ast
+import asyncio
+import base64
+import json
+import logging
+import os
+import queue
 import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
+logger = logging.getLogger("ArgusDB")
+
+# synchronous=NORMAL в WAL: fsync только при чекпойнте, а не на каждый коммит
+PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-32000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA foreign_keys=ON',
+)
+
+# Постоянный кэш результатов: не больше строк и не старше дней (0 - без предела);
+# чистка идет в транзакции писателя раз в RESULT_CACHE_PRUNE_EVERY вставок
+RESULT_CACHE_MAX_ROWS = 100000
+RESULT_CACHE_TTL_DAYS = 30
+RESULT_CACHE_PRUNE_EVERY = 100
+
+# Колонки истории, которые можно запросить (detections - только явно)
+HISTORY_FIELDS = ('id', 'task_id', 'image_path', 'detections_count', 'processing_time', 'lat', 'lon', 'timestamp')
+
+
+def encode_cursor(timestamp, row_id):
+    raw = json.dumps([timestamp, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Raises ValueError для испорченного курсора"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return str(timestamp), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f'Некорректный курсор: {cursor}') from e
+
+
 class Database:
-    def __init__(self, db_path="data/argus_eye.db"):
+    def __init__(self, db_path="data/argus_eye.db", read_threads=4, write_batch=500,
+                 cache_max_rows=RESULT_CACHE_MAX_ROWS, cache_ttl_days=RESULT_CACHE_TTL_DAYS):
+        """
+        Args:
+            db_path: Путь к файлу БД
+            read_threads: Потоки чтения для асинхронного интерфейса
+            write_batch: Максимум операций записи в одной транзакции
+            cache_max_rows: Максимум строк в result_cache (0 - без предела)
+            cache_ttl_days: Срок жизни строки result_cache в днях (0 - бессрочно)
+        """
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.write_batch = write_batch
+        self.cache_max_rows = cache_max_rows
+        self.cache_ttl_days = cache_ttl_days
+        self._cache_inserts = 0
+        self._local = threading.local()
+        self._write_queue = queue.Queue()
+        self._writer = None
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+        # Подписчики на новые точки объектов (инвалидация кэшей карты по тайлам)
+        self._point_listeners = []
+        # Координаты объектов текущей транзакции писателя
+        self._pending_points = []
         self._init_db()
+        self.aio = AsyncDatabase(self, read_threads)
+
+    def _connect(self, **kwargs):
+        conn = sqlite3.connect(self.db_path, **kwargs)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
 
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
+        conn = self._connect()
+        # WAL сохраняется в файле БД и действует для всех соединений
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
             cursor = conn.cursor()
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS detection_tasks (
@@ -28,31 +116,772 @@ class Database:
             except: pass
             try: cursor.execute('ALTER TABLE detection_tasks ADD COLUMN lon REAL')
             except: pass
-            conn.commit()
+            # Кэш результатов детекции по хэшу содержимого
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS result_cache (
+                    key TEXT PRIMARY KEY,
+                    detections TEXT,
+                    processing_time REAL,
+                    info TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            try: cursor.execute('ALTER TABLE result_cache ADD COLUMN info TEXT')
+            except: pass
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_result_cache_created ON result_cache (created_at)')
+            self._prune_result_cache(conn)
+            # Покадровые результаты видео (пишутся по мере обработки)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS video_frames (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_id TEXT,
+                    frame_index INTEGER,
+                    frame_time REAL,
+                    detections_count INTEGER,
+                    detections TEXT
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_video_frames_task ON video_frames (task_id, frame_index)')
+            # Постраничная история (keyset по времени и id)
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_detection_tasks_time ON detection_tasks (timestamp, id)')
+            # Объекты снимков: типизированные колонки вместо строки со списком
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS detections (
+                    id INTEGER PRIMARY KEY,
+                    task_pk INTEGER NOT NULL REFERENCES detection_tasks(id) ON DELETE CASCADE,
+                    class_name TEXT,
+                    confidence REAL,
+                    x1 REAL,
+                    y1 REAL,
+                    x2 REAL,
+                    y2 REAL,
+                    lat REAL,
+                    lon REAL,
+                    alt REAL,
+                    geo_accuracy REAL,
+                    geo_method TEXT
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_detections_task ON detections (task_pk)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_detections_class ON detections (class_name, confidence)')
+            self._init_spatial_index(cursor)
+            self._migrate_detections(cursor)
+            self._init_statistics(cursor)
+        conn.close()
+
+    def _read(self):
+        """Соединение для чтения, закрепленное за текущим потоком"""
+        conn = getattr(self._local, 'conn', None)
+        # После fork соединение родителя использовать нельзя
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write(self, op, *args):
+        """
+        Поставить операцию op(conn, *args) в очередь писателя
+
+        Returns:
+            Future с результатом op
+        """
+        with self._writer_lock:
+            if self._writer is None or self._writer_pid != os.getpid():
+                self._writer = threading.Thread(target=self._writer_loop, name="ArgusDBWriter", daemon=True)
+                self._writer_pid = os.getpid()
+                self._writer.start()
+        future = Future()
+        self._write_queue.put((op, args, future))
+        return future
+
+    def _writer_loop(self):
+        # isolation_level=None - транзакциями управляем сами
+        conn = self._connect(isolation_level=None)
+        try:
+            stop = False
+            while not stop:
+                item = self._write_queue.get()
+                # Все, что накопилось, пока шла предыдущая транзакция, - одним коммитом
+                batch = []
+                while item is not None:
+                    # Отмененные до начала записи операции не выполняются
+                    if item[2].set_running_or_notify_cancel():
+                        batch.append(item)
+                    if len(batch) >= self.write_batch:
+                        break
+                    try:
+                        item = self._write_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                stop = item is None
+                if batch:
+                    self._run_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _run_batch(self, conn, batch):
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for op, args, _ in batch:
+                results.append(op(conn, *args))
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            self._pending_points = []
+            if len(batch) > 1:
+                # Ошибочная операция не должна ронять остальные - повторяем по одной
+                for item in batch:
+                    self._run_batch(conn, [item])
+                return
+            logger.error(f"Ошибка записи в БД: {e}")
+            batch[0][2].set_exception(e)
+            return
+        if self._pending_points:
+            points, self._pending_points = self._pending_points, []
+            self._notify_points(points)
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def add_points_listener(self, callback):
+        """
+        Подписка на новые точки объектов
+
+        callback(широты, долготы) вызывается в потоке писателя после
+        коммита транзакции, добавившей объекты с координатами.
+        """
+        self._point_listeners.append(callback)
+
+    def _notify_points(self, points):
+        lats = [lat for lat, _ in points]
+        lons = [lon for _, lon in points]
+        for callback in self._point_listeners:
+            try:
+                callback(lats, lons)
+            except Exception as e:
+                logger.error(f"Ошибка подписчика на новые точки: {e}")
+
+    def close(self):
+        """Дописать очередь и остановить писателя"""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None and writer.is_alive():
+            self._write_queue.put(None)
+            writer.join()
+        self.aio.close()
+
+    def _init_spatial_index(self, cursor):
+        """
+        Пространственный индекс точек снимков: R*Tree, заполняемый триггерами.
+        Если SQLite собран без R*Tree - обычный индекс по (lat, lon).
+        """
+        try:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS detection_tasks_rtree '
+                'USING rtree(id, min_lat, max_lat, min_lon, max_lon)'
+            )
+        except sqlite3.OperationalError:
+            self.has_rtree = False
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_detection_tasks_latlon ON detection_tasks (lat, lon)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_detections_latlon ON detections (lat, lon)')
+            return
+        self.has_rtree = True
+        # Положения отдельных объектов
+        cursor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS detections_rtree '
+            'USING rtree(id, min_lat, max_lat, min_lon, max_lon)'
+        )
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS detections_rtree_insert
+            AFTER INSERT ON detections
+            WHEN NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL
+            BEGIN
+                INSERT OR REPLACE INTO detections_rtree VALUES (NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS detections_rtree_delete
+            AFTER DELETE ON detections
+            BEGIN
+                DELETE FROM detections_rtree WHERE id = OLD.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS detection_tasks_rtree_insert
+            AFTER INSERT ON detection_tasks
+            WHEN NEW.lat IS NOT NULL AND NEW.lon IS NOT NULL
+            BEGIN
+                INSERT OR REPLACE INTO detection_tasks_rtree VALUES (NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS detection_tasks_rtree_delete
+            AFTER DELETE ON detection_tasks
+            BEGIN
+                DELETE FROM detection_tasks_rtree WHERE id = OLD.id;
+            END
+        ''')
+        # Строки, записанные до появления индекса
+        cursor.execute('''
+            INSERT INTO detection_tasks_rtree
+            SELECT id, lat, lat, lon, lon FROM detection_tasks
+            WHERE lat IS NOT NULL AND lon IS NOT NULL
+              AND id NOT IN (SELECT id FROM detection_tasks_rtree)
+        ''')
+
+    @staticmethod
+    def _init_statistics(cursor):
+        """
+        Сводные таблицы статистики. Обновляются при каждой записи задач в той
+        же транзакции, поэтому чтение не требует просмотра истории.
+
+        Детекции считаются по строкам таблицы detections, а не по
+        detections_count задачи: у видео это сумма боксов по кадрам (один
+        объект учтен на каждом кадре), и итог расходился бы с разбивкой по
+        классам и экспортом.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats_totals (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total_tasks INTEGER NOT NULL,
+                total_detections INTEGER NOT NULL,
+                total_processing_time REAL NOT NULL,
+                tasks_with_gps INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats_classes (
+                class_name TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                confidence_sum REAL NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats_daily (
+                day TEXT PRIMARY KEY,
+                tasks INTEGER NOT NULL,
+                detections INTEGER NOT NULL,
+                processing_time REAL NOT NULL,
+                tasks_with_gps INTEGER NOT NULL
+            )
+        ''')
+        if cursor.execute('SELECT 1 FROM stats_totals').fetchone():
+            return
+        # Первый запуск: один раз считаем по уже накопленной истории
+        cursor.execute('''
+            INSERT INTO stats_totals
+            SELECT 1, COUNT(*), (SELECT COUNT(*) FROM detections), COALESCE(SUM(processing_time), 0),
+                   COALESCE(SUM(lat IS NOT NULL AND lon IS NOT NULL), 0)
+            FROM detection_tasks
+        ''')
+        cursor.execute('''
+            INSERT INTO stats_classes
+            SELECT class_name, COUNT(*), COALESCE(SUM(confidence), 0) FROM detections
+            WHERE class_name IS NOT NULL GROUP BY class_name
+        ''')
+        cursor.execute('''
+            INSERT INTO stats_daily
+            SELECT date(t.timestamp), COUNT(*),
+                   COALESCE(SUM((SELECT COUNT(*) FROM detections d WHERE d.task_pk = t.id)), 0),
+                   COALESCE(SUM(t.processing_time), 0), COALESCE(SUM(t.lat IS NOT NULL AND t.lon IS NOT NULL), 0)
+            FROM detection_tasks t WHERE t.timestamp IS NOT NULL GROUP BY date(t.timestamp)
+        ''')
+
+    def _migrate_detections(self, cursor, chunk=1000):
+        """
+        Перенос старых записей: список детекций хранился строкой str(list).
+        Строка разбирается один раз, объекты уходят в таблицу detections,
+        поле обнуляется. Неразбираемые строки остаются как есть.
+        """
+        last_id, moved = 0, 0
+        while True:
+            rows = cursor.execute(
+                'SELECT id, detections, lat, lon FROM detection_tasks '
+                'WHERE id > ? AND detections IS NOT NULL ORDER BY id LIMIT ?', (last_id, chunk)
+            ).fetchall()
+            if not rows:
+                break
+            detection_rows, migrated = [], []
+            for task_pk, blob, lat, lon in rows:
+                try:
+                    items = ast.literal_eval(blob) if blob else []
+                    detection_rows.extend(self._detection_rows(task_pk, items, lat, lon))
+                except (ValueError, SyntaxError, TypeError, KeyError) as e:
+                    logger.warning(f"Не удалось перенести детекции задачи {task_pk}: {e}")
+                    continue
+                migrated.append((task_pk,))
+            cursor.executemany(self._DETECTION_INSERT, detection_rows)
+            cursor.executemany('UPDATE detection_tasks SET detections = NULL WHERE id = ?', migrated)
+            moved += len(migrated)
+            last_id = rows[-1][0]
+        if moved:
+            logger.info(f"Перенесено в таблицу detections: {moved} задач")
+
+    @staticmethod
+    def _task_row(data):
+        # Сами детекции пишутся в таблицу detections
+        return (
+            data['task_id'], 
+            data['image_path'], 
+            data['detections_count'], 
+            None,
+            data.get('processing_time', 0),
+            data.get('lat'), 
+            data.get('lon')
+        )
+
+    _DETECTION_INSERT = (
+        'INSERT INTO detections (task_pk, class_name, confidence, x1, y1, x2, y2, lat, lon, alt, geo_accuracy, geo_method) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+    )
+    _DETECTION_COLUMNS = 'task_pk, class_name, confidence, x1, y1, x2, y2, lat, lon, alt, geo_accuracy, geo_method'
+
+    @staticmethod
+    def _detection_rows(task_pk, detections, lat=None, lon=None):
+        """Строки таблицы detections; без координат объекта - координаты снимка"""
+        rows = []
+        for d in detections:
+            x1, y1, x2, y2 = d['bbox']
+            coords = d.get('coordinates')
+            if coords:
+                geo = (coords.get('latitude'), coords.get('longitude'), coords.get('altitude'),
+                       coords.get('accuracy_meters'), coords.get('calculation_method'))
+            elif lat is not None and lon is not None:
+                geo = (lat, lon, None, None, 'photo_gps')
+            else:
+                geo = (None, None, None, None, None)
+            rows.append((task_pk, d.get('class'), d.get('conf'), x1, y1, x2, y2) + geo)
+        return rows
+
+    @staticmethod
+    def _detection_dict(row):
+        """Детекция в исходном формате детектора"""
+        detection = {'class': row['class_name'], 'conf': row['confidence'],
+                     'bbox': [row['x1'], row['y1'], row['x2'], row['y2']]}
+        if row['lat'] is not None and row['lon'] is not None:
+            detection['coordinates'] = {
+                'latitude': row['lat'],
+                'longitude': row['lon'],
+                'altitude': row['alt'],
+                'accuracy_meters': row['geo_accuracy'],
+                'calculation_method': row['geo_method'],
+            }
+        return detection
+
+    def get_task_detections(self, task_pks):
+        """Детекции нескольких задач: id строки задачи -> список"""
+        result = {pk: [] for pk in task_pks}
+        if not result:
+            return result
+        placeholders = ', '.join('?' * len(result))
+        rows = self._read().execute(
+            f'SELECT {self._DETECTION_COLUMNS} FROM detections WHERE task_pk IN ({placeholders}) ORDER BY task_pk, id',
+            list(result)
+        )
+        for row in rows:
+            result[row['task_pk']].append(self._detection_dict(row))
+        return result
 
     def save_detection_task(self, data):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+        self.save_detection_tasks([data])
+
+    def save_detection_tasks(self, items):
+        """Запись нескольких задач (в общей транзакции писателя)"""
+        return self._write(self._insert_tasks, items).result()
+
+    def _insert_tasks(self, conn, items):
+        detection_rows = []
+        for data in items:
+            # id строки нужен для детекций - задачи вставляются по одной в той же транзакции
+            cursor = conn.execute('''
                 INSERT INTO detection_tasks 
                 (task_id, image_path, detections_count, detections, processing_time, lat, lon)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data['task_id'], 
-                data['image_path'], 
-                data['detections_count'], 
-                str(data['detections']), 
-                data.get('processing_time', 0),
-                data.get('lat'), 
-                data.get('lon')
-            ))
-            conn.commit()
-
-    def get_history(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM detection_tasks ORDER BY timestamp DESC')
-            return [dict(row) for row in cursor.fetchall()]
+            ''', self._task_row(data))
+            detection_rows.extend(self._detection_rows(cursor.lastrowid, data['detections'], data.get('lat'), data.get('lon')))
+        conn.executemany(self._DETECTION_INSERT, detection_rows)
+        self._update_statistics(conn, items, detection_rows)
+        # Координаты новых объектов - подписчикам после коммита (см. _run_batch)
+        self._pending_points.extend(
+            (row[7], row[8]) for row in detection_rows if row[7] is not None and row[8] is not None
+        )
+
+    @staticmethod
+    def _update_statistics(conn, items, detection_rows):
+        """Приращения сводных таблиц за пачку задач (внутри транзакции записи)"""
+        tasks = len(items)
+        # По сохраненным объектам, как stats_classes (см. _init_statistics)
+        detections = len(detection_rows)
+        processing_time = sum(data.get('processing_time') or 0 for data in items)
+        with_gps = sum(1 for data in items if data.get('lat') is not None and data.get('lon') is not None)
+        conn.execute('''
+            UPDATE stats_totals SET total_tasks = total_tasks + ?, total_detections = total_detections + ?,
+                total_processing_time = total_processing_time + ?, tasks_with_gps = tasks_with_gps + ?
+            WHERE id = 1
+        ''', (tasks, detections, processing_time, with_gps))
+        # Время задач - CURRENT_TIMESTAMP той же транзакции, день берем так же
+        conn.execute('''
+            INSERT INTO stats_daily (day, tasks, detections, processing_time, tasks_with_gps)
+            VALUES (date('now'), ?, ?, ?, ?)
+            ON CONFLICT(day) DO UPDATE SET tasks = tasks + excluded.tasks,
+                detections = detections + excluded.detections,
+                processing_time = processing_time + excluded.processing_time,
+                tasks_with_gps = tasks_with_gps + excluded.tasks_with_gps
+        ''', (tasks, detections, processing_time, with_gps))
+
+        classes = {}
+        for row in detection_rows:
+            name, confidence = row[1], row[2]
+            if name is None:
+                continue
+            count, total = classes.get(name, (0, 0.0))
+            classes[name] = (count + 1, total + (confidence or 0.0))
+        conn.executemany('''
+            INSERT INTO stats_classes (class_name, count, confidence_sum) VALUES (?, ?, ?)
+            ON CONFLICT(class_name) DO UPDATE SET count = count + excluded.count,
+                confidence_sum = confidence_sum + excluded.confidence_sum
+        ''', [(name, count, total) for name, (count, total) in classes.items()])
+
+    def get_statistics(self, days=30):
+        """
+        Сводная статистика из таблиц stats_* (время не зависит от объема истории)
+
+        Args:
+            days: Сколько последних дней вернуть в daily_statistics
+        """
+        conn = self._read()
+        totals = conn.execute('SELECT * FROM stats_totals WHERE id = 1').fetchone()
+        total_tasks = totals['total_tasks'] if totals else 0
+        classes = conn.execute(
+            'SELECT class_name, count, confidence_sum FROM stats_classes ORDER BY count DESC'
+        ).fetchall()
+        daily = conn.execute(
+            'SELECT day, tasks, detections, processing_time, tasks_with_gps FROM stats_daily '
+            'ORDER BY day DESC LIMIT ?', (days,)
+        ).fetchall()
+        return {
+            'total_tasks': total_tasks,
+            'total_detections': totals['total_detections'] if totals else 0,
+            'avg_processing_time': totals['total_processing_time'] / total_tasks if total_tasks else 0.0,
+            'tasks_with_gps': totals['tasks_with_gps'] if totals else 0,
+            'gps_percentage': 100.0 * totals['tasks_with_gps'] / total_tasks if total_tasks else 0.0,
+            'class_statistics': [
+                {'class_name': row['class_name'], 'count': row['count'],
+                 'avg_confidence': row['confidence_sum'] / row['count'] if row['count'] else 0.0}
+                for row in classes
+            ],
+            'daily_statistics': [
+                {'date': row['day'], 'tasks': row['tasks'], 'detections': row['detections'],
+                 'avg_processing_time': row['processing_time'] / row['tasks'] if row['tasks'] else 0.0,
+                 'tasks_with_gps': row['tasks_with_gps']}
+                for row in reversed(daily)
+            ],
+        }
+
+    def save_video_frames(self, task_id, frames):
+        """Пачка покадровых результатов"""
+        return self._write(self._insert_video_frames, task_id, frames).result()
+
+    @staticmethod
+    def _insert_video_frames(conn, task_id, frames):
+        conn.executemany(
+            'INSERT INTO video_frames (task_id, frame_index, frame_time, detections_count, detections) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(task_id, f['frame_index'], f['frame_time'], len(f['detections']), json.dumps(f['detections']))
+             for f in frames]
+        )
+
+    def get_cached_result(self, key):
+        row = self._read().execute(
+            'SELECT detections, processing_time, info FROM result_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], json.loads(row[2] or '{}')
+
+    def save_cached_result(self, key, detections, processing_time, info=None):
+        return self._write(self._upsert_cached_result, key, detections, processing_time, info).result()
+
+    def _upsert_cached_result(self, conn, key, detections, processing_time, info):
+        conn.execute(
+            'INSERT OR REPLACE INTO result_cache (key, detections, processing_time, info) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(detections), processing_time, json.dumps(info or {}))
+        )
+        self._cache_inserts += 1
+        if self._cache_inserts % RESULT_CACHE_PRUNE_EVERY == 0:
+            self._prune_result_cache(conn)
+
+    def prune_result_cache(self):
+        """Удалить устаревшие и лишние строки кэша результатов сейчас"""
+        return self._write(self._prune_result_cache).result()
+
+    def _prune_result_cache(self, conn):
+        """
+        Чистка result_cache по возрасту и числу строк
+
+        INSERT OR REPLACE выдает строке новый rowid, поэтому порядок rowid -
+        порядок записи: при переполнении удаляются самые старые записи.
+
+        Returns:
+            Число удаленных строк
+        """
+        removed = 0
+        if self.cache_ttl_days:
+            removed += conn.execute(
+                "DELETE FROM result_cache WHERE created_at < datetime('now', ?)",
+                (f'-{int(self.cache_ttl_days)} days',)
+            ).rowcount
+        if self.cache_max_rows:
+            removed += conn.execute(
+                'DELETE FROM result_cache WHERE rowid <= '
+                '(SELECT rowid FROM result_cache ORDER BY rowid DESC LIMIT 1 OFFSET ?)',
+                (int(self.cache_max_rows),)
+            ).rowcount
+        return removed
+
+    def query_points(self, bbox=None, start=None, end=None, classes=None, limit=5000, min_confidence=None):
+        """
+        Точки снимков в прямоугольнике и интервале времени
+
+        Args:
+            bbox: (min_lat, min_lon, max_lat, max_lon) или None
+            start, end: Границы времени (строки 'YYYY-MM-DD HH:MM:SS') или None
+            classes: Только снимки с объектами этих классов
+            limit: Максимум точек в ответе
+            min_confidence: Учитывать только объекты с уверенностью не ниже
+
+        Returns:
+            list[dict]: task_id, lat, lon, timestamp, detections_count
+                        (и class_counts при фильтре по объектам)
+        """
+        if classes or min_confidence is not None:
+            return self._query_points_by_objects(bbox, start, end, classes, limit, min_confidence)
+
+        where, params = ['t.lat IS NOT NULL', 't.lon IS NOT NULL'], []
+        source = 'detection_tasks t'
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            if self.has_rtree:
+                # R*Tree хранит float32 - сужаем по индексу, точную границу проверяем по таблице
+                source = 'detection_tasks_rtree r JOIN detection_tasks t ON t.id = r.id'
+                where += ['r.max_lat >= ?', 'r.min_lat <= ?', 'r.max_lon >= ?', 'r.min_lon <= ?']
+                params += [min_lat, max_lat, min_lon, max_lon]
+            where += ['t.lat BETWEEN ? AND ?', 't.lon BETWEEN ? AND ?']
+            params += [min_lat, max_lat, min_lon, max_lon]
+        where, params = self._time_filter(where, params, start, end)
+
+        query = (
+            'SELECT t.task_id, t.lat, t.lon, t.timestamp, t.detections_count '
+            f'FROM {source} WHERE {" AND ".join(where)} ORDER BY t.timestamp DESC LIMIT ?'
+        )
+        return [dict(row) for row in self._read().execute(query, params + [limit])]
+
+    @staticmethod
+    def _time_filter(where, params, start, end, alias='t'):
+        if start is not None:
+            where = where + [f'{alias}.timestamp >= ?']
+            params = params + [start]
+        if end is not None:
+            where = where + [f'{alias}.timestamp <= ?']
+            params = params + [end]
+        return where, params
+
+    def _object_filter(self, bbox, classes, min_confidence):
+        """Условия по таблице detections (псевдоним d) и источник строк"""
+        where, params = [], []
+        source = 'detections d'
+        if classes:
+            where.append(f'd.class_name IN ({", ".join("?" * len(classes))})')
+            params += list(classes)
+        if min_confidence is not None:
+            where.append('d.confidence >= ?')
+            params.append(min_confidence)
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            if self.has_rtree:
+                source = 'detections_rtree r JOIN detections d ON d.id = r.id'
+                where += ['r.max_lat >= ?', 'r.min_lat <= ?', 'r.max_lon >= ?', 'r.min_lon <= ?']
+                params += [min_lat, max_lat, min_lon, max_lon]
+            where += ['d.lat BETWEEN ? AND ?', 'd.lon BETWEEN ? AND ?']
+            params += [min_lat, max_lat, min_lon, max_lon]
+        return source, where, params
+
+    def _query_points_by_objects(self, bbox, start, end, classes, limit, min_confidence):
+        """Снимки, где есть подходящие объекты (bbox - по координатам объектов)"""
+        source, where, params = self._object_filter(bbox, classes, min_confidence)
+        where, params = self._time_filter(where + ['t.lat IS NOT NULL', 't.lon IS NOT NULL'], params, start, end)
+        query = (
+            'SELECT t.id, t.task_id, t.lat, t.lon, t.timestamp, t.detections_count, d.class_name, COUNT(*) AS n '
+            f'FROM {source} JOIN detection_tasks t ON t.id = d.task_pk '
+            f'WHERE {" AND ".join(where)} '
+            'GROUP BY t.id, d.class_name ORDER BY t.timestamp DESC, t.id DESC'
+        )
+        points = {}
+        for row in self._read().execute(query, params):
+            point = points.get(row['id'])
+            if point is None:
+                if len(points) >= limit:
+                    break
+                point = points[row['id']] = {
+                    'task_id': row['task_id'], 'lat': row['lat'], 'lon': row['lon'],
+                    'timestamp': row['timestamp'], 'detections_count': row['detections_count'],
+                    'class_counts': {},
+                }
+            point['class_counts'][row['class_name']] = row['n']
+        return list(points.values())
+
+    def object_positions(self, bbox=None, start=None, end=None, classes=None, min_confidence=None):
+        """
+        Координаты и классы объектов (для кластеризации карты)
+
+        Returns:
+            (широты, долготы, классы) - три списка одной длины
+        """
+        source, where, params = self._object_filter(bbox, classes, min_confidence)
+        where = where + ['d.lat IS NOT NULL', 'd.lon IS NOT NULL']
+        if start is not None or end is not None:
+            # Время есть только у задачи - соединяем, лишь когда нужен фильтр по нему
+            source += ' JOIN detection_tasks t ON t.id = d.task_pk'
+            where, params = self._time_filter(where, params, start, end)
+        rows = self._read().execute(
+            f'SELECT d.lat, d.lon, d.class_name FROM {source} WHERE {" AND ".join(where)}', params
+        ).fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+
+    EXPORT_COLUMNS = ('task_id', 'image_path', 'timestamp', 'class_name', 'confidence',
+                      'x1', 'y1', 'x2', 'y2', 'lat', 'lon', 'alt', 'geo_accuracy', 'geo_method')
+
+    def iter_objects(self, bbox=None, start=None, end=None, classes=None, min_confidence=None, chunk=1000):
+        """
+        Объекты с данными снимка, кусками по chunk строк
+
+        Курсор читается через fetchmany на отдельном соединении, поэтому
+        генератор можно продвигать из разных потоков (StreamingResponse),
+        а в памяти одновременно держится только один кусок.
+
+        Yields:
+            list[dict]: Кусок строк с колонками EXPORT_COLUMNS
+        """
+        source, where, params = self._object_filter(bbox, classes, min_confidence)
+        where, params = self._time_filter(where, params, start, end)
+        columns = ', '.join(('t.' if c in ('task_id', 'image_path', 'timestamp') else 'd.') + c
+                            for c in self.EXPORT_COLUMNS)
+        query = (
+            f'SELECT {columns} FROM {source} JOIN detection_tasks t ON t.id = d.task_pk '
+            f'WHERE {" AND ".join(where) or "1"} ORDER BY d.id'
+        )
+        conn = self._connect(check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def get_history(self, limit=50, cursor=None, fields=None, include_detections=False):
+        """
+        Страница истории задач, от новых к старым
+
+        Постраничный обход по индексу (timestamp, id): следующая страница
+        начинается сразу после последней строки предыдущей, поэтому время
+        запроса не зависит от глубины истории.
+
+        Args:
+            limit: Строк на странице
+            cursor: next_cursor предыдущей страницы или None для первой
+            fields: Нужные колонки из HISTORY_FIELDS (None - все)
+            include_detections: Добавить тяжелое поле detections
+
+        Returns:
+            (строки, курсор следующей страницы или None)
+
+        Raises:
+            ValueError: Неизвестное поле или испорченный курсор
+        """
+        fields = list(fields or HISTORY_FIELDS)
+        unknown = set(fields) - set(HISTORY_FIELDS)
+        if unknown:
+            raise ValueError(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+        columns = list(dict.fromkeys(fields + ['timestamp', 'id']))
+
+        select = f'SELECT {", ".join(columns)} FROM detection_tasks'
+        order = 'ORDER BY timestamp DESC, id DESC LIMIT ?'
+        if cursor:
+            timestamp, row_id = decode_cursor(cursor)
+            # Две ветки вместо (timestamp, id) < (?, ?): сравнение кортежей ищет по индексу
+            # только по timestamp и перебирает все строки с той же секундой (пакетные вставки)
+            query = (
+                f'SELECT * FROM ({select} WHERE timestamp = ? AND id < ? ORDER BY id DESC LIMIT ?) '
+                f'UNION ALL SELECT * FROM ({select} WHERE timestamp < ? {order}) {order}'
+            )
+            params = [timestamp, row_id, limit + 1, timestamp, limit + 1, limit + 1]
+        else:
+            query = f'{select} {order}'
+            params = [limit + 1]
+
+        rows = [dict(row) for row in self._read().execute(query, params)]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['timestamp'], rows[-1]['id'])
+
+        detections = self.get_task_detections([row['id'] for row in rows]) if include_detections else {}
+        items = []
+        for row in rows:
+            item = {k: v for k, v in row.items() if k in fields}
+            if include_detections:
+                item['detections'] = detections[row['id']]
+            items.append(item)
+        return items, next_cursor
+
+class AsyncDatabase:
+    """Асинхронный интерфейс к Database для кода в event loop"""
+
+    def __init__(self, db, read_threads=4):
+        self.db = db
+        self._read_pool = ThreadPoolExecutor(max_workers=max(1, read_threads), thread_name_prefix="ArgusDBRead")
+
+    async def _read(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._read_pool, method, *args)
+
+    async def _write(self, op, *args):
+        # Ждем писателя без занятого потока
+        return await asyncio.wrap_future(self.db._write(op, *args))
+
+    async def save_detection_task(self, data):
+        return await self._write(self.db._insert_tasks, [data])
+
+    async def save_detection_tasks(self, items):
+        return await self._write(self.db._insert_tasks, items)
+
+    async def save_video_frames(self, task_id, frames):
+        return await self._write(self.db._insert_video_frames, task_id, frames)
+
+    async def save_cached_result(self, key, detections, processing_time, info=None):
+        return await self._write(self.db._upsert_cached_result, key, detections, processing_time, info)
+
+    async def get_cached_result(self, key):
+        return await self._read(self.db.get_cached_result, key)
+
+    async def query_points(self, *args, **kwargs):
+        return await self._read(lambda: self.db.query_points(*args, **kwargs))
+
+    async def get_history(self, *args, **kwargs):
+        return await self._read(lambda: self.db.get_history(*args, **kwargs))
+
+    async def get_statistics(self, days=30):
+        return await self._read(self.db.get_statistics, days)
+
+    def close(self):
+        self._read_pool.shutdown(wait=False)
+
 
 db = Database()
\ No newline at end of file
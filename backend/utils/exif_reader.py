@@ -0,0 +1,333 @@
+"""
+Быстрое чтение EXIF/GPS только из заголовка файла
+
+Разбирается лишь сегмент APP1 (TIFF-структура EXIF) и XMP DJI/Autel
+в начале JPEG - обычно это первые десятки КБ, остальной файл не
+читается. Извлекаются только теги, нужные для геопривязки: GPS,
+высота, ориентация подвеса, фокусное расстояние, камера и время.
+Размер кадра (read_image_size) так же берется из заголовка JPEG / PNG
+без декодирования пикселей.
+"""
+
+import logging
+import os
+import re
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger("ArgusExif")
+
+HEADER_BYTES = 16 << 10
+MAX_HEADER_BYTES = 512 << 10
+
+EXIF_MARKER = b"Exif\x00\x00"
+XMP_MARKER = b"http://ns.adobe.com/xap/1.0/\x00"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".tif", ".tiff"}
+# Маркеры SOFn (кроме DHT, JPG и DAC) - в них высота и ширина кадра
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Размеры типов TIFF: BYTE, ASCII, SHORT, LONG, RATIONAL, SBYTE, UNDEFINED, SSHORT, SLONG, SRATIONAL
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8}
+_TYPE_FORMATS = {3: "H", 4: "I", 8: "h", 9: "i"}
+
+# Нужные теги по IFD
+_IFD0_TAGS = {0x010F: "make", 0x0110: "model", 0x0112: "orientation", 0x0132: "datetime",
+              0x8769: "exif_ifd", 0x8825: "gps_ifd"}
+_EXIF_TAGS = {0x9003: "datetime_original", 0x920A: "focal_length", 0xA405: "focal_length_35mm",
+              0xA002: "width", 0xA003: "height"}
+_GPS_TAGS = {0x01: "lat_ref", 0x02: "lat", 0x03: "lon_ref", 0x04: "lon", 0x05: "alt_ref", 0x06: "alt"}
+
+# drone-dji:GimbalPitchDegree="-90.0" и т.п. (атрибуты и элементы XMP)
+_XMP_FIELDS = {
+    "gimbal_pitch": "GimbalPitchDegree",
+    "gimbal_yaw": "GimbalYawDegree",
+    "gimbal_roll": "GimbalRollDegree",
+    "flight_yaw": "FlightYawDegree",
+    "relative_altitude": "RelativeAltitude",
+    "absolute_altitude": "AbsoluteAltitude",
+}
+_XMP_PATTERNS = {
+    key: re.compile(r'(?:drone-dji|Camera|drone):' + name + r'(?:="|>)\s*([+-]?[0-9.]+)')
+    for key, name in _XMP_FIELDS.items()
+}
+
+
+class _Header:
+    """Начало файла (или буфера), дочитываемое по требованию"""
+
+    def __init__(self, source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._file = None
+            self.data = bytes(source[:MAX_HEADER_BYTES])
+        else:
+            self._file = open(source, "rb")
+            self.data = self._file.read(HEADER_BYTES)
+
+    def ensure(self, end: int) -> bool:
+        """Гарантирует, что в буфере есть байты до end"""
+        if end <= len(self.data):
+            return True
+        if self._file is None or end > MAX_HEADER_BYTES:
+            return False
+        self.data += self._file.read(end - len(self.data))
+        return end <= len(self.data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _read_ifd(tiff: bytes, offset: int, endian: str, wanted: Dict[int, str]) -> dict:
+    """Значения нужных тегов одного IFD"""
+    values = {}
+    (count,) = struct.unpack_from(endian + "H", tiff, offset)
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        tag, type_, n = struct.unpack_from(endian + "HHI", tiff, entry)
+        name = wanted.get(tag)
+        if name is None or type_ not in _TYPE_SIZES:
+            continue
+        size = _TYPE_SIZES[type_] * n
+        pos = entry + 8 if size <= 4 else struct.unpack_from(endian + "I", tiff, entry + 8)[0]
+        if pos + size > len(tiff):
+            continue
+        if type_ == 2:
+            values[name] = tiff[pos:pos + n].split(b"\x00", 1)[0].decode("ascii", "replace").strip()
+        elif type_ in (5, 10):
+            fmt = endian + ("I" if type_ == 5 else "i") * (2 * n)
+            raw = struct.unpack_from(fmt, tiff, pos)
+            rationals = [num / den if den else 0.0 for num, den in zip(raw[::2], raw[1::2])]
+            values[name] = rationals[0] if n == 1 else rationals
+        elif type_ in _TYPE_FORMATS:
+            raw = struct.unpack_from(endian + _TYPE_FORMATS[type_] * n, tiff, pos)
+            values[name] = raw[0] if n == 1 else list(raw)
+        else:
+            values[name] = tiff[pos] if n == 1 else tiff[pos:pos + n]
+    return values
+
+
+def _parse_tiff(tiff: bytes) -> dict:
+    """Теги IFD0 / Exif / GPS из TIFF-структуры"""
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if endian is None:
+        return {}
+    ifd0_offset = struct.unpack_from(endian + "I", tiff, 4)[0]
+    tags = _read_ifd(tiff, ifd0_offset, endian, _IFD0_TAGS)
+    if "exif_ifd" in tags:
+        tags.update(_read_ifd(tiff, tags.pop("exif_ifd"), endian, _EXIF_TAGS))
+    if "gps_ifd" in tags:
+        tags.update(_read_ifd(tiff, tags.pop("gps_ifd"), endian, _GPS_TAGS))
+    return tags
+
+
+def _dms_to_decimal(dms, ref) -> Optional[float]:
+    if not isinstance(dms, list) or len(dms) != 3:
+        return None
+    value = dms[0] + dms[1] / 60.0 + dms[2] / 3600.0
+    return -value if ref in ("S", "W") else value
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, "%Y:%m:%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+
+def _finalize(tags: dict, xmp: dict) -> dict:
+    """Итоговый набор полей в едином формате"""
+    lat = _dms_to_decimal(tags.get("lat"), tags.get("lat_ref"))
+    lon = _dms_to_decimal(tags.get("lon"), tags.get("lon_ref"))
+    # Нулевые координаты - признак отсутствия фикса GPS
+    if lat == 0.0 and lon == 0.0:
+        lat = lon = None
+
+    altitude = tags.get("alt")
+    if isinstance(altitude, float) and tags.get("alt_ref") == 1:
+        altitude = -altitude
+    if xmp.get("absolute_altitude") is not None:
+        altitude = xmp["absolute_altitude"]
+
+    return {
+        "lat": lat,
+        "lon": lon,
+        "altitude": altitude,
+        "relative_altitude": xmp.get("relative_altitude"),
+        "gimbal_pitch": xmp.get("gimbal_pitch"),
+        "gimbal_yaw": xmp.get("gimbal_yaw"),
+        "gimbal_roll": xmp.get("gimbal_roll"),
+        "flight_yaw": xmp.get("flight_yaw"),
+        "focal_length": tags.get("focal_length"),
+        "focal_length_35mm": tags.get("focal_length_35mm"),
+        "make": tags.get("make"),
+        "model": tags.get("model"),
+        "orientation": tags.get("orientation"),
+        "width": tags.get("width"),
+        "height": tags.get("height"),
+        "timestamp": _parse_datetime(tags.get("datetime_original") or tags.get("datetime")),
+    }
+
+
+def _parse_xmp(packet: bytes) -> dict:
+    text = packet.decode("utf-8", "ignore")
+    values = {}
+    for key, pattern in _XMP_PATTERNS.items():
+        match = pattern.search(text)
+        if match:
+            values[key] = float(match.group(1))
+    return values
+
+
+def _scan_jpeg(header: _Header):
+    """Сегменты APP1 (EXIF и XMP) до начала сжатых данных"""
+    tags, xmp = {}, {}
+    pos = 2
+    while header.ensure(pos + 4):
+        data = header.data
+        if data[pos] != 0xFF:
+            break
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Заполняющие байты между сегментами
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):
+            # Конец файла или начало скана - метаданных дальше нет
+            break
+        (length,) = struct.unpack_from(">H", data, pos + 2)
+        start, end = pos + 4, pos + 2 + length
+        if marker == 0xE1:
+            if not header.ensure(end):
+                break
+            segment = header.data[start:end]
+            if segment.startswith(EXIF_MARKER) and not tags:
+                tags = _parse_tiff(segment[len(EXIF_MARKER):])
+            elif segment.startswith(XMP_MARKER) and not xmp:
+                xmp = _parse_xmp(segment[len(XMP_MARKER):])
+            if tags and xmp:
+                break
+        pos = end
+    return tags, xmp
+
+
+def read_exif(source) -> dict:
+    """
+    Метаданные съемки из заголовка снимка
+
+    Args:
+        source: Путь к файлу или байты (JPEG или TIFF)
+
+    Returns:
+        dict: lat, lon, altitude, relative_altitude, gimbal_pitch/yaw/roll,
+              flight_yaw, focal_length, focal_length_35mm, make, model,
+              orientation, width, height, timestamp. Отсутствующие поля равны None.
+    """
+    tags, xmp = {}, {}
+    try:
+        header = _Header(source)
+    except OSError as e:
+        logger.warning(f"Не удалось открыть {source}: {e}")
+        return _finalize(tags, xmp)
+
+    try:
+        signature = header.data[:4]
+        if signature[:2] == b"\xFF\xD8":
+            tags, xmp = _scan_jpeg(header)
+        elif signature in (b"II*\x00", b"MM\x00*"):
+            header.ensure(MAX_HEADER_BYTES)
+            tags = _parse_tiff(header.data)
+    except (struct.error, IndexError, ValueError) as e:
+        # Поврежденный или обрезанный заголовок: отдаем то, что успели прочитать
+        logger.debug(f"Некорректный EXIF: {e}")
+    finally:
+        header.close()
+    return _finalize(tags, xmp)
+
+
+def _jpeg_size(header: _Header) -> Optional[Tuple[int, int]]:
+    """(высота, ширина) из сегмента SOF"""
+    pos = 2
+    while header.ensure(pos + 4):
+        data = header.data
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):
+            return None
+        if marker in _SOF_MARKERS:
+            if not header.ensure(pos + 9):
+                return None
+            return struct.unpack_from(">HH", header.data, pos + 5)
+        (length,) = struct.unpack_from(">H", data, pos + 2)
+        pos += 2 + length
+    return None
+
+
+def read_image_size(source, orientation: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """
+    Размер кадра из заголовка JPEG / PNG без декодирования
+
+    Args:
+        source: Путь к файлу или байты
+        orientation: Тег EXIF Orientation; при 5-8 стороны меняются местами,
+                     как при повороте в cv2.imdecode
+
+    Returns:
+        (высота, ширина) или None, если формат не поддерживается или заголовок поврежден
+    """
+    try:
+        header = _Header(source)
+    except OSError as e:
+        logger.warning(f"Не удалось открыть {source}: {e}")
+        return None
+
+    size = None
+    try:
+        if header.data[:2] == b"\xFF\xD8":
+            size = _jpeg_size(header)
+        elif header.data[:8] == PNG_SIGNATURE and header.ensure(24) and header.data[12:16] == b"IHDR":
+            width, height = struct.unpack_from(">II", header.data, 16)
+            size = height, width
+    except (struct.error, IndexError) as e:
+        logger.debug(f"Некорректный заголовок изображения: {e}")
+    finally:
+        header.close()
+    if not size or not all(size):
+        return None
+    if orientation in (5, 6, 7, 8):
+        size = size[1], size[0]
+    return tuple(int(v) for v in size)
+
+
+def read_gps(source):
+    """(lat, lon) снимка или (None, None)"""
+    info = read_exif(source)
+    return info["lat"], info["lon"]
+
+
+def read_exif_batch(paths: Iterable, workers: int = 8) -> Dict[str, dict]:
+    """
+    Метаданные многих файлов пулом потоков (чтение заголовков упирается в I/O)
+
+    Returns:
+        dict: путь -> результат read_exif
+    """
+    paths = [str(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return dict(zip(paths, pool.map(read_exif, paths)))
+
+
+def read_exif_dir(directory, workers: int = 8, recursive: bool = False) -> Dict[str, dict]:
+    """Метаданные всех JPEG/TIFF снимков каталога"""
+    directory = Path(directory)
+    pattern = "**/*" if recursive else "*"
+    paths = sorted(p for p in directory.glob(pattern)
+                   if p.suffix.lower() in IMAGE_SUFFIXES and p.is_file())
+    return read_exif_batch(paths, workers or os.cpu_count())
@@ -1,19 +1,197 @@
-import exifread
+"""
+Геопривязка снимков и отдельных объектов
+
+Центр каждого бокса проецируется на землю по модели камеры-обскуры:
+луч из камеры (фокусное расстояние и размер матрицы) поворачивается
+по ориентации подвеса (тангаж, курс) и пересекается с плоскостью
+земли на относительной высоте полета. Все боксы кадра считаются
+одним набором матричных операций NumPy.
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from backend.utils.exif_reader import read_exif, read_exif_batch
+
+EARTH_RADIUS_M = 6378137.0
+
+# Размер матрицы (ширина, высота) в мм по модели камеры из EXIF
+CAMERA_SENSORS = {
+    # DJI
+    "FC220": (6.17, 4.55),      # Mavic Pro
+    "FC300X": (6.17, 4.55),     # Phantom 3
+    "FC330": (6.17, 4.55),      # Phantom 4
+    "FC6310": (13.2, 8.8),      # Phantom 4 Pro
+    "FC6310S": (13.2, 8.8),     # Phantom 4 Pro V2
+    "FC6310R": (13.2, 8.8),     # Phantom 4 RTK
+    "FC2103": (6.17, 4.55),     # Mavic Air
+    "FC3170": (6.4, 4.8),       # Mavic Air 2
+    "FC3411": (13.2, 8.8),      # Air 2S
+    "FC7203": (6.17, 4.55),     # Mavic Mini
+    "FC7303": (6.17, 4.55),     # Mini 2
+    "FC3582": (9.6, 7.2),       # Mini 3 Pro
+    "L1D-20C": (13.2, 8.8),     # Mavic 2 Pro
+    "FC2204": (6.17, 4.55),     # Mavic 2 Zoom
+    "L2D-20C": (17.3, 13.0),    # Mavic 3
+    "M3E": (17.3, 13.0),        # Mavic 3 Enterprise
+    "M3T": (6.4, 4.8),          # Mavic 3 Thermal (широкоугольная)
+    "FC6520": (17.3, 13.0),     # Zenmuse X5S
+    "FC6540": (23.5, 15.6),     # Zenmuse X7
+    "ZENMUSEP1": (35.9, 24.0),  # Zenmuse P1
+    "ZH20T": (7.53, 5.64),      # Zenmuse H20T (зум)
+    # Autel
+    "XT701": (13.2, 8.8),       # EVO II Pro
+    "XT705": (6.4, 4.8),        # EVO II 8K
+    "XT706": (6.4, 4.8),        # EVO II Dual 640T
+    "XL720": (6.4, 4.8),        # EVO Lite
+    "XL721": (13.2, 8.8),       # EVO Lite+
+    "XT709": (13.2, 8.8),       # EVO Max 4T
+}
+
+# Погрешности для оценки accuracy_meters
+GPS_ACCURACY_M = 5.0
+ATTITUDE_ACCURACY_DEG = 1.0
+# Лучи, уходящие к горизонту дальше этого числа высот, не проецируются
+MAX_RANGE_FACTOR = 20.0
+
+
+def sensor_size(info: dict) -> Optional[Tuple[float, float]]:
+    """Размер матрицы по модели камеры или по 35-мм эквиваленту"""
+    model = (info.get("model") or "").upper().replace(" ", "")
+    if model in CAMERA_SENSORS:
+        return CAMERA_SENSORS[model]
+    focal, focal_35mm = info.get("focal_length"), info.get("focal_length_35mm")
+    if focal and focal_35mm:
+        crop = focal_35mm / focal
+        return 36.0 / crop, 24.0 / crop
+    return None
+
+
+def offsets_to_latlon(lat: float, lon: float, north: np.ndarray, east: np.ndarray):
+    """Смещения в метрах (локальная касательная плоскость) в широту/долготу"""
+    lat_out = lat + np.degrees(north / EARTH_RADIUS_M)
+    lon_out = lon + np.degrees(east / (EARTH_RADIUS_M * np.cos(np.radians(lat))))
+    return lat_out, lon_out
+
+
+def project_points(points: np.ndarray, image_size: Tuple[int, int], info: dict):
+    """
+    Проекция точек кадра на землю
+
+    Args:
+        points: (N, 2) координаты пикселей (x, y)
+        image_size: (высота, ширина) кадра
+        info: Метаданные съемки (read_exif)
+
+    Returns:
+        (lat, lon, accuracy) - массивы (N,) или None, если метаданных не хватает.
+        Для лучей выше горизонта и слишком далеких точек - NaN.
+    """
+    height = info.get("relative_altitude")
+    sensor = sensor_size(info)
+    focal = info.get("focal_length")
+    yaw = info.get("gimbal_yaw")
+    if yaw is None:
+        yaw = info.get("flight_yaw")
+    if info.get("lat") is None or info.get("lon") is None or not height or height <= 0 \
+            or not sensor or not focal or yaw is None:
+        return None
+
+    h, w = image_size
+    # Кадр мог быть уменьшен относительно исходника - фокус в пикселях считаем от ширины кадра
+    fx = focal * w / sensor[0]
+
+    pitch = info.get("gimbal_pitch")
+    pitch = np.radians(-90.0 if pitch is None else pitch)
+    yaw = np.radians(yaw)
+
+    # Базис камеры в системе North-East-Down
+    forward = np.array([np.cos(pitch) * np.cos(yaw), np.cos(pitch) * np.sin(yaw), -np.sin(pitch)])
+    right = np.array([-np.sin(yaw), np.cos(yaw), 0.0])
+    down = np.cross(forward, right)
+
+    x = (points[:, 0] - w / 2.0) / fx
+    y = (points[:, 1] - h / 2.0) / fx
+    rays = x[:, None] * right + y[:, None] * down + forward
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(rays[:, 2] > 1e-6, height / rays[:, 2], np.nan)
+    north, east = t * rays[:, 0], t * rays[:, 1]
+    distance = t * np.linalg.norm(rays, axis=1)
+    distance[distance > MAX_RANGE_FACTOR * height] = np.nan
+
+    # Ошибка ориентации растет с дальностью; к ней добавляется ошибка GPS
+    horizontal = np.hypot(north, east)
+    angular = distance * np.radians(ATTITUDE_ACCURACY_DEG) * (distance / height)
+    accuracy = np.sqrt(GPS_ACCURACY_M ** 2 + angular ** 2)
+    accuracy[np.isnan(distance)] = np.nan
+    horizontal[np.isnan(distance)] = np.nan
+
+    lat, lon = offsets_to_latlon(info["lat"], info["lon"], north, east)
+    lat[np.isnan(horizontal)] = np.nan
+    lon[np.isnan(horizontal)] = np.nan
+    return lat, lon, accuracy
+
 
 class GeoReferencer:
     def get_coords(self, path):
-        with open(path, 'rb') as f:
-            tags = exifread.process_file(f)
-            try:
-                lat = self._convert(tags['GPS GPSLatitude'], tags['GPS GPSLatitudeRef'].printable)
-                lon = self._convert(tags['GPS GPSLongitude'], tags['GPS GPSLongitudeRef'].printable)
-                return lat, lon
-            except:
-                return None, None
-
-    def _convert(self, val, ref):
-        d = float(val.values[0].num) / val.values[0].den
-        m = float(val.values[1].num) / val.values[1].den
-        s = float(val.values[2].num) / val.values[2].den
-        res = d + (m/60) + (s/3600)
-        return res if ref in ['N', 'E'] else -res
\ No newline at end of file
+        """(lat, lon) снимка по заголовку EXIF или (None, None)"""
+        info = read_exif(path)
+        return info['lat'], info['lon']
+
+    def get_coords_batch(self, paths, workers=8):
+        """Координаты многих снимков: путь -> (lat, lon)"""
+        return {path: (info['lat'], info['lon']) for path, info in read_exif_batch(paths, workers).items()}
+
+    def georeference(self, detections: List[dict], info: dict, image_size: Tuple[int, int]) -> List[dict]:
+        """
+        Координаты каждого объекта по положению в кадре
+
+        Исходные словари не изменяются (они могут лежать в кэше результатов).
+
+        Args:
+            detections: Детекции с bbox [x1, y1, x2, y2] в пикселях кадра
+            info: Метаданные съемки (read_exif)
+            image_size: (высота, ширина) кадра или None, если размер неизвестен
+
+        Returns:
+            List[dict]: Копии детекций с полем coordinates (формат GPSCoordinates)
+                        или без него, если у снимка нет GPS
+        """
+        if not detections or info.get("lat") is None or info.get("lon") is None:
+            return detections
+
+        boxes = np.asarray([d["bbox"] for d in detections], dtype=np.float64).reshape(-1, 4)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2.0
+        projected = project_points(centers, image_size, info) if image_size else None
+
+        fallback = {
+            "latitude": info["lat"],
+            "longitude": info["lon"],
+            "altitude": info.get("altitude"),
+            "accuracy_meters": None,
+            "calculation_method": "photo_gps",
+        }
+        if projected is None:
+            return [{**d, "coordinates": dict(fallback)} for d in detections]
+
+        ground_altitude = None
+        if info.get("altitude") is not None:
+            ground_altitude = info["altitude"] - info["relative_altitude"]
+
+        lat, lon, accuracy = projected
+        result = []
+        for d, la, lo, acc in zip(detections, lat.tolist(), lon.tolist(), accuracy.tolist()):
+            if np.isnan(la):
+                coordinates = dict(fallback)
+            else:
+                coordinates = {
+                    "latitude": la,
+                    "longitude": lo,
+                    "altitude": ground_altitude,
+                    "accuracy_meters": round(acc, 2),
+                    "calculation_method": "camera_projection",
+                }
+            result.append({**d, "coordinates": coordinates})
+        return result
@@ -5,7 +5,7 @@
 import cv2
 import numpy as np
 from pathlib import Path
-from typing import Tuple, Optional, List, Union
+from typing import Iterator, Tuple, Optional, List, Union
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -242,6 +242,39 @@ class ImageProcessor:
         
         return result
     
+    def iter_video_frames(self, video_path: str, fps: float = 1) -> Iterator[Tuple[int, float, np.ndarray]]:
+        """
+        Потоковое чтение кадров видео с прореживанием
+
+        Пропускаемые кадры только захватываются (grab) без декодирования,
+        декодируется (retrieve) лишь каждый N-й. В памяти одновременно
+        находится один кадр, независимо от длины видео.
+
+        Args:
+            video_path: Путь к видео файлу
+            fps: Количество кадров в секунду для извлечения
+
+        Yields:
+            (номер кадра, время в секундах, кадр BGR)
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Не удалось открыть видео файл: {video_path}")
+
+        video_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        frame_interval = max(1, int(round(video_fps / fps))) if fps > 0 else 1
+
+        frame_index = 0
+        try:
+            while cap.grab():
+                if frame_index % frame_interval == 0:
+                    success, frame = cap.retrieve()
+                    if success:
+                        yield frame_index, frame_index / video_fps, frame
+                frame_index += 1
+        finally:
+            cap.release()
+
     def extract_frames_from_video(self, video_path: str, fps: int = 1) -> List[np.ndarray]:
         """
         Извлечение кадров из видео с оптимизацией для CPU
@@ -253,43 +286,15 @@ class ImageProcessor:
         Returns:
             List[np.ndarray]: Список извлеченных кадров
         """
-        frames = []
-        
-        # Открытие видео файла
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise ValueError(f"Не удалось открыть видео файл: {video_path}")
-        
-        # Получение FPS видео
-        video_fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_interval = int(video_fps / fps) if fps > 0 else 1
-        
-        frame_count = 0
-        success = True
-        
         print(f"🎥 Извлечение кадров из видео (целевой FPS: {fps})...")
-        
-        while success:
-            success, frame = cap.read()
-            
-            if not success:
-                break
-            
-            # Извлекаем каждый N-й кадр
-            if frame_count % frame_interval == 0:
-                # Конвертация BGR -> RGB
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # Оптимизация размера
-                frame_optimized = self.auto_resize(frame_rgb)
-                
-                frames.append(frame_optimized)
-            
-            frame_count += 1
-        
-        cap.release()
-        
-        print(f"✅ Извлечено {len(frames)} кадров из {frame_count} всего")
+
+        # Конвертация BGR -> RGB и оптимизация размера только для выбранных кадров
+        frames = [
+            self.auto_resize(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            for _, _, frame in self.iter_video_frames(video_path, fps)
+        ]
+
+        print(f"✅ Извлечено {len(frames)} кадров")
         return frames
     
     def save_image(self, image: np.ndarray, output_path: Union[str, Path], 
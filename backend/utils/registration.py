@@ -0,0 +1,160 @@
+"""
+Совмещение снимков ДО / ПОСЛЕ перед поиском изменений
+
+Ключевые точки (ORB или AKAZE) ищутся на уменьшенной копии, пары
+отбираются тестом отношения Лоу, гомография считается RANSAC, и второй
+снимок перспективно переносится в координаты первого. Точки и
+дескрипторы каждого снимка кэшируются по хэшу содержимого: опорный
+снимок, который сравнивают с многими последующими пролетами,
+обрабатывается один раз.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# Тест отношения расстояний до двух ближайших дескрипторов
+RATIO_TEST = 0.75
+# Минимум пар, согласных с гомографией
+MIN_INLIERS = 15
+# Допустимое изменение площади кадра после переноса (масштаб съемки)
+MAX_AREA_CHANGE = 4.0
+# Порог перепроецирования RANSAC в пикселях уменьшенной копии
+RANSAC_THRESHOLD = 3.0
+# Сколько пикселей срезать с края области перекрытия (артефакты интерполяции)
+BORDER_PX = 3
+
+
+def content_key(data) -> str:
+    """sha256 байтов файла или содержимого массива"""
+    if isinstance(data, np.ndarray):
+        data = np.ascontiguousarray(data).data
+    return hashlib.sha256(data).hexdigest()
+
+
+class ImageRegistrar:
+    """Гомография между снимками с LRU-кэшем ключевых точек"""
+
+    def __init__(self, method: str = "orb", max_features: int = 5000,
+                 analysis_side: int = 2048, cache_size: int = 64):
+        """
+        Args:
+            method: orb / akaze
+            max_features: Максимум ключевых точек на снимок (для ORB)
+            analysis_side: Длинная сторона копии для поиска точек
+            cache_size: Снимков в кэше точек и дескрипторов
+        """
+        if method not in ("orb", "akaze"):
+            raise ValueError(f"Неизвестный детектор ключевых точек: {method}")
+        self.method = method
+        self.max_features = max_features
+        self.analysis_side = analysis_side
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _detector(self):
+        # Детекторы OpenCV не потокобезопасны - создаем свой на каждый вызов
+        if self.method == "akaze":
+            return cv2.AKAZE_create()
+        return cv2.ORB_create(nfeatures=self.max_features)
+
+    def features(self, gray: np.ndarray, key: Optional[str] = None):
+        """
+        Ключевые точки снимка (с кэшем)
+
+        Args:
+            gray: Полутоновый кадр
+            key: Хэш содержимого (content_key); None - считается по массиву
+
+        Returns:
+            (точки (N, 2) float32 в пикселях полного кадра, дескрипторы или None)
+        """
+        key = (content_key(gray) if key is None else key, gray.shape)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        h, w = gray.shape[:2]
+        scale = min(1.0, self.analysis_side / float(max(h, w)))
+        small = gray if scale == 1.0 else cv2.resize(
+            gray, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))), interpolation=cv2.INTER_AREA)
+        keypoints, descriptors = self._detector().detectAndCompute(small, None)
+        points = np.float32([kp.pt for kp in keypoints]).reshape(-1, 2) / scale
+        value = (points, descriptors)
+
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def homography(self, gray1: np.ndarray, gray2: np.ndarray,
+                   key1: Optional[str] = None, key2: Optional[str] = None):
+        """
+        Гомография, переносящая второй снимок в координаты первого
+
+        Returns:
+            (матрица 3x3, число inliers) или None, если совместить не удалось
+        """
+        points1, desc1 = self.features(gray1, key1)
+        points2, desc2 = self.features(gray2, key2)
+        if desc1 is None or desc2 is None or len(desc1) < MIN_INLIERS or len(desc2) < MIN_INLIERS:
+            return None
+
+        matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+        pairs = matcher.knnMatch(desc2, desc1, k=2)
+        good = [p[0] for p in pairs if len(p) == 2 and p[0].distance < RATIO_TEST * p[1].distance]
+        if len(good) < MIN_INLIERS:
+            return None
+
+        src = points2[[m.queryIdx for m in good]]
+        dst = points1[[m.trainIdx for m in good]]
+        h1, w1 = gray1.shape[:2]
+        threshold = RANSAC_THRESHOLD * max(1.0, max(h1, w1) / float(self.analysis_side))
+        matrix, inliers = cv2.findHomography(src, dst, cv2.RANSAC, threshold)
+        if matrix is None or int(inliers.sum()) < MIN_INLIERS:
+            return None
+
+        # Отбрасываем вырожденные решения: углы второго кадра должны
+        # остаться выпуклым четырехугольником сопоставимой площади
+        h2, w2 = gray2.shape[:2]
+        corners = np.float32([[0, 0], [w2, 0], [w2, h2], [0, h2]]).reshape(-1, 1, 2)
+        projected = cv2.perspectiveTransform(corners, matrix)
+        area = cv2.contourArea(projected) / float(w1 * h1)
+        if not cv2.isContourConvex(projected) or not 1.0 / MAX_AREA_CHANGE <= area <= MAX_AREA_CHANGE:
+            return None
+        return matrix, int(inliers.sum())
+
+    def align(self, img1: np.ndarray, img2: np.ndarray,
+              key1: Optional[str] = None, key2: Optional[str] = None):
+        """
+        Перенос img2 в координаты img1
+
+        Пиксели вне области перекрытия берутся из img1, чтобы они не
+        давали ложных изменений.
+
+        Returns:
+            (перенесенный img2, маска перекрытия uint8, число inliers) или None
+        """
+        gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY) if img1.ndim == 3 else img1
+        gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY) if img2.ndim == 3 else img2
+        found = self.homography(gray1, gray2, key1, key2)
+        if found is None:
+            return None
+        matrix, inliers = found
+
+        h1, w1 = gray1.shape[:2]
+        warped = cv2.warpPerspective(img2, matrix, (w1, h1), flags=cv2.INTER_LINEAR)
+        valid = cv2.warpPerspective(np.full(gray2.shape[:2], 255, np.uint8), matrix, (w1, h1),
+                                    flags=cv2.INTER_NEAREST)
+        valid = cv2.erode(valid, cv2.getStructuringElement(cv2.MORPH_RECT, (2 * BORDER_PX + 1,) * 2))
+        outside = valid == 0
+        if img1.ndim == warped.ndim:
+            warped[outside] = img1[outside]
+        return warped, valid, inliers
@@ -11,23 +11,34 @@ st.title("📤 Загрузка и анализ снимков")
 
 files = st.file_uploader("Выберите снимки с БПЛА (поддерживаются JPG, PNG)", accept_multiple_files=True)
 
+# Сколько файлов отправлять в одном запросе к пакетному эндпоинту
+UPLOAD_CHUNK = 50
+
 if st.button("🚀 Обработать все") and files:
-    for f in files:
-        with st.spinner(f"Обработка {f.name}..."):
+    progress = st.progress(0.0)
+    for start in range(0, len(files), UPLOAD_CHUNK):
+        chunk = files[start:start + UPLOAD_CHUNK]
+        with st.spinner(f"Обработка файлов {start + 1}-{start + len(chunk)} из {len(files)}..."):
             try:
-                # Отправляем файл на бэкенд
+                # Один запрос на пачку файлов вместо запроса на каждый файл
                 res = requests.post(
-                    f"{API_URL}/api/v1/detect", 
-                    files={"file": (f.name, f.getvalue(), f.type)}
+                    f"{API_URL}/api/v1/detect/batch", 
+                    files=[("files", (f.name, f.getvalue(), f.type)) for f in chunk]
                 )
                 
                 if res.status_code == 200:
                     data = res.json()
-                    st.success(f"✅ Файл {f.name} успешно обработан.")
-                    with st.expander(f"Результаты для {f.name}"):
-                        st.write(f"Найдено объектов: {len(data.get('detections', []))}")
-                        st.json(data)
+                    for item in data.get("results", []):
+                        name = item.get("filename")
+                        if item.get("status") == "success":
+                            st.success(f"✅ Файл {name} успешно обработан.")
+                            with st.expander(f"Результаты для {name}"):
+                                st.write(f"Найдено объектов: {item.get('detections_count', 0)}")
+                                st.json(item)
+                        else:
+                            st.error(f"❌ Ошибка при обработке {name}: {item.get('message')}")
                 else:
-                    st.error(f"❌ Ошибка при обработке {f.name}: Код {res.status_code}")
+                    st.error(f"❌ Ошибка при обработке пачки: Код {res.status_code}")
             except Exception as e:
-                st.error(f"📡 Ошибка соединения с API: {e}")
\ No newline at end of file
+                st.error(f"📡 Ошибка соединения с API: {e}")
+        progress.progress(min(1.0, (start + len(chunk)) / len(files)))
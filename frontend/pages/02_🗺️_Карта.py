@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import pandas as pd
+import pydeck as pdk
 import os
 
 st.set_page_config(page_title="Карта объектов - Argus Eye", layout="wide")
@@ -10,24 +11,88 @@ API_URL = os.environ.get("API_URL", "https://argus-eye-optimized.onrender.com")
 
 st.title("📍 Геолокация обнаруженных объектов")
 
+# Фильтры применяются на сервере (пространственный индекс), приходят только нужные точки
+with st.sidebar:
+    st.header("Фильтры")
+    mode = st.radio("Отображение", ["Кластеры объектов", "Снимки"])
+    use_bbox = st.checkbox("Ограничить область", value=False)
+    params = {}
+    if use_bbox:
+        col1, col2 = st.columns(2)
+        params["min_lat"] = col1.number_input("Мин. широта", value=-90.0, min_value=-90.0, max_value=90.0)
+        params["max_lat"] = col2.number_input("Макс. широта", value=90.0, min_value=-90.0, max_value=90.0)
+        params["min_lon"] = col1.number_input("Мин. долгота", value=-180.0, min_value=-180.0, max_value=180.0)
+        params["max_lon"] = col2.number_input("Макс. долгота", value=180.0, min_value=-180.0, max_value=180.0)
+    period = st.date_input("Период", value=())
+    if len(period) == 2:
+        params["start"] = f"{period[0]}T00:00:00"
+        params["end"] = f"{period[1]}T23:59:59"
+    classes = st.text_input("Классы объектов (через запятую)", "")
+    class_list = [c.strip() for c in classes.split(",") if c.strip()]
+    if class_list:
+        params["classes"] = class_list
+    if mode == "Кластеры объектов":
+        auto_zoom = st.checkbox("Масштаб автоматически", value=True)
+        if not auto_zoom:
+            params["zoom"] = st.slider("Уровень масштаба", 0, 18, 10)
+
+
+def show_clusters(params):
+    """Кластеры считаются на сервере - приходят несколько КБ на окно"""
+    # Окно по умолчанию - весь мир (в пределах проекции Web Mercator)
+    query = {"min_lat": -85.0, "max_lat": 85.0, "min_lon": -180.0, "max_lon": 180.0, **params}
+    res = requests.get(f"{API_URL}/api/v1/geo/clusters", params=query, timeout=10)
+    if res.status_code != 200:
+        st.error(f"Сервер вернул ошибку: {res.status_code} {res.text}")
+        return
+    data = res.json()
+    clusters = data.get("clusters", [])
+    if not clusters:
+        st.info("🔎 В выбранной области нет объектов с координатами.")
+        return
+
+    df = pd.DataFrame([{
+        "lat": c["lat"],
+        "lon": c["lon"],
+        "count": c["count"],
+        "classes": ", ".join(f"{k}: {v}" for k, v in sorted(c["classes"].items(), key=lambda kv: -kv[1])),
+    } for c in clusters])
+    df["radius"] = df["count"] ** 0.5
+
+    layer = pdk.Layer(
+        "ScatterplotLayer", df,
+        get_position="[lon, lat]", get_radius="radius",
+        radius_units="pixels", radius_scale=4, radius_min_pixels=3, radius_max_pixels=60,
+        get_fill_color=[230, 60, 40, 160], pickable=True,
+    )
+    view = pdk.ViewState(latitude=float(df["lat"].mean()), longitude=float(df["lon"].mean()),
+                         zoom=max(data.get("zoom", 2) - 1, 0))
+    st.pydeck_chart(pdk.Deck(layers=[layer], initial_view_state=view,
+                             tooltip={"text": "Объектов: {count}\n{classes}"}))
+    st.caption(f"Уровень {data.get('zoom')}: {len(clusters)} кластеров, {data.get('total')} объектов")
+
+
+if mode == "Кластеры объектов":
+    try:
+        show_clusters(params)
+    except Exception as e:
+        st.error(f"Не удалось подключиться к API: {e}")
+    st.stop()
+
 try:
-    res = requests.get(f"{API_URL}/api/v1/tasks", timeout=5)
+    res = requests.get(f"{API_URL}/api/v1/geo/points", params=params, timeout=10)
     if res.status_code == 200:
-        tasks = res.json()
-        
+        points = res.json().get("points", [])
+
         map_data = []
-        for t in tasks:
-            # Проверяем корректность координат
-            lat = t.get('lat')
-            lon = t.get('lon')
-            if lat is not None and lon is not None:
-                map_data.append({
-                    'latitude': float(lat),
-                    'longitude': float(lon),
-                    'Task ID': t.get('task_id', 'N/A')[:8],
-                    'Objects': t.get('detections_count', 0),
-                    'Time': t.get('timestamp', '')
-                })
+        for t in points:
+            map_data.append({
+                'latitude': float(t['lat']),
+                'longitude': float(t['lon']),
+                'Task ID': t.get('task_id', 'N/A')[:8],
+                'Objects': t.get('detections_count', 0),
+                'Time': t.get('timestamp', '')
+            })
         
         if map_data:
             df = pd.DataFrame(map_data)
@@ -16,8 +16,10 @@ with col2:
     img2 = st.file_uploader("Снимок ПОСЛЕ", type=['jpg', 'jpeg', 'png'], key="u2")
 
 st.sidebar.header("Настройки алгоритма")
-method = st.sidebar.selectbox("Метод анализа", ["absdiff", "opticalflow"])
-sensitivity = st.sidebar.slider("Чувствительность", 1, 100, 30)
+method = st.sidebar.selectbox("Метод анализа", ["absdiff", "ssim", "opticalflow"])
+sensitivity = st.sidebar.slider("Чувствительность (для opticalflow - смещение в пикселях)", 1, 100, 30)
+min_area = st.sidebar.number_input("Минимальная площадь области, px", min_value=1, value=200)
+register = st.sidebar.checkbox("Совмещать снимки по ключевым точкам", value=True)
 
 if img1 and img2:
     if st.button("🚀 Начать сравнение"):
@@ -27,7 +29,8 @@ if img1 and img2:
                     "file1": (img1.name, img1.getvalue(), img1.type),
                     "file2": (img2.name, img2.getvalue(), img2.type)
                 }
-                data = {"method": method, "threshold": str(sensitivity)}
+                data = {"method": method, "threshold": str(sensitivity), "min_area": str(int(min_area)),
+                        "register": str(register).lower()}
                 
                 # Запрос к эндпоинту сравнения
                 res = requests.post(f"{API_URL}/api/v1/compare", files=files, data=data)
@@ -36,8 +39,14 @@ if img1 and img2:
                     result = res.json()
                     if result.get("status") == "success":
                         metrics = result.get("result", {})
-                        st.success(f"Анализ завершен! Найдено изменений: {metrics.get('changes', 0)}")
-                        st.json(metrics)
+                        st.success(f"Анализ завершен! Найдено изменений: {metrics.get('change_count', 0)}")
+                        if register and metrics.get("registration") == "resize":
+                            st.warning("Снимки не удалось совместить - второй кадр только масштабирован")
+                        if metrics.get("similarity_score") is not None:
+                            st.metric("Сходство (SSIM)", f"{metrics['similarity_score']:.3f}")
+                        if metrics.get("changes"):
+                            st.subheader("Области изменений")
+                            st.dataframe(metrics["changes"], use_container_width=True)
                     else:
                         st.error(f"Ошибка алгоритма: {result.get('message')}")
                 else:
@@ -48,10 +48,29 @@ if menu == "Загрузка":
 
 elif menu == "История":
     st.header("📜 История задач")
+    # Стек курсоров: последний - начало текущей страницы (None - первая)
+    if "history_cursors" not in st.session_state:
+        st.session_state.history_cursors = [None]
+    cursors = st.session_state.history_cursors
     if is_online:
+        page = None
         try:
-            res = requests.get(f"{API_URL}/api/v1/tasks")
+            params = {"limit": 50, "fields": "task_id,timestamp,detections_count,processing_time,lat,lon"}
+            if cursors[-1]:
+                params["cursor"] = cursors[-1]
+            res = requests.get(f"{API_URL}/api/v1/tasks", params=params, timeout=10)
             if res.status_code == 200:
-                st.table(res.json())
+                page = res.json()
         except:
-            st.error("Ошибка загрузки данных")
\ No newline at end of file
+            st.error("Ошибка загрузки данных")
+
+        if page is not None:
+            st.dataframe(page["items"], use_container_width=True)
+            # Переход вне try: experimental_rerun работает через исключение
+            col1, col2 = st.columns(2)
+            if col1.button("← Новее", disabled=len(cursors) == 1):
+                cursors.pop()
+                st.experimental_rerun()
+            if col2.button("Старше →", disabled=not page.get("next_cursor")):
+                cursors.append(page["next_cursor"])
+                st.experimental_rerun()
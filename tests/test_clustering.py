@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from backend.services.clustering import ClusterIndex, auto_zoom, tile_count, tiles_for_bbox
+
+WORLD = (-85.0, -180.0, 85.0, 180.0)
+
+
+def _index(points=((), (), ())):
+    calls = []
+
+    def load_points(bbox, start, end, classes, min_confidence):
+        calls.append(bbox)
+        # Как Database.object_positions: точки внутри запрошенного прямоугольника
+        min_lat, min_lon, max_lat, max_lon = bbox
+        inside = [i for i, (la, lo) in enumerate(zip(points[0], points[1]))
+                  if min_lat <= la <= max_lat and min_lon <= lo <= max_lon]
+        return tuple([column[i] for i in inside] for column in points)
+
+    return ClusterIndex(load_points, max_tiles=64), calls
+
+
+def test_tile_count_matches_tile_list():
+    for bbox, zoom in ((WORLD, 3), ((55.0, 37.0, 56.0, 38.5), 9), ((-1.0, -1.0, 1.0, 1.0), 12)):
+        assert tile_count(bbox, zoom) == len(tiles_for_bbox(bbox, zoom))
+
+
+def test_world_viewport_picks_zoom_without_enumerating_tiles():
+    started = time.perf_counter()
+    zoom = auto_zoom(WORLD, 64)
+    assert time.perf_counter() - started < 0.1
+    assert zoom == 3
+    assert tile_count(WORLD, zoom) == 64
+
+    index, calls = _index()
+    result = index.clusters(WORLD)
+    assert result['zoom'] == 3 and result['tiles'] == 64 and len(calls) == 64
+
+
+def test_wide_viewport_at_high_zoom_is_rejected_before_loading():
+    index, calls = _index()
+    started = time.perf_counter()
+    with pytest.raises(ValueError, match='тайлов'):
+        index.clusters((40.0, 20.0, 50.0, 35.0), zoom=18)
+    with pytest.raises(ValueError):
+        index.clusters(WORLD, zoom=18)
+    assert time.perf_counter() - started < 0.1
+    assert calls == []
+
+
+def test_new_points_invalidate_only_their_tiles():
+    points = ([55.75, -33.9], [37.61, 18.42], ['car', 'person'])
+    index, calls = _index(points)
+    first = index.clusters(WORLD)
+    assert first['total'] == 2
+    loaded = len(calls)
+
+    index.clusters(WORLD)
+    assert len(calls) == loaded
+
+    points[0].append(55.76)
+    points[1].append(37.62)
+    points[2].append('car')
+    index.invalidate([55.76], [37.62])
+    second = index.clusters(WORLD)
+    assert second['total'] == 3
+    assert len(calls) == loaded + 1
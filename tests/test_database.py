@@ -0,0 +1,101 @@
+import sqlite3
+
+from backend.utils.database import Database
+
+
+def _task(task_id, detections, lat=55.75, lon=37.61):
+    return {
+        'task_id': task_id,
+        'image_path': f'{task_id}.jpg',
+        'detections_count': len(detections),
+        'detections': detections,
+        'processing_time': 0.1,
+        'lat': lat,
+        'lon': lon,
+    }
+
+
+def test_query_points_filters_by_detector_class(tmp_path):
+    db = Database(tmp_path / 'argus_eye.db')
+    # Формат детекций как у OptimizedDetector: class / conf / bbox
+    db.save_detection_task(_task('with-car', [
+        {'class': 'car', 'conf': 0.91, 'bbox': [10, 10, 50, 40]},
+        {'class': 'car', 'conf': 0.77, 'bbox': [60, 10, 90, 40]},
+        {'class': 'person', 'conf': 0.64, 'bbox': [5, 5, 15, 30]},
+    ]))
+    db.save_detection_task(_task('people-only', [
+        {'class': 'person', 'conf': 0.88, 'bbox': [1, 1, 8, 20]},
+    ]))
+
+    points = db.query_points(bbox=(55.7, 37.5, 55.8, 37.7), classes=['car'])
+
+    assert [p['task_id'] for p in points] == ['with-car']
+    assert points[0]['class_counts'] == {'car': 2}
+    assert {p['task_id'] for p in db.query_points(classes=['person'])} == {'with-car', 'people-only'}
+
+
+def _cached_keys(db):
+    return [row[0] for row in db._read().execute('SELECT key FROM result_cache ORDER BY rowid')]
+
+
+def test_result_cache_keeps_newest_rows(tmp_path):
+    db = Database(tmp_path / 'argus_eye.db', cache_max_rows=3)
+    for i in range(5):
+        db.save_cached_result(f'key-{i}', [{'class': 'car', 'conf': 0.9, 'bbox': [0, 0, 1, 1]}], 0.1)
+    # Повторная запись ключа делает его самым свежим
+    db.save_cached_result('key-1', [], 0.1)
+
+    assert db.prune_result_cache() == 2
+    assert _cached_keys(db) == ['key-3', 'key-4', 'key-1']
+    assert db.get_cached_result('key-0') is None
+
+
+def test_result_cache_drops_expired_rows(tmp_path):
+    db = Database(tmp_path / 'argus_eye.db', cache_ttl_days=7)
+    db.save_cached_result('old', [], 0.1)
+    db.save_cached_result('fresh', [], 0.1)
+    with db._connect() as conn:
+        conn.execute("UPDATE result_cache SET created_at = datetime('now', '-8 days') WHERE key = 'old'")
+
+    assert db.prune_result_cache() == 1
+    assert _cached_keys(db) == ['fresh']
+
+
+def test_points_listener_gets_only_new_object_positions(tmp_path):
+    db = Database(tmp_path / 'argus_eye.db')
+    received = []
+    db.add_points_listener(lambda lats, lons: received.append((lats, lons)))
+
+    db.save_cached_result('key', [], 0.1)
+    db.save_video_frames('video', [{'frame_index': 0, 'frame_time': 0.0, 'detections': []}])
+    db.save_detection_task(_task('no-gps', [{'class': 'car', 'conf': 0.9, 'bbox': [0, 0, 5, 5]}], lat=None, lon=None))
+    assert received == []
+
+    db.save_detection_task(_task('with-car', [{'class': 'car', 'conf': 0.9, 'bbox': [0, 0, 5, 5]}]))
+    assert received == [([55.75], [37.61])]
+
+
+def test_video_frame_totals_stay_out_of_detection_statistics(tmp_path):
+    path = tmp_path / 'argus_eye.db'
+    db = Database(path)
+    db.save_detection_task(_task('photo', [
+        {'class': 'car', 'conf': 0.8, 'bbox': [0, 0, 5, 5]},
+        {'class': 'person', 'conf': 0.6, 'bbox': [5, 5, 9, 9]},
+    ]))
+    # Итог видео: боксы, просуммированные по кадрам, объектов нет
+    video = _task('video', [], lat=None, lon=None)
+    video['detections_count'] = 120
+    db.save_detection_task(video)
+
+    def check(stats):
+        assert stats['total_tasks'] == 2
+        assert stats['total_detections'] == 2
+        assert sum(row['count'] for row in stats['class_statistics']) == 2
+        assert sum(row['detections'] for row in stats['daily_statistics']) == 2
+
+    check(db.get_statistics())
+
+    # Пересчет сводных таблиц по истории при первом запуске дает то же
+    with sqlite3.connect(path) as conn:
+        conn.executescript('DELETE FROM stats_totals; DELETE FROM stats_classes; DELETE FROM stats_daily;')
+    check(Database(path).get_statistics())
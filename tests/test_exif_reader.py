@@ -0,0 +1,183 @@
+import struct
+
+import pytest
+
+from backend.utils import exif_reader
+from backend.utils.exif_reader import read_exif, read_image_size
+
+
+def _rational(*values):
+    return [(round(v * 1000), 1000) for v in values], 5
+
+
+def _entry(endian, tag, value):
+    """(тег, тип, число значений, байты значения)"""
+    if isinstance(value, str):
+        raw = value.encode('ascii') + b'\x00'
+        return tag, 2, len(raw), raw
+    if isinstance(value, tuple):
+        pairs, type_ = value
+        raw = b''.join(struct.pack(endian + 'II', *p) for p in pairs)
+        return tag, type_, len(pairs), raw
+    if isinstance(value, bytes):
+        return tag, 1, len(value), value
+    return tag, 3, 1, struct.pack(endian + 'H', value)
+
+
+def _ifd_size(entries):
+    return 2 + 12 * len(entries) + 4 + sum(len(e[3]) for e in entries if len(e[3]) > 4)
+
+
+def _ifd(endian, entries, offset):
+    body = struct.pack(endian + 'H', len(entries))
+    data, data_offset = b'', offset + 2 + 12 * len(entries) + 4
+    for tag, type_, count, raw in entries:
+        if len(raw) <= 4:
+            body += struct.pack(endian + 'HHI', tag, type_, count) + raw.ljust(4, b'\x00')
+        else:
+            body += struct.pack(endian + 'HHII', tag, type_, count, data_offset + len(data))
+            data += raw
+    return body + b'\x00' * 4 + data
+
+
+def _tiff(ifd0, exif=None, gps=None, endian='<'):
+    """TIFF-структура EXIF: IFD0, за ним Exif IFD и GPS IFD"""
+    ifd0 = [_entry(endian, tag, value) for tag, value in ifd0.items()]
+    exif = [_entry(endian, tag, value) for tag, value in (exif or {}).items()]
+    gps = [_entry(endian, tag, value) for tag, value in (gps or {}).items()]
+    pointers = [tag for tag, items in ((0x8769, exif), (0x8825, gps)) if items]
+    size0 = _ifd_size(ifd0) + 12 * len(pointers)
+
+    offset, offsets = 8 + size0, {}
+    for tag, items in ((0x8769, exif), (0x8825, gps)):
+        if items:
+            offsets[tag] = offset
+            offset += _ifd_size(items)
+    ifd0 += [(tag, 4, 1, struct.pack(endian + 'I', offsets[tag])) for tag in pointers]
+    ifd0.sort()
+
+    marker = b'II*\x00' if endian == '<' else b'MM\x00*'
+    out = marker + struct.pack(endian + 'I', 8) + _ifd(endian, ifd0, 8)
+    for tag, items in ((0x8769, exif), (0x8825, gps)):
+        if items:
+            out += _ifd(endian, sorted(items), offsets[tag])
+    return out
+
+
+def _segment(marker, payload):
+    return bytes([0xFF, marker]) + struct.pack('>H', len(payload) + 2) + payload
+
+
+def _sof(height, width):
+    return _segment(0xC0, struct.pack('>BHHB', 8, height, width, 3) + b'\x01\x22\x00' * 3)
+
+
+def _jpeg(*segments, height=3000, width=4000):
+    return b'\xFF\xD8' + b''.join(segments) + _sof(height, width) + _segment(0xDA, b'\x00' * 10) + b'\xFF\xD9'
+
+
+def _exif(tiff):
+    return _segment(0xE1, exif_reader.EXIF_MARKER + tiff)
+
+
+def _xmp(packet):
+    return _segment(0xE1, exif_reader.XMP_MARKER + packet.encode('utf-8'))
+
+
+GPS = {
+    0x01: 'S', 0x02: _rational(33, 51, 54.0),
+    0x03: 'W', 0x04: _rational(70, 30, 36.0),
+    0x05: b'\x01', 0x06: _rational(12.5),
+}
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_gps_rationals_and_hemisphere_refs(endian):
+    tiff = _tiff({0x010F: 'DJI', 0x0110: 'FC6310', 0x0112: 6},
+                 exif={0x920A: _rational(8.8), 0xA405: 24}, gps=GPS, endian=endian)
+    info = read_exif(_jpeg(_exif(tiff)))
+
+    assert info['lat'] == pytest.approx(-(33 + 51 / 60 + 54 / 3600))
+    assert info['lon'] == pytest.approx(-(70 + 30 / 60 + 36 / 3600))
+    # alt_ref = 1: высота ниже уровня моря
+    assert info['altitude'] == pytest.approx(-12.5)
+    assert info['make'] == 'DJI' and info['model'] == 'FC6310'
+    assert info['orientation'] == 6
+    assert info['focal_length'] == pytest.approx(8.8)
+    assert info['focal_length_35mm'] == 24
+
+
+def test_north_east_refs_and_zero_fix():
+    gps = {**GPS, 0x01: 'N', 0x03: 'E', 0x05: b'\x00'}
+    info = read_exif(_jpeg(_exif(_tiff({}, gps=gps))))
+    assert info['lat'] > 0 and info['lon'] > 0 and info['altitude'] == pytest.approx(12.5)
+
+    # Нулевые координаты - нет фикса GPS
+    zero = {0x01: 'N', 0x02: _rational(0, 0, 0), 0x03: 'E', 0x04: _rational(0, 0, 0)}
+    info = read_exif(_jpeg(_exif(_tiff({}, gps=zero))))
+    assert info['lat'] is None and info['lon'] is None
+
+
+def test_xmp_gimbal_and_relative_altitude():
+    packet = (
+        '<x:xmpmeta><rdf:Description drone-dji:GimbalPitchDegree="-45.50" '
+        'drone-dji:GimbalYawDegree="+120.3" drone-dji:GimbalRollDegree="0.00" '
+        'drone-dji:FlightYawDegree="-60.1" drone-dji:AbsoluteAltitude="+310.25">'
+        '<drone-dji:RelativeAltitude>+98.70</drone-dji:RelativeAltitude>'
+        '</rdf:Description></x:xmpmeta>'
+    )
+    tiff = _tiff({}, gps=GPS)
+    info = read_exif(_jpeg(_exif(tiff), _xmp(packet)))
+
+    assert info['gimbal_pitch'] == pytest.approx(-45.5)
+    assert info['gimbal_yaw'] == pytest.approx(120.3)
+    assert info['gimbal_roll'] == 0.0
+    assert info['flight_yaw'] == pytest.approx(-60.1)
+    assert info['relative_altitude'] == pytest.approx(98.7)
+    # Абсолютная высота из XMP точнее GPSAltitude
+    assert info['altitude'] == pytest.approx(310.25)
+
+
+def test_sof_dimensions_and_orientation():
+    data = _jpeg(_exif(_tiff({0x0112: 1})), height=3000, width=4000)
+    assert read_image_size(data) == (3000, 4000)
+    # Поворот на 90 градусов меняет стороны местами
+    assert read_image_size(data, orientation=6) == (4000, 3000)
+
+    png = exif_reader.PNG_SIGNATURE + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', 640, 480) + b'\x08\x02\x00\x00\x00'
+    assert read_image_size(png) == (480, 640)
+
+
+def test_metadata_behind_large_segment_is_read_from_file(tmp_path):
+    # APP1 дальше первого блока чтения: заголовок дочитывается по требованию
+    padding = _segment(0xE2, b'\x00' * (exif_reader.HEADER_BYTES + 100))
+    path = tmp_path / 'photo.jpg'
+    path.write_bytes(_jpeg(padding, _exif(_tiff({}, gps=GPS)), height=1080, width=1920))
+
+    assert read_exif(path)['lat'] == pytest.approx(-(33 + 51 / 60 + 54 / 3600))
+    assert read_image_size(path) == (1080, 1920)
+
+
+def test_truncated_and_missing_segments(tmp_path):
+    data = _jpeg(_exif(_tiff({0x010F: 'DJI'}, gps=GPS)))
+    empty = read_exif(b'')
+    assert set(empty.values()) == {None}
+
+    # Без APP1 и без SOF
+    assert read_exif(_jpeg())['lat'] is None
+    assert read_image_size(b'\xFF\xD8' + _segment(0xDA, b'\x00' * 4)) is None
+
+    # Обрезанный файл: ни исключений, ни мусора в полях
+    for cut in (3, 10, 40, len(data) // 2):
+        info = read_exif(data[:cut])
+        assert info['lat'] is None and info['lon'] is None
+        assert read_image_size(data[:cut]) is None
+
+    # Смещение IFD за пределами сегмента
+    broken = _exif(b'II*\x00' + struct.pack('<I', 10 ** 6))
+    assert read_exif(_jpeg(broken))['make'] is None
+
+    # Не изображение и несуществующий файл
+    assert read_image_size(b'GIF89a' + b'\x00' * 20) is None
+    assert read_exif(tmp_path / 'missing.jpg') == empty
+    assert read_image_size(tmp_path / 'missing.jpg') is None
@@ -0,0 +1,110 @@
+import csv
+import gzip
+import io
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+
+pytest.importorskip('pydantic')
+
+from backend.api.schemas import ExportFormat
+from backend.services.export_service import CSV_COLUMNS, ExportService, rows_from_detections
+
+KML_NS = {'kml': 'http://www.opengis.net/kml/2.2'}
+
+
+def _row(task_id, class_name, lat=55.75, lon=37.61, alt=None, **extra):
+    row = {
+        'task_id': task_id, 'image_path': f'{task_id}.jpg', 'timestamp': '2026-05-01 12:30:00',
+        'class_name': class_name, 'confidence': 0.875,
+        'x1': 1.0, 'y1': 2.0, 'x2': 30.5, 'y2': 40.0,
+        'lat': lat, 'lon': lon, 'alt': alt, 'geo_accuracy': 4.5, 'geo_method': 'camera_projection',
+    }
+    row.update(extra)
+    return row
+
+
+# Два куска, как у Database.iter_objects; пустой кусок и строка без координат
+CHUNKS = [
+    [_row('t1', 'car', alt=150.0), _row('t1', 'Грузовик', lat=None, lon=None)],
+    [],
+    [_row('t2', '<person & "dog">', lat=-33.9, lon=151.2, image_path='a&b <1>.jpg')],
+]
+
+
+def _export(fmt, chunks=CHUNKS):
+    parts = list(ExportService().stream(chunks, fmt))
+    assert all(isinstance(part, str) for part in parts)
+    return ''.join(parts)
+
+
+def test_csv_round_trip():
+    text = _export(ExportFormat.CSV)
+    rows = list(csv.DictReader(io.StringIO(text)))
+
+    assert tuple(rows[0]) == CSV_COLUMNS
+    # В CSV попадают и объекты без координат
+    assert [r['class_name'] for r in rows] == ['car', 'Грузовик', '<person & "dog">']
+    assert rows[0]['confidence'] == '0.875' and rows[0]['alt'] == '150.0'
+    assert rows[1]['lat'] == '' and rows[2]['image_path'] == 'a&b <1>.jpg'
+
+
+def test_json_round_trip():
+    assert json.loads(_export(ExportFormat.JSON)) == [row for rows in CHUNKS for row in rows]
+    assert json.loads(_export(ExportFormat.JSON, [[], []])) == []
+
+
+def test_geojson_round_trip():
+    collection = json.loads(_export(ExportFormat.GEOJSON))
+
+    assert collection['type'] == 'FeatureCollection'
+    features = collection['features']
+    # Объект без координат пропускается
+    assert len(features) == 2
+    assert features[0]['geometry'] == {'type': 'Point', 'coordinates': [37.61, 55.75, 150.0]}
+    assert features[1]['geometry']['coordinates'] == [151.2, -33.9]
+    properties = features[1]['properties']
+    assert properties['class_name'] == '<person & "dog">'
+    assert properties['bbox'] == [1.0, 2.0, 30.5, 40.0]
+    assert properties['calculation_method'] == 'camera_projection'
+
+    assert json.loads(_export(ExportFormat.GEOJSON, []))['features'] == []
+
+
+def test_kml_round_trip_escapes_xml():
+    root = ET.fromstring(_export(ExportFormat.KML).encode('utf-8'))
+    placemarks = root.findall('.//kml:Placemark', KML_NS)
+
+    assert len(placemarks) == 2
+    first, second = placemarks
+    assert first.find('kml:Point/kml:coordinates', KML_NS).text == '37.61,55.75,150.0'
+    assert first.find('kml:TimeStamp/kml:when', KML_NS).text == '2026-05-01T12:30:00Z'
+    # Спецсимволы XML в имени класса и в описании экранированы
+    assert second.find('kml:name', KML_NS).text == '<person & "dog">'
+    description = json.loads(second.find('kml:description', KML_NS).text)
+    assert description['image_path'] == 'a&b <1>.jpg'
+    assert second.find('kml:Point/kml:coordinates', KML_NS).text == '151.2,-33.9'
+
+
+def test_to_kml_from_api_detections():
+    detections = [{
+        'class': 'car', 'conf': 0.9, 'bbox': [0, 0, 10, 10],
+        'coordinates': {'latitude': 55.0, 'longitude': 37.0, 'altitude': None,
+                        'accuracy_meters': None, 'calculation_method': 'photo_gps'},
+    }, {'class': 'tree', 'conf': 0.5, 'bbox': [0, 0, 5, 5]}]
+    rows = rows_from_detections(detections)
+    assert rows[0]['class_name'] == 'car' and rows[0]['lat'] == 55.0 and rows[1]['lat'] is None
+
+    root = ET.fromstring(ExportService().to_kml(detections).encode('utf-8'))
+    [placemark] = root.findall('.//kml:Placemark', KML_NS)
+    assert placemark.find('kml:Point/kml:coordinates', KML_NS).text == '37.0,55.0'
+
+
+@pytest.mark.parametrize('fmt', list(ExportFormat))
+def test_gzip_stream_matches_plain_document(fmt):
+    plain = _export(fmt)
+    compressed = list(ExportService.gzip(ExportService().stream(CHUNKS, fmt)))
+
+    assert all(isinstance(part, bytes) for part in compressed)
+    assert gzip.decompress(b''.join(compressed)).decode('utf-8') == plain
@@ -0,0 +1,106 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from backend.utils.geo_utils import EARTH_RADIUS_M, GeoReferencer, project_points, sensor_size
+
+LAT, LON = 55.75, 37.61
+SIZE = (3000, 4000)
+# Phantom 4 Pro: матрица 13.2 x 8.8 мм, фокус 8.8 мм; с высоты 100 м
+# кадр 4000 x 3000 накрывает на земле 150 x 112.5 м
+INFO = {
+    'lat': LAT, 'lon': LON, 'altitude': 250.0, 'relative_altitude': 100.0,
+    'model': 'FC6310', 'focal_length': 8.8,
+    'gimbal_pitch': -90.0, 'gimbal_yaw': 0.0,
+}
+
+
+def _offsets(lat, lon):
+    """Смещения (север, восток) в метрах от точки съемки"""
+    north = np.radians(np.asarray(lat) - LAT) * EARTH_RADIUS_M
+    east = np.radians(np.asarray(lon) - LON) * EARTH_RADIUS_M * math.cos(math.radians(LAT))
+    return north, east
+
+
+def _project(points, **info):
+    return project_points(np.asarray(points, dtype=np.float64), SIZE, {**INFO, **info})
+
+
+def test_sensor_from_model_or_35mm_equivalent():
+    assert sensor_size({'model': 'FC6310'}) == (13.2, 8.8)
+    width, height = sensor_size({'model': 'unknown', 'focal_length': 8.8, 'focal_length_35mm': 24})
+    assert width == pytest.approx(13.2) and height == pytest.approx(8.8)
+    assert sensor_size({'model': 'unknown', 'focal_length': 8.8}) is None
+
+
+def test_nadir_center_and_corner_offsets():
+    corners = [(2000, 1500), (0, 0), (4000, 0), (4000, 3000), (0, 3000)]
+    lat, lon, accuracy = _project(corners)
+    north, east = _offsets(lat, lon)
+
+    # Центр кадра - под камерой; верх кадра смотрит по курсу (на север)
+    assert north[0] == pytest.approx(0, abs=1e-6) and east[0] == pytest.approx(0, abs=1e-6)
+    assert north[1:] == pytest.approx([56.25, 56.25, -56.25, -56.25], abs=0.01)
+    assert east[1:] == pytest.approx([-75, 75, 75, -75], abs=0.01)
+    # Углы дальше центра - погрешность больше
+    assert np.all(accuracy[1:] > accuracy[0])
+
+
+def test_nadir_yaw_rotates_footprint():
+    # Курс на восток: верх кадра смотрит на восток, правый край - на юг
+    lat, lon, _ = _project([(2000, 0), (4000, 1500)], gimbal_yaw=90.0)
+    north, east = _offsets(lat, lon)
+    assert north == pytest.approx([0, -75], abs=0.01)
+    assert east == pytest.approx([56.25, 0], abs=0.01)
+
+
+@pytest.mark.parametrize('yaw, expected', [
+    (0.0, (100.0, 0.0)),
+    (90.0, (0.0, 100.0)),
+    (-135.0, (-100 / math.sqrt(2), -100 / math.sqrt(2))),
+])
+def test_oblique_pitch_and_yaw(yaw, expected):
+    # Тангаж -45: центр кадра ложится на землю на расстоянии высоты по курсу
+    lat, lon, _ = _project([(2000, 1500)], gimbal_pitch=-45.0, gimbal_yaw=yaw)
+    north, east = _offsets(lat, lon)
+    assert north[0] == pytest.approx(expected[0], abs=0.01)
+    assert east[0] == pytest.approx(expected[1], abs=0.01)
+
+
+def test_flight_yaw_used_without_gimbal_yaw():
+    info = {'gimbal_yaw': None, 'flight_yaw': 90.0, 'gimbal_pitch': -45.0}
+    north, east = _offsets(*_project([(2000, 1500)], **info)[:2])
+    assert north[0] == pytest.approx(0, abs=0.01) and east[0] == pytest.approx(100, abs=0.01)
+
+
+def test_horizontal_ray_falls_back_to_photo_gps():
+    detections = [
+        {'class': 'car', 'conf': 0.9, 'bbox': [1990, 1490, 2010, 1510]},  # центр - горизонт
+        {'class': 'car', 'conf': 0.8, 'bbox': [1990, 2980, 2010, 3000]},  # низ кадра - земля
+    ]
+    result = GeoReferencer().georeference(detections, {**INFO, 'gimbal_pitch': 0.0}, SIZE)
+
+    horizon, ground = result[0]['coordinates'], result[1]['coordinates']
+    assert horizon['calculation_method'] == 'photo_gps'
+    assert (horizon['latitude'], horizon['longitude']) == (LAT, LON)
+    assert horizon['accuracy_meters'] is None
+    assert ground['calculation_method'] == 'camera_projection'
+    assert ground['latitude'] > LAT
+    # Высота земли: абсолютная высота съемки минус высота над точкой взлета
+    assert ground['altitude'] == 150.0
+    # Исходные словари не меняются (могут лежать в кэше)
+    assert 'coordinates' not in detections[0]
+
+
+def test_missing_metadata_falls_back_to_photo_gps():
+    detections = [{'class': 'car', 'conf': 0.9, 'bbox': [0, 0, 10, 10]}]
+    geo = GeoReferencer()
+    for info, size in (({**INFO, 'relative_altitude': None}, SIZE), (INFO, None),
+                       ({**INFO, 'model': None, 'focal_length': None}, SIZE)):
+        [result] = geo.georeference(detections, info, size)
+        assert result['coordinates']['calculation_method'] == 'photo_gps'
+
+    # Без GPS координат нет вовсе
+    assert geo.georeference(detections, {**INFO, 'lat': None}, SIZE) == detections
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('pydantic')
+
+from backend.api.schemas import TaskStatus
+from backend.services.job_queue import JobQueue, JobQueueFull
+
+DONE = (TaskStatus.COMPLETED, TaskStatus.ERROR)
+
+
+async def _until(queue, task_id, statuses, timeout=5.0):
+    """Опрос статуса, как это делает клиент через GET /api/v1/jobs/{task_id}"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while queue.get(task_id).status not in statuses:
+        assert loop.time() < deadline, f'{task_id}: {queue.get(task_id).status}'
+        await asyncio.sleep(0.001)
+    return queue.get(task_id)
+
+
+def _blocking_handler():
+    """Обработчик, который держит задачу в processing до release"""
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def handler(task_id, payload, progress):
+        progress(0.5)
+        started.set()
+        await release.wait()
+        if payload == 'bad':
+            raise ValueError('broken image')
+        return {'detections': [{'class': 'car'}], 'processing_time': 0.25, 'lat': 55.75, 'lon': 37.61}
+
+    return handler, started, release
+
+
+def test_full_queue_rejects_and_status_moves_through_states():
+    async def scenario():
+        handler, started, release = _blocking_handler()
+        queue = JobQueue(handler, max_size=1, workers=1)
+        with pytest.raises(RuntimeError):
+            queue.submit('early', 'ok')
+        await queue.start()
+
+        assert queue.submit('a', 'ok').status == TaskStatus.PENDING
+        await started.wait()
+        running = queue.get('a')
+        assert running.status == TaskStatus.PROCESSING and running.progress == 0.5
+
+        # Воркер занят, единственное место в очереди - у 'b'
+        assert queue.submit('b', 'bad').status == TaskStatus.PENDING
+        with pytest.raises(JobQueueFull):
+            queue.submit('c', 'ok')
+        assert queue.get('c') is None and queue.pending == 1
+
+        release.set()
+        done = await _until(queue, 'a', DONE)
+        assert done.status == TaskStatus.COMPLETED
+        assert done.progress == 1.0 and done.detections_count == 1 and done.has_gps
+        assert done.processing_time == 0.25 and done.result['lat'] == 55.75
+
+        failed = await _until(queue, 'b', DONE)
+        assert failed.status == TaskStatus.ERROR and failed.error == 'broken image'
+
+        # Место освободилось - задачи снова принимаются
+        queue.submit('c', 'ok')
+        assert (await _until(queue, 'c', DONE)).status == TaskStatus.COMPLETED
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_history_keeps_active_tasks():
+    async def scenario():
+        handler, started, release = _blocking_handler()
+        queue = JobQueue(handler, max_size=10, workers=1, history_size=2)
+        await queue.start()
+        release.set()
+        for task_id in ('a', 'b'):
+            queue.submit(task_id, 'ok')
+            await _until(queue, task_id, DONE)
+
+        release.clear()
+        started.clear()
+        queue.submit('c', 'ok')
+        await started.wait()
+        queue.submit('d', 'ok')
+        # Вытесняются самые старые завершенные, активные остаются
+        assert queue.get('a') is None and queue.get('b') is None
+        assert queue.get('c').status == TaskStatus.PROCESSING
+        assert queue.get('d').status == TaskStatus.PENDING
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_jobs_endpoint_returns_429_when_queue_is_full(monkeypatch):
+    httpx = pytest.importorskip('httpx')
+    app_module = pytest.importorskip('backend.app')
+
+    async def scenario():
+        handler, started, release = _blocking_handler()
+        queue = JobQueue(handler, max_size=1, workers=1)
+        monkeypatch.setattr(app_module, 'job_queue', queue)
+        await queue.start()
+
+        # ASGI-транспорт без startup: модель не загружается
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            async def submit():
+                return await client.post('/api/v1/jobs', files={'file': ('a.jpg', b'data', 'image/jpeg')})
+
+            first = await submit()
+            assert first.status_code == 202 and first.json()['status'] == 'pending'
+            await started.wait()
+            assert (await submit()).status_code == 202
+
+            rejected = await submit()
+            assert rejected.status_code == 429
+            assert rejected.headers['retry-after'] == '5'
+
+            task_id = first.json()['task_id']
+            status = await client.get(f'/api/v1/jobs/{task_id}')
+            assert status.json()['status'] == 'processing'
+            release.set()
+            await _until(queue, task_id, DONE)
+            status = await client.get(f'/api/v1/jobs/{task_id}')
+            assert status.json()['status'] == 'completed'
+            assert (await client.get('/api/v1/jobs/missing')).status_code == 404
+        await queue.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+import asyncio
+
+from backend.services.result_cache import ResultCache
+
+
+def test_concurrent_requests_share_one_computation():
+    async def scenario():
+        cache = ResultCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return [{'class': 'car'}], 0.1, {}
+
+        results = await asyncio.gather(*(cache.get_or_compute('key', compute) for _ in range(5)))
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(hit for _, hit in results) == [False, True, True, True, True]
+
+
+def test_cancelled_owner_does_not_cancel_waiters():
+    async def scenario():
+        cache = ResultCache()
+        started = asyncio.Event()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            started.set()
+            await asyncio.sleep(0.05)
+            return [], 0.1, {'run': len(calls)}
+
+        owner = asyncio.create_task(cache.get_or_compute('key', compute))
+        await started.wait()
+        waiters = [asyncio.create_task(cache.get_or_compute('key', compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        owner.cancel()
+        results = await asyncio.gather(*waiters)
+        return owner, calls, results
+
+    owner, calls, results = asyncio.run(scenario())
+    assert owner.cancelled()
+    # Вычисление повторил один из ожидающих, остальные получили его результат
+    assert len(calls) == 2
+    assert all(value == ([], 0.1, {'run': 2}) for value, _ in results)
@@ -0,0 +1,105 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from backend.services import tiling
+from backend.services.tiling import TiledInference, nms, tile_grid, tile_scores
+
+HEIGHT, WIDTH = 1000, 1200
+
+
+def _bright_boxes(views, conf):
+    """Модель-заглушка: один объект 'car' по ярким пикселям тайла"""
+    results = []
+    for view in views:
+        ys, xs = np.nonzero(view[..., 0] > 128)
+        if len(xs) == 0:
+            results.append([])
+            continue
+        bbox = [float(xs.min()), float(ys.min()), float(xs.max() + 1), float(ys.max() + 1)]
+        results.append([{'class': 'car', 'conf': 0.9, 'bbox': bbox}])
+    return results
+
+
+def _recording(predict):
+    calls = []
+
+    def predict_batch(views, conf):
+        calls.append([view.shape[:2] for view in views])
+        return predict(views, conf)
+
+    return predict_batch, calls
+
+
+def test_tile_grid_covers_frame_with_overlap():
+    tiles = tile_grid(HEIGHT, WIDTH, size=512, overlap=0.2)
+    # Шаг 409: по ширине 0, 409, 688 (прижат к краю), по высоте 0, 409, 488
+    assert len(tiles) == 9
+    assert sorted({t[0] for t in tiles}) == [0, 409, 688]
+    assert sorted({t[1] for t in tiles}) == [0, 409, 488]
+    assert all(x1 - x0 == 512 and y1 - y0 == 512 for x0, y0, x1, y1 in tiles)
+
+    covered = np.zeros((HEIGHT, WIDTH), dtype=np.int32)
+    for x0, y0, x1, y1 in tiles:
+        covered[y0:y1, x0:x1] += 1
+    assert covered.min() >= 1
+    # Соседние тайлы перекрываются не меньше чем на долю overlap
+    for axis in (0, 1):
+        starts = sorted({t[axis] for t in tiles})
+        assert all(a + 512 - b >= 0.2 * 512 for a, b in zip(starts, starts[1:]))
+
+    # Кадр меньше тайла - один тайл по размеру кадра
+    assert tile_grid(300, 200, size=512) == [(0, 0, 200, 300)]
+
+
+@pytest.mark.parametrize('torchvision', [True, False])
+def test_nms_is_per_class(monkeypatch, torchvision):
+    if torchvision and not tiling.TORCHVISION_AVAILABLE:
+        pytest.skip('torchvision не установлен')
+    monkeypatch.setattr(tiling, 'TORCHVISION_AVAILABLE', torchvision)
+
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [0, 0, 10, 10], [50, 50, 60, 60]], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.5, 0.4], dtype=np.float32)
+    classes = np.array([0, 0, 1, 0])
+    keep = nms(boxes, scores, classes, iou_threshold=0.5)
+    # Дубль того же класса подавлен, другой класс и дальний бокс остались
+    assert sorted(keep.tolist()) == [1, 2, 3]
+    assert nms(np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int64)).size == 0
+
+
+def test_object_on_tile_seam_is_reported_once():
+    img = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    # Объект в полосе перекрытия тайлов x=0 и x=409 (и на полном кадре)
+    img[100:150, 420:480] = 255
+    predict_batch, calls = _recording(_bright_boxes)
+    tiler = TiledInference(predict_batch, {'car': 0}, slice_size=512, overlap=0.2, batch_size=4)
+
+    detections, stats = tiler.run(img)
+
+    assert stats == {'tiles': 9, 'tiles_skipped': 0}
+    # 9 тайлов и полный кадр пачками по 4
+    assert [len(batch) for batch in calls] == [4, 4, 2]
+    assert len(detections) == 1
+    assert detections[0]['bbox'] == [420.0, 100.0, 480.0, 150.0]
+
+
+def test_uniform_tiles_are_skipped_before_the_model():
+    img = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    rng = np.random.default_rng(0)
+    # Текстура только в левом верхнем тайле, остальной кадр однородный
+    img[50:300, 50:300] = rng.integers(0, 128, (250, 250, 1), dtype=np.uint8)
+    tiles = tile_grid(HEIGHT, WIDTH)
+
+    scores = tile_scores(img, tiles)
+    assert scores[0] > 1.0 and np.all(scores[1:] == 0)
+    variance = tile_scores(img, tiles, metric='variance')
+    assert variance[0] > 1.0 and np.allclose(variance[1:], 0)
+
+    predict_batch, calls = _recording(_bright_boxes)
+    tiler = TiledInference(predict_batch, {'car': 0}, skip_threshold=1.0, full_frame=False)
+    detections, stats = tiler.run(img)
+
+    assert stats == {'tiles': 9, 'tiles_skipped': 8}
+    assert calls == [[(512, 512)]]
+    assert detections == []